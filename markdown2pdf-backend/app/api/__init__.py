@@ -1,9 +1,22 @@
 """API router wiring."""
 from fastapi import APIRouter
 
-from app.api.pdf import router as pdf_router
 from app.api.fonts import router as fonts_router
+from app.api.metrics import router as metrics_router
+from app.api.preview import router as preview_router
+from app.api.themes import router as themes_router
+from app.profile import preview_only
 
 api_router = APIRouter()
-api_router.include_router(pdf_router, tags=["pdf"])
+api_router.include_router(preview_router, tags=["pdf"])
 api_router.include_router(fonts_router, tags=["fonts"])
+api_router.include_router(themes_router, tags=["themes"])
+api_router.include_router(metrics_router, tags=["metrics"])
+
+if not preview_only():
+    # pylint: disable=ungrouped-imports
+    from app.api.pdf import router as pdf_router
+    from app.api.batch import router as batch_router
+
+    api_router.include_router(pdf_router, tags=["pdf"])
+    api_router.include_router(batch_router, tags=["pdf"])
@@ -0,0 +1,231 @@
+"""Multi-document endpoints that return archives of rendered PDFs."""
+import asyncio
+import json
+import os
+import re
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies import client_identity
+from app.api.rendering import rate_limited, schedule_render
+from app.models import (
+    PDFBatchRequest,
+    PDFGenerationRequest,
+    PDFMergeRequest,
+    PDFVariantsRequest,
+)
+from app.services import cost_estimator, pdf_service, render_executor, scheduler
+from app.services.cost_service import BULK_LANE, FAST_LANE, MERGE_LANE
+from app.services.result_transport import CHUNK_SIZE, ResultBuffer
+from app.services.scheduler import RateLimitExceeded
+from app.services.zip_stream import ZipStreamWriter
+
+router = APIRouter()
+
+# Maximum number of documents rendered (and held in memory) at once per batch.
+_BATCH_WINDOW = int(os.getenv(
+    "M2P_BATCH_WINDOW",
+    str(2 * (render_executor.lane_workers(FAST_LANE) + render_executor.lane_workers(BULK_LANE))),
+))
+
+
+def _archive_stem(request: PDFGenerationRequest, index: int) -> str:
+    stem = re.sub(r"[^\w.-]+", "_", request.filename or "").strip("._")
+    return stem or f"document-{index + 1:04d}"
+
+
+async def _render_document(client_id: str, request: PDFGenerationRequest) -> ResultBuffer:
+    cost = cost_estimator.estimate(request.markdown)
+    return await schedule_render(client_id, cost, "pdf", pdf_service.generate_pdf, request,
+                                 admit=False, buffered=True)
+
+
+async def _stream_archive(  # pylint: disable=too-many-locals
+    stems: List[str], render: Callable[[int], Coroutine[Any, Any, ResultBuffer]]
+) -> AsyncIterator[bytes]:
+    """Render entries in a bounded window and emit ZIP members as each one finishes."""
+    writer = ZipStreamWriter()
+    manifest: List[dict] = []
+    pending: Dict[asyncio.Task, int] = {}
+    queue = iter(range(len(stems)))
+
+    def fill_window() -> None:
+        for index in queue:
+            pending[asyncio.create_task(render(index))] = index
+            if len(pending) >= _BATCH_WINDOW:
+                return
+
+    try:
+        fill_window()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = pending.pop(task)
+                stem = stems[index]
+                try:
+                    pdf = task.result()
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    print(f"Error generating PDF for archive entry {index}: {e}")
+                    name = writer.unique_name(f"{stem}.error.txt")
+                    yield writer.add(name, f"Failed to generate PDF: {e}\n".encode("utf-8"),
+                                     comment="status=error", compress=True)
+                    manifest.append({"index": index, "filename": name, "status": "error",
+                                     "error": str(e)})
+                else:
+                    name = writer.unique_name(f"{stem}.pdf")
+                    with pdf, pdf.view() as view:
+                        for chunk in writer.add_stream(name, view, comment="status=ok"):
+                            yield chunk
+                    manifest.append({"index": index, "filename": name, "status": "ok",
+                                     "bytes": pdf.size})
+            fill_window()
+
+        manifest.sort(key=lambda entry: entry["index"])
+        summary = {
+            "documents": len(stems),
+            "succeeded": sum(1 for entry in manifest if entry["status"] == "ok"),
+            "failed": sum(1 for entry in manifest if entry["status"] == "error"),
+            "entries": manifest,
+        }
+        yield writer.add("manifest.json", json.dumps(summary, indent=2).encode("utf-8"),
+                         compress=True)
+        yield writer.close()
+    finally:
+        # The client may disconnect mid-stream; don't keep rendering for nobody.
+        for task in pending:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                task.result().release()
+            task.cancel()
+
+
+@router.post("/generate-pdf-batch")
+async def generate_pdf_batch(request: PDFBatchRequest, client_id: str = Depends(client_identity)):
+    """
+    Convert many markdown documents in one request and stream back a ZIP of PDFs.
+    Every archive entry carries a ``status=ok`` or ``status=error`` comment and
+    ``manifest.json`` summarises the outcome of each document.
+    """
+    try:
+        scheduler.admit(client_id)
+    except RateLimitExceeded as e:
+        raise rate_limited(e) from e
+
+    try:
+        documents = request.document_requests()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+    async def render(index: int) -> ResultBuffer:
+        return await _render_document(client_id, documents[index])
+
+    stems = [_archive_stem(document, index) for index, document in enumerate(documents)]
+    filename = f"{request.filename or 'documents'}.zip"
+    return StreamingResponse(
+        _stream_archive(stems, render),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+    )
+
+
+async def _stream_buffer(pdf: ResultBuffer) -> AsyncIterator[bytes]:
+    """Stream a rendered PDF chunk by chunk and release it, even if the client disconnects."""
+    try:
+        with pdf.view() as view:
+            for start in range(0, pdf.size, CHUNK_SIZE):
+                yield bytes(view[start:start + CHUNK_SIZE])
+    finally:
+        pdf.release()
+
+
+@router.post("/generate-pdf-merge")
+async def generate_pdf_merge(request: PDFMergeRequest, client_id: str = Depends(client_identity)):
+    """
+    Merge several markdown sections into one PDF with a combined outline and,
+    when ``include_index`` is set, a table of contents with continuous page numbers.
+    Unchanged sections are reused from cache on re-export.
+    """
+    try:
+        cost = cost_estimator.estimate_many(
+            [section.markdown for section in request.sections], MERGE_LANE
+        )
+        pdf = await schedule_render(
+            client_id, cost, "merge", pdf_service.generate_merged_pdf, request, buffered=True
+        )
+
+        filename = f"{request.filename or 'document'}.pdf"
+        return StreamingResponse(
+            _stream_buffer(pdf),
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "Content-Length": str(pdf.size),
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Log the error in a real application
+        print(f"Error generating merged PDF: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate merged PDF"
+        ) from e
+
+
+def _variant_stem(request: PDFVariantsRequest, index: int) -> str:
+    base = re.sub(r"[^\w.-]+", "_", request.filename or "").strip("._") or "document"
+    label = re.sub(r"[^\w.-]+", "_", request.variants[index].name or "").strip("._")
+    return f"{base}-{label or index + 1}"
+
+
+@router.post("/generate-pdf-variants")
+async def generate_pdf_variants(request: PDFVariantsRequest,
+                                client_id: str = Depends(client_identity)):
+    """
+    Render one markdown document in several styling variants and stream back a ZIP.
+    The markdown is parsed and highlighted once; only the stylesheet differs
+    between variants, which are laid out in parallel.
+    """
+    try:
+        scheduler.admit(client_id)
+    except RateLimitExceeded as e:
+        raise rate_limited(e) from e
+
+    try:
+        styles = request.variant_styles()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+    cost = cost_estimator.estimate(request.markdown)
+    try:
+        html_body = await schedule_render(
+            client_id, cost_estimator.estimate(request.markdown, for_preview=True), "body",
+            pdf_service.render_body, request, admit=False
+        )
+    except Exception as e:
+        # Log the error in a real application
+        print(f"Error converting markdown for variants: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to convert markdown"
+        ) from e
+
+    async def render(index: int) -> ResultBuffer:
+        return await schedule_render(
+            client_id, cost, "pdf", pdf_service.generate_pdf_from_body,
+            html_body, styles[index], request.include_index, admit=False, buffered=True
+        )
+
+    stems = [_variant_stem(request, index) for index in range(len(styles))]
+    filename = f"{request.filename or 'document'}-variants.zip"
+    return StreamingResponse(
+        _stream_archive(stems, render),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+    )
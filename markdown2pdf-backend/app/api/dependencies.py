@@ -0,0 +1,29 @@
+"""Shared FastAPI dependencies."""
+import os
+from typing import Optional
+
+from fastapi import Header, Request
+
+from app.services import scheduler
+
+# Set to 0 to have previews load whole font files instead of subsets.
+_FONT_SUBSETS = os.getenv("M2P_FONT_SUBSETS", "1") != "0"
+# Where browsers reach this server, when that is not the URL requests arrive at (a proxy).
+_PUBLIC_URL = os.getenv("M2P_PUBLIC_URL", "")
+
+
+async def client_identity(
+    request: Request,
+    x_api_key: Optional[str] = Header(None),
+    x_client_id: Optional[str] = Header(None),
+) -> str:
+    """Identify the calling client by API key, else by address (see ``scheduler``)."""
+    address = request.client.host if request.client else None
+    return scheduler.resolve_client(x_api_key, x_client_id, address)
+
+
+async def font_subset_url(request: Request) -> Optional[str]:
+    """Return the URL prefix previews load font subsets from, or None for whole fonts."""
+    if not _FONT_SUBSETS:
+        return None
+    return (_PUBLIC_URL or str(request.base_url)).rstrip("/") + "/font-subsets"
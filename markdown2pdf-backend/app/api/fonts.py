@@ -1,9 +1,15 @@
-"""Font listing endpoints."""
+"""Font listing and font subset endpoints."""
+import asyncio
 from typing import List
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
 
-from app.services import font_service
+from app.api.dependencies import client_identity
+from app.api.rendering import schedule_render
+from app.services import font_service, font_subsetter
+from app.services.cost_service import DocumentCost
+from app.services.font_subset_service import BUILD_COST_MS, decode_ranges
 
 router = APIRouter()
 
@@ -14,3 +20,46 @@ async def get_available_fonts():
     Get a list of available font families for PDF generation.
     """
     return font_service.get_available_fonts()
+
+
+@router.get("/font-subsets/{filename}")
+async def get_font_subset(filename: str, v: str, u: str, client_id: str = Depends(client_identity)):
+    """
+    Get a WOFF2 subset of a bundled font face, as linked from previews.
+
+    ``v`` is the face's version and ``u`` the code points to keep, as hex
+    ranges. Previews only link code points the face covers, so other sets are
+    refused. Subsets are built once, as a render job under the client's rate
+    limit, and cached; since the URL names the exact content, browsers may
+    cache the response for good.
+    """
+    if filename not in font_service.font_files():
+        raise HTTPException(status_code=404, detail="Font not found")
+    try:
+        codepoints = decode_ranges(u)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    try:
+        face = await asyncio.to_thread(font_subsetter.face, filename)
+        if v != face.version:
+            # The font changed since the preview linked it; its new URL differs.
+            raise HTTPException(status_code=404, detail="Font version not found")
+        if not codepoints <= face.codepoints:
+            raise HTTPException(status_code=400, detail="Code points not covered by the font")
+        path = font_subsetter.cached(filename, v, codepoints)
+        if path is None:
+            path = await schedule_render(client_id, DocumentCost(predicted_ms=BUILD_COST_MS),
+                                         "font-subset", font_subsetter.subset, filename, v,
+                                         codepoints)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error building font subset: {e}")
+        raise HTTPException(status_code=500, detail="Failed to build font subset") from e
+
+    return FileResponse(
+        path,
+        media_type="font/woff2",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
@@ -0,0 +1,16 @@
+"""Operational metrics endpoints."""
+from typing import Dict
+
+from fastapi import APIRouter
+
+from app.services import scheduler
+
+router = APIRouter()
+
+
+@router.get("/metrics/clients", response_model=Dict[str, dict])
+async def get_client_metrics():
+    """
+    Get per-client scheduling metrics (queueing, latency and throughput).
+    """
+    return scheduler.stats()
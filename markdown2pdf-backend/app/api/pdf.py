@@ -1,38 +1,70 @@
-"""PDF generation and preview endpoints."""
+"""PDF generation endpoint and downloads of recently rendered PDFs."""
 # pylint: disable=duplicate-code
-import io
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Response
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 
+from app.api.dependencies import client_identity
+from app.api.rendering import schedule_render
 from app.models import PDFGenerationRequest
-from app.services import pdf_service
+from app.services import (artifact_store, cost_estimator, pdf_service, remote_workers,
+                          theme_registry)
+from app.services.artifact_service import Artifact
 
 router = APIRouter()
 
 
+def _artifact_response(artifact: Artifact, filename: str,
+                       background: Optional[BackgroundTask] = None) -> FileResponse:
+    """Serve a rendered PDF with Content-Length, HEAD and byte-range support."""
+    return FileResponse(
+        artifact.path,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            # Where the same PDF can be fetched (or resumed) without re-rendering.
+            "Content-Location": f"/artifacts/{artifact.key}",
+        },
+        background=background,
+    )
+
+
 @router.post("/generate-pdf")
-async def generate_pdf(request: PDFGenerationRequest):
+async def generate_pdf(request: PDFGenerationRequest, client_id: str = Depends(client_identity)):
     """
     Generate a PDF from markdown content with specified styling options.
+    Identical requests within the retention window reuse the rendered file.
     """
     try:
-        # Generate PDF
-        pdf_bytes = pdf_service.generate_pdf(request)
+        async def render(path: str) -> int:
+            # Route by predicted cost so short documents never queue behind large ones
+            cost = cost_estimator.estimate(request.markdown)
+            if not remote_workers.enabled:
+                return await schedule_render(client_id, cost, "pdf",
+                                             pdf_service.generate_pdf_file, request, path)
+            # Workers on other nodes can't write to this node's artifact directory.
+            with await schedule_render(client_id, cost, "pdf", pdf_service.generate_pdf,
+                                       request, buffered=True) as pdf, pdf.view() as view, \
+                    open(path, "wb") as target:
+                return target.write(view)
+
+        # The stylesheets are part of the key, so edited themes are not served stale.
+        key = artifact_store.key_for(
+            "pdf", theme_registry.fingerprint() + request.model_dump_json(exclude={"filename"})
+        )
+        artifact = await artifact_store.get_or_create(key, render)
 
         # Use provided filename or default to "document"
         filename = "document.pdf"
         if request.filename:
             filename = f"{request.filename}.pdf"
 
-        # Return the PDF as a streaming response
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        return _artifact_response(artifact, filename,
+                                  BackgroundTask(artifact_store.release, artifact))
+    except HTTPException:
+        raise
     except Exception as e:
         # Log the error in a real application
         print(f"Error generating PDF: {e}")
@@ -42,28 +74,12 @@ async def generate_pdf(request: PDFGenerationRequest):
         ) from e
 
 
-@router.post("/generate-pdf-preview")
-async def generate_pdf_preview(request: PDFGenerationRequest):
+@router.api_route("/artifacts/{key}", methods=["GET", "HEAD"])
+async def get_artifact(key: str):
     """
-    Generate HTML preview of the PDF content without creating an actual PDF.
-    Returns the styled HTML that would be used for PDF generation.
+    Download (or resume downloading) a PDF rendered within the retention window.
     """
-    try:
-        # Generate HTML preview
-        html_content = pdf_service.generate_pdf_preview(request)
-
-        # Return the HTML as plain text response
-        return Response(
-            content=html_content,
-            media_type="text/html",
-            headers={
-                "Content-Type": "text/html; charset=utf-8"
-            }
-        )
-    except Exception as e:
-        # Log the error in a real application
-        print(f"Error generating PDF preview: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to generate PDF preview"
-        ) from e
+    artifact = artifact_store.get(key)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found or expired")
+    return _artifact_response(artifact, "document.pdf")
@@ -0,0 +1,140 @@
+"""HTML preview endpoint."""
+# pylint: disable=duplicate-code
+import asyncio
+import os
+from collections import deque
+from itertools import repeat
+from typing import Any, AsyncIterator, Callable, Coroutine, Deque, Iterable, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies import client_identity, font_subset_url
+from app.api.rendering import rate_limited, schedule_render
+from app.models import PDFGenerationRequest, PDFStyleOptions
+from app.services import cost_estimator, markdown_service, pdf_service, scheduler
+from app.services.headings import HeadingCollector
+from app.services.markdown_service import split_markdown
+from app.services.scheduler import RateLimitExceeded
+
+router = APIRouter()
+
+# Streamed previews start with a small piece so the top of the document shows
+# at once; later pieces double in size up to M2P_PREVIEW_CHUNK_BYTES.
+_PREVIEW_FIRST_CHUNK_BYTES = int(os.getenv("M2P_PREVIEW_FIRST_CHUNK_BYTES", str(8 * 1024)))
+_PREVIEW_CHUNK_BYTES = int(os.getenv("M2P_PREVIEW_CHUNK_BYTES", str(64 * 1024)))
+# Pieces converted ahead of the one being sent.
+_PREVIEW_WINDOW = int(os.getenv("M2P_PREVIEW_WINDOW", "4"))
+
+
+async def _convert_in_order(jobs: Iterable[tuple],
+                            convert: Callable[..., Coroutine[Any, Any, Any]]) -> AsyncIterator[Any]:
+    """Run ``convert(*job)`` for each job, at most ``_PREVIEW_WINDOW`` at once, in order."""
+    pending: Deque[asyncio.Task] = deque()
+    try:
+        for job in jobs:
+            pending.append(asyncio.create_task(convert(*job)))
+            if len(pending) >= max(1, _PREVIEW_WINDOW):
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        # The client may disconnect mid-stream; don't keep converting for nobody.
+        for task in pending:
+            task.cancel()
+
+
+async def _stream_preview(client_id: str, request: PDFGenerationRequest,
+                          font_subsets: Optional[str] = None) -> AsyncIterator[str]:
+    """Send the document head at once, then the body piece by piece as it is converted."""
+    style = PDFStyleOptions(**request.model_dump(exclude={"markdown", "filename"}))
+
+    def pieces() -> Iterable[str]:
+        return split_markdown(request.markdown, _PREVIEW_FIRST_CHUNK_BYTES, _PREVIEW_CHUNK_BYTES)
+
+    def converter(fn: Callable[..., Any]) -> Callable[..., Coroutine[Any, Any, Any]]:
+        async def convert(piece: str, *args: Any) -> Any:
+            cost = cost_estimator.estimate(piece, for_preview=True)
+            return await schedule_render(client_id, cost, "preview", fn, piece, style, *args,
+                                         admit=False)
+        return convert
+
+    try:
+        yield await schedule_render(client_id, cost_estimator.estimate("", for_preview=True),
+                                    "preview", pdf_service.generate_preview_head, style,
+                                    font_subsets, request.markdown if font_subsets else "",
+                                    admit=False)
+        # Heading IDs a piece must not take because earlier pieces did.
+        reserved: list[frozenset[str]] = []
+        if style.include_index:
+            # The index precedes the body, so every heading is needed first.
+            # Pieces number their headings on their own; replaying them in
+            # order gives the IDs of the whole document.
+            ids = HeadingCollector()
+            async for piece_headings in _convert_in_order(
+                    zip(pieces()), converter(pdf_service.preview_piece_headings)):
+                used_ids = ids.used_ids
+                renumbered = ids.replay(piece_headings)
+                # Without a clash the piece converts as it did on its own (and is cached).
+                reserved.append(used_ids if renumbered != piece_headings else frozenset())
+            yield markdown_service.render_index(ids.headings)
+        async for html_body in _convert_in_order(
+                zip(pieces(), reserved or repeat(frozenset())),
+                converter(pdf_service.generate_preview_piece)):
+            yield html_body + "\n"
+        yield markdown_service.close_document()
+    except Exception as e:
+        # Headers are already sent; the truncated response tells the client it failed.
+        print(f"Error streaming PDF preview: {e}")
+        raise
+
+
+@router.post("/generate-pdf-preview")
+async def generate_pdf_preview(request: PDFGenerationRequest, stream: bool = False,
+                               client_id: str = Depends(client_identity),
+                               font_subsets: Optional[str] = Depends(font_subset_url)):
+    """
+    Generate HTML preview of the PDF content without creating an actual PDF.
+    Returns the styled HTML that would be used for PDF generation.
+
+    With ``?stream=true`` the head and CSS are sent immediately and the body
+    follows in pieces as they are converted, so large documents start
+    painting long before the whole document is converted.
+
+    Fonts are linked as subsets holding just the document's glyphs (see
+    ``/font-subsets``) unless ``M2P_FONT_SUBSETS=0``.
+    """
+    if stream:
+        try:
+            scheduler.admit(client_id)
+        except RateLimitExceeded as e:
+            raise rate_limited(e) from e
+        return StreamingResponse(
+            _stream_preview(client_id, request, font_subsets),
+            media_type="text/html; charset=utf-8",
+        )
+
+    try:
+        # Generate HTML preview
+        cost = cost_estimator.estimate(request.markdown, for_preview=True)
+        html_content = await schedule_render(
+            client_id, cost, "preview", pdf_service.generate_pdf_preview, request, font_subsets
+        )
+
+        # Return the HTML as plain text response
+        return Response(
+            content=html_content,
+            media_type="text/html",
+            headers={
+                "Content-Type": "text/html; charset=utf-8"
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Log the error in a real application
+        print(f"Error generating PDF preview: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate PDF preview"
+        ) from e
@@ -0,0 +1,32 @@
+"""Helpers shared by the endpoints that dispatch render jobs."""
+from typing import Any, Callable
+
+from fastapi import HTTPException
+
+from app.services import render_executor, scheduler
+from app.services.cost_service import DocumentCost
+from app.services.scheduler import RateLimitExceeded
+
+
+def rate_limited(e: RateLimitExceeded) -> HTTPException:
+    """Translate a scheduler rate-limit rejection into an HTTP 429."""
+    return HTTPException(
+        status_code=429,
+        detail="Rate limit exceeded",
+        headers={"Retry-After": str(max(1, round(e.retry_after)))},
+    )
+
+
+async def schedule_render(client_id: str, cost: DocumentCost, kind: str,  # pylint: disable=too-many-arguments
+                          fn: Callable[..., Any], *args: Any, admit: bool = True,
+                          buffered: bool = False) -> Any:
+    """Wait for the client's fair turn, then run ``fn`` on the lane chosen for ``cost``.
+
+    ``buffered`` returns a ``bytes`` result as a ``ResultBuffer`` (see
+    ``RenderExecutor.run``) that the caller must release.
+    """
+    try:
+        async with scheduler.slot(client_id, cost, admit=admit):
+            return await render_executor.run(cost, kind, fn, *args, buffered=buffered)
+    except RateLimitExceeded as e:
+        raise rate_limited(e) from e
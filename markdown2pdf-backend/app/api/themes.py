@@ -0,0 +1,16 @@
+"""Code highlighting theme endpoints."""
+from typing import List
+
+from fastapi import APIRouter
+
+from app.services import theme_registry
+
+router = APIRouter()
+
+
+@router.get("/code-themes", response_model=List[str])
+async def get_code_themes():
+    """
+    Get the code highlighting themes accepted as ``code_theme``.
+    """
+    return theme_registry.code_themes()
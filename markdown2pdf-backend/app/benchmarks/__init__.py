@@ -0,0 +1 @@
+"""Benchmark suite: synthetic corpus, per-stage timings and regression gates."""
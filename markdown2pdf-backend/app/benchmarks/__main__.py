@@ -0,0 +1,271 @@
+"""Command-line entry point for the benchmark suite.
+
+Usage::
+
+    python -m app.benchmarks run --output app/benchmarks/baselines/local.json
+    python -m app.benchmarks run --output current.json
+    python -m app.benchmarks compare app/benchmarks/baselines/local.json current.json
+    python -m app.benchmarks complexity --max-size-mb 10
+    python -m app.benchmarks load --rate 20 --duration 60 --output load.json
+    python -m app.benchmarks tables --rows 10000
+    python -m app.benchmarks profiles --output profiles.json
+    python -m app.benchmarks transport --sizes-mb 1 10 50
+    python -m app.benchmarks engines --output engines.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from app.benchmarks.corpus import GENERATORS
+
+
+def _run(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from app.benchmarks.runner import run_benchmarks
+
+    report = run_benchmarks(scale=args.scale, repeat=args.repeat, pdf=not args.html_only,
+                            names=args.documents)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote {args.output}")
+    else:
+        print(text)
+    for kind, values in report["throughput"].items():
+        print(f"{kind}: {values['docs_per_s']} docs/s, {values['mb_per_s']} MB/s",
+              file=sys.stderr)
+    return 0
+
+
+def _compare(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from app.benchmarks.compare import compare_reports
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    current = json.loads(args.current.read_text(encoding="utf-8"))
+    # Only reports of the same workload are comparable.
+    for key in ("scale", "mix", "rate", "concurrency", "seed"):
+        if baseline.get("meta", {}).get(key) != current.get("meta", {}).get(key):
+            print(f"Reports were produced with different --{key} values", file=sys.stderr)
+            return 2
+    regressions = compare_reports(baseline, current, args.threshold, args.min_delta_ms)
+    for regression in sorted(regressions, key=lambda r: r.slowdown, reverse=True):
+        print(f"REGRESSION {regression}")
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+def _complexity(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from app.benchmarks.complexity import MAX_LINEAR_EXPONENT, MB, run_complexity
+
+    results = run_complexity(largest=int(args.max_size_mb * MB),
+                             full_pipeline=args.full_pipeline, names=args.cases)
+    for result in results.values():
+        print(result)
+    flagged = [name for name, result in results.items() if not result.linear]
+    if flagged:
+        print(f"{len(flagged)} stage(s) grow faster than size ** {MAX_LINEAR_EXPONENT}: "
+              + ", ".join(flagged))
+        return 1
+    print("All stages scale linearly")
+    return 0
+
+
+def _tables(args: argparse.Namespace) -> int:
+    # Time WeasyPrint's auto layout as is, without the long-table fallback;
+    # read when the services are first imported below.
+    os.environ.setdefault("M2P_AUTO_TABLE_MAX_ROWS", "0")
+    # pylint: disable=import-outside-toplevel
+    from app.benchmarks.runner import run_table_layouts
+
+    report = run_table_layouts(rows=args.rows, columns=args.columns, repeat=args.repeat)
+    print(json.dumps(report, indent=2, sort_keys=True))
+    for mode, values in report["modes"].items():
+        print(f"{mode}: {values['end_to_end_ms']:.0f} ms end to end, "
+              f"{values['stages_ms'].get('layout', 0.0):.0f} ms layout", file=sys.stderr)
+    return 0
+
+
+def _profiles(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from app.benchmarks.runner import run_output_profiles
+
+    report = run_output_profiles(scale=args.scale, repeat=args.repeat, names=args.documents)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote {args.output}")
+    else:
+        print(text)
+    for profile, values in report["profiles"].items():
+        print(f"{profile}: {values['end_to_end_ms']:.0f} ms, {values['pdf_kb']:.0f} KiB",
+              file=sys.stderr)
+    return 0
+
+
+def _transport(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from app.benchmarks.runner import run_result_transport
+
+    report = run_result_transport(args.sizes_mb, repeat=args.repeat)
+    print(json.dumps(report, indent=2, sort_keys=True))
+    for size, modes in report["sizes"].items():
+        print(f"{size}: " + ", ".join(
+            f"{mode} {values['end_to_end_ms']:.1f} ms / {values['peak_memory_kb']} KiB"
+            for mode, values in modes.items()), file=sys.stderr)
+    return 0
+
+
+def _engines(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from app.benchmarks.runner import run_engines
+
+    report = run_engines(scale=args.scale, repeat=args.repeat, names=args.documents)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote {args.output}")
+    else:
+        print(text)
+    for engine, values in report["engines"].items():
+        print(f"{engine}: {values['markdown_ms']:.0f} ms parsing, "
+              f"{values['end_to_end_ms']:.0f} ms end to end, {values['mb_per_s']} MB/s",
+              file=sys.stderr)
+    mismatches = {name: diff for name, diff in report["parity"].items() if diff}
+    for name, diff in mismatches.items():
+        print(f"MISMATCH {name} {diff}")
+    if mismatches:
+        print(f"{len(mismatches)} document(s) render differently")
+        return 1
+    print("All engines produce the same HTML")
+    return 0
+
+
+def _load(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from app.benchmarks.load import LoadSettings, parse_mix, run_load
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    report = run_load(LoadSettings(url=args.url, mix=mix, rate=args.rate,
+                                   concurrency=args.concurrency, duration=args.duration,
+                                   scale=args.scale, seed=args.seed, timeout=args.timeout,
+                                   label=args.label))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote {args.output}")
+    else:
+        print(text)
+    for name, values in [*report["scenarios"].items(), ("total", report["total"])]:
+        print(f"{name}: {values['requests']} requests, {values['requests_per_s']} req/s, "
+              f"p50 {values['p50_ms']} ms, p95 {values['p95_ms']} ms, p99 {values['p99_ms']} ms, "
+              f"errors {values['error_rate']:.1%}", file=sys.stderr)
+    for pid, usage in report["workers"].items():
+        print(f"worker {pid}: cpu {usage['cpu_percent']}%, max rss {usage['max_rss_kb']} KiB",
+              file=sys.stderr)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:  # pylint: disable=too-many-statements
+    """Parse arguments and run the selected command; return the exit code."""
+    parser = argparse.ArgumentParser(prog="python -m app.benchmarks",
+                                     description="Markdown2PDF benchmark suite.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="benchmark the synthetic corpus")
+    run.add_argument("--output", type=Path, help="write the JSON report here")
+    run.add_argument("--scale", type=int, default=1, help="corpus size multiplier")
+    run.add_argument("--repeat", type=int, default=3, help="timed runs per document")
+    run.add_argument("--html-only", action="store_true", help="skip PDF rendering")
+    run.add_argument("--documents", nargs="+", choices=sorted(GENERATORS),
+                     help="only benchmark these corpus documents")
+    run.set_defaults(handler=_run)
+
+    compare = commands.add_parser("compare", help="fail on regressions against a baseline")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("current", type=Path)
+    compare.add_argument("--threshold", type=float, default=0.15,
+                         help="allowed relative slowdown (default: 0.15)")
+    compare.add_argument("--min-delta-ms", type=float, default=1.0,
+                         help="ignore timing changes smaller than this (default: 1 ms)")
+    compare.set_defaults(handler=_compare)
+
+    complexity = commands.add_parser("complexity",
+                                     help="fail on stages that scale super-linearly")
+    complexity.add_argument("--max-size-mb", type=float, default=10.0,
+                            help="largest input size (default: 10 MB)")
+    complexity.add_argument("--full-pipeline", action="store_true",
+                            help="also time complete conversions")
+    complexity.add_argument("--cases", nargs="+", help="only run these cases")
+    complexity.set_defaults(handler=_complexity)
+
+    tables = commands.add_parser("tables", help="time auto vs fixed layout of a large table")
+    tables.add_argument("--rows", type=int, default=10000, help="table rows (default: 10000)")
+    tables.add_argument("--columns", type=int, default=6, help="table columns (default: 6)")
+    tables.add_argument("--repeat", type=int, default=1, help="timed runs per mode")
+    tables.set_defaults(handler=_tables)
+
+    profiles = commands.add_parser("profiles",
+                                   help="compare render time and PDF size of output profiles")
+    profiles.add_argument("--output", type=Path, help="write the JSON report here")
+    profiles.add_argument("--scale", type=int, default=1, help="corpus size multiplier")
+    profiles.add_argument("--repeat", type=int, default=3, help="timed runs per document")
+    profiles.add_argument("--documents", nargs="+", choices=sorted(GENERATORS),
+                          help="only render these corpus documents")
+    profiles.set_defaults(handler=_profiles)
+
+    transport = commands.add_parser("transport",
+                                    help="time worker-to-API result handoff by size")
+    transport.add_argument("--sizes-mb", type=float, nargs="+", default=[0.1, 1, 10, 50],
+                           help="result sizes in MiB (default: 0.1 1 10 50)")
+    transport.add_argument("--repeat", type=int, default=3, help="timed runs per size")
+    transport.set_defaults(handler=_transport)
+
+    engines = commands.add_parser("engines",
+                                  help="compare markdown engine throughput and output")
+    engines.add_argument("--output", type=Path, help="write the JSON report here")
+    engines.add_argument("--scale", type=int, default=1, help="corpus size multiplier")
+    engines.add_argument("--repeat", type=int, default=3, help="timed runs per document")
+    engines.add_argument("--documents", nargs="+", choices=sorted(GENERATORS),
+                         help="only convert these corpus documents")
+    engines.set_defaults(handler=_engines)
+
+    load = commands.add_parser("load", help="replay a mixed workload against the API")
+    load.add_argument("--url", help="target server (default: drive the app in-process)")
+    load.add_argument("--mix", default="preview=70,pdf=20,fonts=5,batch=5",
+                      help="scenario weights (default: preview=70,pdf=20,fonts=5,batch=5)")
+    pace = load.add_mutually_exclusive_group()
+    pace.add_argument("--rate", type=float, help="open loop: requests per second")
+    pace.add_argument("--concurrency", type=int, default=4,
+                      help="closed loop: simultaneous clients (default: 4)")
+    load.add_argument("--duration", type=float, default=30.0, help="seconds (default: 30)")
+    load.add_argument("--scale", type=int, default=1, help="corpus size multiplier")
+    load.add_argument("--seed", type=int, default=1234, help="workload seed")
+    load.add_argument("--timeout", type=float, default=120.0, help="per-request timeout")
+    load.add_argument("--label", default="", help="free-form note, e.g. the worker setup")
+    load.add_argument("--output", type=Path, help="write the JSON report here")
+    load.set_defaults(handler=_load)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
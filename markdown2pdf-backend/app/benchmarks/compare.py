@@ -0,0 +1,78 @@
+"""Compare two benchmark reports and flag regressions."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Tuple
+
+
+@dataclass
+class Regression:
+    """A metric that got worse by more than the allowed threshold."""
+
+    metric: str
+    baseline: float
+    current: float
+    higher_is_better: bool = False
+
+    @property
+    def slowdown(self) -> float:
+        """Return how many times worse the current value is (1.0 means unchanged)."""
+        worse, better = ((self.baseline, self.current) if self.higher_is_better
+                         else (self.current, self.baseline))
+        return worse / better if better else float("inf")
+
+    def __str__(self) -> str:
+        return (f"{self.metric}: {self.baseline:.2f} -> {self.current:.2f} "
+                f"({(self.slowdown - 1) * 100:.0f}% worse)")
+
+
+def _metrics(report: dict) -> Iterator[Tuple[str, float, bool]]:
+    """Yield ``(name, value, higher_is_better)`` for every comparable metric."""
+    for doc_name, doc in report.get("documents", {}).items():
+        for kind in ("html", "pdf"):
+            if kind not in doc:
+                continue
+            yield f"{doc_name}.{kind}.end_to_end_ms", doc[kind]["end_to_end_ms"], False
+            for stage_name, value in doc[kind]["stages_ms"].items():
+                yield f"{doc_name}.{kind}.{stage_name}_ms", value, False
+        yield f"{doc_name}.peak_memory_kb", doc["peak_memory_kb"], False
+    for kind, values in report.get("throughput", {}).items():
+        yield f"throughput.{kind}.docs_per_s", values["docs_per_s"], True
+    # Load-generator reports (see ``app.benchmarks.load``).
+    for scenario, values in report.get("scenarios", {}).items():
+        for quantile in ("p50_ms", "p95_ms", "p99_ms"):
+            if values.get(quantile) is not None:
+                yield f"load.{scenario}.{quantile}", values[quantile], False
+        yield f"load.{scenario}.requests_per_s", values["requests_per_s"], True
+    # Output profile reports (see ``runner.run_output_profiles``).
+    for profile, values in report.get("profiles", {}).items():
+        yield f"profile.{profile}.end_to_end_ms", values["end_to_end_ms"], False
+        yield f"profile.{profile}.pdf_kb", values["pdf_kb"], False
+    # Markdown engine reports (see ``runner.run_engines``).
+    for engine, values in report.get("engines", {}).items():
+        yield f"engine.{engine}.markdown_ms", values["markdown_ms"], False
+        yield f"engine.{engine}.end_to_end_ms", values["end_to_end_ms"], False
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float = 0.15,
+                    min_delta_ms: float = 1.0, min_delta_kb: float = 256) -> List[Regression]:
+    """Return the metrics of ``current`` that regressed against ``baseline``.
+
+    A timing regresses when it is more than ``threshold`` slower *and* at
+    least ``min_delta_ms`` slower, so sub-millisecond stages don't flap;
+    memory likewise needs to grow by at least ``min_delta_kb``.
+    """
+    baseline_metrics: Dict[str, float] = {name: value for name, value, _ in _metrics(baseline)}
+    regressions = []
+    for name, value, higher_is_better in _metrics(current):
+        reference = baseline_metrics.get(name)
+        if reference is None:
+            continue
+        if higher_is_better:
+            if value * (1 + threshold) < reference:
+                regressions.append(Regression(name, reference, value, higher_is_better=True))
+            continue
+        floor = min_delta_ms if name.endswith("_ms") else min_delta_kb
+        if value > reference * (1 + threshold) and value - reference >= floor:
+            regressions.append(Regression(name, reference, value))
+    return regressions
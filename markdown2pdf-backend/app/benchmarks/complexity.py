@@ -0,0 +1,184 @@
+"""Growth-rate harness for the Markdown conversion stages.
+
+Each case runs one stage on inputs of increasing size, fits the exponent
+``k`` of ``time ~ size ** k`` on a log-log scale and flags stages that grow
+clearly faster than linearly. Cases include adversarial inputs (list items
+without nested lists, unclosed tags, pasted logs) as well as ordinary ones.
+"""
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Sequence
+
+from app.services.headings import HeadingCollector
+from app.services.markdown_scan import scan_markdown
+from app.services.markdown_service import (
+    ensure_nested_lists,
+    fix_table_layouts,
+    markdown_service,
+    optimize_for_pdf_wrapping,
+)
+
+KB = 1024
+MB = 1024 * KB
+
+# Exponents up to this are treated as linear (timer noise, cache effects, GC).
+MAX_LINEAR_EXPONENT = 1.3
+
+
+def _repeat_to(unit: str, size: int) -> str:
+    return unit * max(1, size // len(unit))
+
+
+def _log_lines(size: int) -> str:
+    unit = ("2024-05-01T12:00:00Z INFO worker-3 handled <request id=42> in 12ms, "
+            "path=/generate-pdf, status=200 \"ok\" [lane=fast] (cost=41.3)\n")
+    return _repeat_to(unit, size)
+
+
+def _flat_list_html(size: int) -> str:
+    # Many items and no nested list: the worst case for the old lazy regex.
+    return "<ul>\n" + _repeat_to("<li><strong>item</strong> text</li>\n", size) + "</ul>\n"
+
+
+def _nested_list_html(size: int) -> str:
+    unit = "<ul>\n<li>parent<ul>\n<li>child<ol>\n<li>leaf</li>\n</ol>\n</li>\n</ul>\n</li>\n</ul>\n"
+    return _repeat_to(unit, size)
+
+
+def _code_html(size: int) -> str:
+    unit = ("<p>Call <code>render(doc, &quot;a long quoted argument value&quot;, [1, 2])"
+            "</code>.</p>\n")
+    return _repeat_to(unit, size)
+
+
+def _unclosed_code_html(size: int) -> str:
+    return _repeat_to("<p>raw <code>tag, (without) close</p>\n", size)
+
+
+def _repeated_headings(size: int) -> str:
+    return _repeat_to("Section title\n", size)
+
+
+def _collect_headings(text: str) -> list:
+    # Every heading has the same text, the worst case for de-duplication.
+    collector = HeadingCollector()
+    for line in text.splitlines():
+        collector.add(2, line)
+    return collector.headings
+
+
+def _heading_markdown(size: int) -> str:
+    return _repeat_to("## Section *title*\n\nBody text.\n\n", size)
+
+
+def _table_html(size: int) -> str:
+    row = "<tr>\n<td>cell <code>value</code></td>\n<td>a longer description</td>\n</tr>\n"
+    return "<table>\n<tbody>\n" + _repeat_to(row, size) + "</tbody>\n</table>\n"
+
+
+def _fenced_log(size: int) -> str:
+    return "```\n" + _log_lines(size) + "```\n"
+
+
+def _list_markdown(size: int) -> str:
+    return _repeat_to("- parent item\n\n  - nested item\n  - another\n1. numbered\n", size)
+
+
+@dataclass
+class ComplexityCase:
+    """One stage applied to inputs produced by ``make_input(size_in_bytes)``."""
+
+    name: str
+    stage: Callable[[str], object]
+    make_input: Callable[[int], str]
+
+
+CASES: List[ComplexityCase] = [
+    ComplexityCase("preprocess/lists", scan_markdown, _list_markdown),
+    ComplexityCase("preprocess/log", scan_markdown, _log_lines),
+    ComplexityCase("preprocess/fenced_log", scan_markdown, _fenced_log),
+    ComplexityCase("pdf_wrapping/code", optimize_for_pdf_wrapping, _code_html),
+    ComplexityCase("pdf_wrapping/unclosed_code", optimize_for_pdf_wrapping, _unclosed_code_html),
+    ComplexityCase("nested_lists/flat", ensure_nested_lists, _flat_list_html),
+    ComplexityCase("nested_lists/nested", ensure_nested_lists, _nested_list_html),
+    ComplexityCase("tables/fixed", lambda html: fix_table_layouts(html, auto_width_tables=False),
+                   _table_html),
+    ComplexityCase("heading_ids/duplicates", _collect_headings, _repeated_headings),
+]
+
+# Full conversions are far slower per byte; only run them from the CLI.
+FULL_PIPELINE_CASES: List[ComplexityCase] = [
+    ComplexityCase("convert_body/log", markdown_service.convert_body, _log_lines),
+    ComplexityCase("convert_body/lists", markdown_service.convert_body, _list_markdown),
+    ComplexityCase("convert_body/fenced_log", markdown_service.convert_body, _fenced_log),
+    ComplexityCase("convert_body/headings",
+                   lambda text: markdown_service.convert_body(text, add_heading_ids=True),
+                   _heading_markdown),
+]
+
+
+@dataclass
+class GrowthResult:
+    """Timings of one case and the fitted growth exponent."""
+
+    name: str
+    sizes: List[int]
+    seconds: List[float]
+    exponent: float
+
+    @property
+    def linear(self) -> bool:
+        """Return whether the case grows no faster than roughly linearly."""
+        return self.exponent <= MAX_LINEAR_EXPONENT
+
+    def __str__(self) -> str:
+        timings = ", ".join(f"{size // KB} KB: {seconds * 1000:.1f} ms"
+                            for size, seconds in zip(self.sizes, self.seconds))
+        verdict = "ok" if self.linear else "SUPER-LINEAR"
+        return f"{self.name}: k={self.exponent:.2f} {verdict} ({timings})"
+
+
+def fit_exponent(sizes: Sequence[int], seconds: Sequence[float]) -> float:
+    """Least-squares slope of log(time) against log(size)."""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-7)) for value in seconds]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    denominator = sum((x - mean_x) ** 2 for x in xs)
+    return numerator / denominator
+
+
+def measure_growth(case: ComplexityCase, sizes: Sequence[int], repeat: int = 3) -> GrowthResult:
+    """Time ``case`` at each size (best of ``repeat``) and fit the growth exponent."""
+    timings = []
+    for size in sizes:
+        text = case.make_input(size)
+        best = math.inf
+        for _ in range(repeat):
+            markdown_service.clear_cache()
+            started = time.perf_counter()
+            case.stage(text)
+            best = min(best, time.perf_counter() - started)
+        timings.append(best)
+    return GrowthResult(case.name, list(sizes), timings, fit_exponent(sizes, timings))
+
+
+def geometric_sizes(smallest: int, largest: int, steps: int) -> List[int]:
+    """Return ``steps`` sizes spaced evenly on a log scale."""
+    ratio = (largest / smallest) ** (1 / (steps - 1))
+    return [int(smallest * ratio ** step) for step in range(steps)]
+
+
+def run_complexity(largest: int = 10 * MB, full_pipeline: bool = False,
+                   names: Sequence[str] | None = None) -> Dict[str, GrowthResult]:
+    """Measure every case from 1 KB to ``largest`` bytes."""
+    cases = CASES + (FULL_PIPELINE_CASES if full_pipeline else [])
+    sizes = geometric_sizes(KB, largest, 6)
+    return {
+        case.name: measure_growth(case, sizes)
+        for case in cases
+        if not names or case.name in names
+    }
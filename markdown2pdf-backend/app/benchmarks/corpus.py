@@ -0,0 +1,167 @@
+"""Deterministic synthetic Markdown corpus for benchmarks.
+
+Every document is generated from a fixed seed, so the same ``scale`` always
+produces byte-identical input and results stay comparable across runs.
+"""
+# pylint: disable=line-too-long
+from __future__ import annotations
+
+import base64
+import io
+import random
+from typing import Callable, Dict, List
+
+_WORDS = (
+    "render layout glyph table margin column latency stream buffer parser token "
+    "heading outline section paragraph kernel thread socket cache vector matrix "
+    "schedule budget sample signal metric window cursor anchor border padding"
+).split()
+
+_UNICODE_SNIPPETS = [
+    "naïve café résumé", "Ελληνικά γράμματα", "кириллица и текст", "中文排版测试",
+    "日本語の組版", "한국어 문장", "עברית מימין לשמאל", "العربية من اليمين",
+    "हिन्दी देवनागरी", "ไทยภาษา", "emoji 😀🚀📄✅", "math ∑∫√∞≠≤≥", "arrows → ⇒ ↔",
+    "quotes “smart” ‘single’ — dashes – …",
+]
+
+_CODE_SAMPLES = {
+    "python": "def handler(event):\n    total = sum(x * 2 for x in event['items'])\n    return {'total': total}\n",
+    "javascript": "export async function load(url) {\n  const res = await fetch(url);\n  return res.json();\n}\n",
+    "typescript": "interface Job { id: number; lane: 'fast' | 'bulk' }\nconst jobs: Job[] = [];\n",
+    "go": "func Sum(xs []int) (t int) {\n\tfor _, x := range xs {\n\t\tt += x\n\t}\n\treturn\n}\n",
+    "rust": "fn main() {\n    let v: Vec<u32> = (0..10).map(|x| x * x).collect();\n    println!(\"{:?}\", v);\n}\n",
+    "java": "public class App {\n  public static void main(String[] args) {\n    System.out.println(\"hi\");\n  }\n}\n",
+    "c": "#include <stdio.h>\nint main(void) {\n  for (int i = 0; i < 3; i++) printf(\"%d\\n\", i);\n}\n",
+    "sql": "SELECT client, count(*) AS renders\nFROM jobs\nWHERE lane = 'bulk'\nGROUP BY client;\n",
+    "bash": "for f in docs/*.md; do\n  python -m app.cli \"$f\" -o out\ndone\n",
+    "json": "{\n  \"documents\": [{\"markdown\": \"# One\"}],\n  \"style\": {\"size_level\": 3}\n}\n",
+    "yaml": "services:\n  api:\n    image: markdown2pdf\n    ports: [\"8000:8000\"]\n",
+    "html": "<section class=\"card\">\n  <h2>Title</h2>\n  <p>Body</p>\n</section>\n",
+}
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng, rng.randint(6, 18)) for _ in range(sentences))
+
+
+def short_note(rng: random.Random, scale: int) -> str:
+    """A few lines with inline formatting."""
+    del scale
+    return (f"# Note\n\n{_sentence(rng, 8)} **{rng.choice(_WORDS)}** and `code`.\n\n"
+            f"- {_sentence(rng, 5)}\n- {_sentence(rng, 5)}\n")
+
+
+def long_prose(rng: random.Random, scale: int) -> str:
+    """Many sections of plain paragraphs."""
+    parts = ["# Long prose"]
+    for section in range(10 * scale):
+        parts.append(f"## Section {section + 1}")
+        parts.extend(_paragraph(rng, rng.randint(3, 8)) for _ in range(4))
+    return "\n\n".join(parts) + "\n"
+
+
+def _table(rng: random.Random, rows: int, columns: int) -> str:
+    header = "| " + " | ".join(f"Column {c + 1}" for c in range(columns)) + " |"
+    divider = "| " + " | ".join("---" for _ in range(columns)) + " |"
+    body = [
+        "| " + " | ".join(_sentence(rng, rng.randint(1, 4)) for _ in range(columns)) + " |"
+        for _ in range(rows)
+    ]
+    return "\n".join([header, divider, *body])
+
+
+def large_table(rows: int, columns: int = 6, seed: int = 1234) -> str:
+    """A single table of ``rows`` rows, used for the table layout benchmark."""
+    rng = random.Random(f"{seed}:large_table")
+    return "# Large table\n\n" + _table(rng, rows, columns) + "\n"
+
+
+def photo_gallery(images: int = 4, seed: int = 1234) -> str:
+    """Paragraphs with inline JPEG photos, used for the output profile benchmark.
+
+    The images are noisy gradients larger than the page, so downsampling and
+    recompression both show up in the output size.
+    """
+    # pylint: disable=import-outside-toplevel
+    from PIL import Image
+
+    rng = random.Random(f"{seed}:photo_gallery")
+    parts = ["# Photo gallery"]
+    for index in range(images):
+        width, height = 1600, 1200
+        image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        noise = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+        buffer = io.BytesIO()
+        Image.blend(image, noise, 0.25).save(buffer, "JPEG", quality=95)
+        encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+        parts.append(_paragraph(rng, 3))
+        parts.append(f"![Photo {index + 1}](data:image/jpeg;base64,{encoded})")
+    return "\n\n".join(parts) + "\n"
+
+
+def wide_table(rng: random.Random, scale: int) -> str:
+    """A table with many columns."""
+    return "# Wide table\n\n" + _table(rng, 20 * scale, 16) + "\n"
+
+
+def tall_table(rng: random.Random, scale: int) -> str:
+    """A table with many rows."""
+    return "# Tall table\n\n" + _table(rng, 400 * scale, 4) + "\n"
+
+
+def deep_lists(rng: random.Random, scale: int) -> str:
+    """Nested bullet and numbered lists up to eight levels deep."""
+    lines = ["# Deep lists", ""]
+    for _ in range(20 * scale):
+        for depth in range(rng.randint(3, 8)):
+            marker = "1." if depth % 2 else "-"
+            lines.append("    " * depth + f"{marker} {_sentence(rng, rng.randint(3, 10))}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def code_heavy(rng: random.Random, scale: int) -> str:
+    """Fenced code blocks in many languages between short paragraphs."""
+    parts = ["# Code heavy"]
+    languages = sorted(_CODE_SAMPLES)
+    for block in range(30 * scale):
+        language = languages[block % len(languages)]
+        parts.append(_sentence(rng, 10))
+        parts.append(f"```{language}\n{_CODE_SAMPLES[language] * rng.randint(1, 6)}```")
+    return "\n\n".join(parts) + "\n"
+
+
+def unicode_heavy(rng: random.Random, scale: int) -> str:
+    """Mixed-script paragraphs, emoji and typographic glyphs."""
+    parts = ["# Unicode ✓"]
+    for _ in range(40 * scale):
+        snippets = rng.sample(_UNICODE_SNIPPETS, 4)
+        parts.append(" ".join(snippets) + " " + _sentence(rng, 6))
+    return "\n\n".join(parts) + "\n"
+
+
+GENERATORS: Dict[str, Callable[[random.Random, int], str]] = {
+    "short_note": short_note,
+    "long_prose": long_prose,
+    "wide_table": wide_table,
+    "tall_table": tall_table,
+    "deep_lists": deep_lists,
+    "code_heavy": code_heavy,
+    "unicode_heavy": unicode_heavy,
+}
+
+
+def build_corpus(scale: int = 1, seed: int = 1234,
+                 names: List[str] | None = None) -> Dict[str, str]:
+    """Return ``{name: markdown}`` for the selected document kinds."""
+    corpus = {}
+    for name in names or list(GENERATORS):
+        # A per-document seed keeps each document stable when others are added.
+        rng = random.Random(f"{seed}:{name}")
+        corpus[name] = GENERATORS[name](rng, scale)
+    return corpus
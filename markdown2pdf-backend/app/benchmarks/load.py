@@ -0,0 +1,309 @@
+"""Load generator replaying a mix of realistic requests against the API.
+
+The target is either the FastAPI app in-process (through httpx's ASGI
+transport, including its lifespan) or a running server on a local port. The
+mix is drawn from the benchmark corpus:
+
+* ``preview`` - editor ticks: a random prefix of a corpus document, as if typed
+* ``pdf`` - a final render of a whole corpus document
+* ``fonts`` - the font listing the UI loads on start
+* ``batch`` - a ZIP of a few corpus documents
+
+Load is either open-loop (``rate`` requests per second on a fixed schedule)
+or closed-loop (``concurrency`` clients sending back to back). In open-loop
+mode latency is measured from the *scheduled* start, so a stalled server
+shows up in the percentiles instead of silently slowing the generator down.
+
+Workers are sampled through ``/ready`` during the run; each sample carries the
+worker's pid, CPU time (including its render processes) and RSS.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import platform
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Coroutine, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.benchmarks.corpus import build_corpus
+
+SCENARIOS = ("preview", "pdf", "fonts", "batch")
+DEFAULT_MIX = {"preview": 70, "pdf": 20, "fonts": 5, "batch": 5}
+
+# Documents per batch job.
+_BATCH_SIZE = 3
+# Simulated clients; requests rotate through them so per-client admission
+# limits see a realistic spread instead of one very busy client. The server
+# tells them apart only with M2P_TRUST_CLIENT_ID=1.
+_CLIENTS = 8
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """Parse ``"preview=70,pdf=20"`` into scenario weights."""
+    mix: Dict[str, int] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}; expected one of {', '.join(SCENARIOS)}")
+        try:
+            mix[name] = int(weight)
+        except ValueError as e:
+            raise ValueError(f"Invalid weight for {name!r}: {weight!r}") from e
+        if mix[name] < 0:
+            raise ValueError(f"Weight for {name!r} must not be negative")
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one scenario with a positive weight")
+    return mix
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Return the nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+@dataclass
+class Sample:
+    """Outcome of one request."""
+
+    scenario: str
+    latency_ms: float
+    ok: bool
+
+
+@dataclass
+class WorkloadPlan:
+    """Deterministic stream of ``(scenario, method, path, payload)`` requests."""
+
+    mix: Dict[str, int]
+    scale: int = 1
+    seed: int = 1234
+    _rng: random.Random = field(init=False, repr=False)
+    _documents: List[str] = field(init=False, repr=False)
+    _counter: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+        self._documents = list(build_corpus(scale=self.scale, seed=self.seed).values())
+
+    def next_request(self) -> Tuple[str, str, str, Optional[dict], Dict[str, str]]:
+        """Return the next request and the headers identifying its client."""
+        names = [name for name, weight in self.mix.items() if weight > 0]
+        scenario = self._rng.choices(names, [self.mix[name] for name in names])[0]
+        self._counter += 1
+        headers = {"X-Client-ID": f"loadgen-{self._counter % _CLIENTS}"}
+        if scenario == "fonts":
+            return scenario, "GET", "/fonts", None, headers
+        if scenario == "batch":
+            documents = [{"markdown": text} for text in self._rng.sample(
+                self._documents, min(_BATCH_SIZE, len(self._documents)))]
+            return scenario, "POST", "/generate-pdf-batch", {"documents": documents}, headers
+        document = self._rng.choice(self._documents)
+        if scenario == "preview":
+            cut = self._rng.randint(max(1, len(document) // 10), len(document))
+            return scenario, "POST", "/generate-pdf-preview", {"markdown": document[:cut]}, headers
+        payload = {"markdown": document, "include_index": True}
+        return scenario, "POST", "/generate-pdf", payload, headers
+
+
+async def _send(client: httpx.AsyncClient, plan: WorkloadPlan, started: float,
+                samples: List[Sample]) -> None:
+    scenario, method, path, payload, headers = plan.next_request()
+    try:
+        response = await client.request(method, path, json=payload, headers=headers)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    samples.append(Sample(scenario, (time.perf_counter() - started) * 1000, ok))
+
+
+async def _open_loop(client: httpx.AsyncClient, plan: WorkloadPlan, rate: float,
+                     duration: float, samples: List[Sample]) -> None:
+    begin = time.perf_counter()
+    tasks = []
+    for index in range(int(rate * duration)):
+        scheduled = begin + index / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_send(client, plan, scheduled, samples)))
+    await asyncio.gather(*tasks)
+
+
+async def _closed_loop(client: httpx.AsyncClient, plan: WorkloadPlan, concurrency: int,
+                       duration: float, samples: List[Sample]) -> None:
+    deadline = time.perf_counter() + duration
+
+    async def user() -> None:
+        while time.perf_counter() < deadline:
+            await _send(client, plan, time.perf_counter(), samples)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def _sample_worker(client: httpx.AsyncClient, snapshots: Dict[int, List[dict]]) -> None:
+    try:
+        status = (await client.get("/ready")).json()
+        snapshots.setdefault(status["pid"], []).append(status)
+    except (httpx.HTTPError, ValueError, KeyError):
+        pass
+
+
+async def _sample_workers(client: httpx.AsyncClient, interval: float,
+                          snapshots: Dict[int, List[dict]], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        await _sample_worker(client, snapshots)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _wait_until_ready(client: httpx.AsyncClient, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"Target did not report ready within {timeout:.0f} s")
+        await asyncio.sleep(0.2)
+
+
+def summarize(samples: List[Sample], elapsed_s: float) -> dict:
+    """Return latency percentiles, throughput and error rate of ``samples``."""
+    latencies = sorted(sample.latency_ms for sample in samples)
+    errors = sum(1 for sample in samples if not sample.ok)
+
+    def rounded(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value, 3)
+
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "requests_per_s": round(len(samples) / elapsed_s, 3) if elapsed_s else 0.0,
+        "p50_ms": rounded(percentile(latencies, 0.50)),
+        "p95_ms": rounded(percentile(latencies, 0.95)),
+        "p99_ms": rounded(percentile(latencies, 0.99)),
+    }
+
+
+def _worker_usage(snapshots: Dict[int, List[dict]]) -> Dict[str, dict]:
+    workers = {}
+    for pid, samples in sorted(snapshots.items()):
+        first, last = samples[0], samples[-1]
+        wall = last["uptime_s"] - first["uptime_s"]
+        cpu = last["cpu_s"] - first["cpu_s"]
+        workers[str(pid)] = {
+            "samples": len(samples),
+            "cpu_s": round(cpu, 3),
+            "cpu_percent": round(cpu / wall * 100, 1) if wall > 0 else None,
+            "max_rss_kb": max(s["rss_kb"] + s.get("children_rss_kb", 0) for s in samples),
+            "requests": last["requests"],
+        }
+    return workers
+
+
+@dataclass
+class LoadSettings:  # pylint: disable=too-many-instance-attributes
+    """What to drive and how hard.
+
+    ``url`` selects a running server (e.g. ``http://127.0.0.1:8000``); without
+    it the app is driven in-process, where the reported CPU time also includes
+    the generator itself. ``rate`` switches from closed-loop ``concurrency``
+    clients to an open-loop schedule.
+    """
+
+    url: Optional[str] = None
+    mix: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    rate: Optional[float] = None
+    concurrency: int = 4
+    duration: float = 30.0
+    scale: int = 1
+    seed: int = 1234
+    timeout: float = 120.0
+    sample_interval: float = 1.0
+    label: str = ""
+
+    def meta(self) -> dict:
+        """Return the settings that make two reports comparable."""
+        return {
+            "label": self.label,
+            "target": self.url or "in-process",
+            "mix": self.mix,
+            "rate": self.rate,
+            "concurrency": None if self.rate else self.concurrency,
+            "duration_s": self.duration,
+            "scale": self.scale,
+            "seed": self.seed,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        }
+
+
+async def _drive(client: httpx.AsyncClient, settings: LoadSettings) -> dict:
+    plan = WorkloadPlan(settings.mix, scale=settings.scale, seed=settings.seed)
+    samples: List[Sample] = []
+    snapshots: Dict[int, List[dict]] = {}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(
+        _sample_workers(client, settings.sample_interval, snapshots, stop))
+    begin = time.perf_counter()
+    load: Coroutine[Any, Any, None]
+    if settings.rate:
+        load = _open_loop(client, plan, settings.rate, settings.duration, samples)
+    else:
+        load = _closed_loop(client, plan, settings.concurrency, settings.duration, samples)
+    try:
+        await load
+    finally:
+        elapsed = time.perf_counter() - begin
+        stop.set()
+        await sampler
+        await _sample_worker(client, snapshots)
+    return {
+        "scenarios": {
+            name: summarize([s for s in samples if s.scenario == name], elapsed)
+            for name in SCENARIOS if any(s.scenario == name for s in samples)
+        },
+        "total": summarize(samples, elapsed),
+        "elapsed_s": round(elapsed, 3),
+        "workers": _worker_usage(snapshots),
+    }
+
+
+async def _run_in_process(settings: LoadSettings) -> dict:
+    # pylint: disable=import-outside-toplevel
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadgen",
+                                     timeout=settings.timeout) as client:
+            await _wait_until_ready(client, settings.timeout)
+            return await _drive(client, settings)
+
+
+async def _run_remote(settings: LoadSettings) -> dict:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=settings.url or "", timeout=settings.timeout,
+                                 limits=limits) as client:
+        await _wait_until_ready(client, settings.timeout)
+        return await _drive(client, settings)
+
+
+def run_load(settings: LoadSettings) -> dict:
+    """Run the workload and return a JSON-friendly report."""
+    result = asyncio.run(_run_remote(settings) if settings.url else _run_in_process(settings))
+    result["meta"] = settings.meta()
+    return result
@@ -0,0 +1,75 @@
+"""Compare the HTML produced by the markdown engines.
+
+Engines differ in markup that does not change the rendered document:
+attribute order and quoting, ``<br>`` versus ``<br />``, entity escaping,
+whitespace between block tags and ``style`` formatting. ``normalize_html``
+removes those differences so that what is left is a real difference.
+"""
+from __future__ import annotations
+
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+from app.services.markdown_service import markdown_service
+
+_BLOCK_TAGS = ("blockquote|br|colgroup|dd|div|dl|dt|h[1-6]|hr|li|ol|p|pre|table|tbody|td|th"
+               "|thead|tr|ul")
+# Whitespace next to block tags is not rendered.
+_BLOCK_SPACE_RE = re.compile(rf"\s*(</?(?:{_BLOCK_TAGS})\b[^>]*>)\s*")
+
+
+class _Normalizer(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        normalized = []
+        for name, value in sorted(attrs):
+            value = value or ""
+            if name == "style":
+                value = ";".join(rule.replace(" ", "") for rule in value.split(";") if rule.strip())
+            normalized.append(f' {name}="{value}"')
+        self.parts.append(f"<{tag}{''.join(normalized)}>")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self.parts.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        self.parts.append(re.sub(r"\s+", " ", data))
+
+
+def normalize_html(html: str) -> str:
+    """Return ``html`` with the markup differences that do not affect rendering removed."""
+    parser = _Normalizer()
+    parser.feed(html)
+    parser.close()
+    return _BLOCK_SPACE_RE.sub(r"\1", "".join(parser.parts)).strip()
+
+
+def first_difference(expected: str, actual: str, context: int = 60) -> Optional[str]:
+    """Describe where two normalized documents first differ, or return None if equal."""
+    if expected == actual:
+        return None
+    index = next((i for i, (a, b) in enumerate(zip(expected, actual)) if a != b),
+                 min(len(expected), len(actual)))
+    start = max(0, index - context)
+    return (f"at {index}: {expected[start:index + context]!r} "
+            f"!= {actual[start:index + context]!r}")
+
+
+def compare_engines(documents: Dict[str, str], reference: str = "python-markdown",
+                    candidate: str = "markdown-it") -> Dict[str, Optional[str]]:
+    """Convert every document with both engines; map names to their first difference."""
+    results = {}
+    for name, markdown_text in documents.items():
+        expected = markdown_service.convert_body(markdown_text, add_heading_ids=True,
+                                                 engine=reference)
+        actual = markdown_service.convert_body(markdown_text, add_heading_ids=True,
+                                               engine=candidate)
+        results[name] = first_difference(normalize_html(expected), normalize_html(actual))
+    return results
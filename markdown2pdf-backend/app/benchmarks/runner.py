@@ -0,0 +1,249 @@
+"""Run the benchmark corpus and collect per-stage timings, throughput and memory."""
+from __future__ import annotations
+
+import platform
+import statistics
+import time
+import tracemalloc
+from typing import Dict, List
+
+from app.benchmarks.corpus import build_corpus, large_table, photo_gallery
+from app.benchmarks.parity import compare_engines
+from app.models import OutputProfile, PDFGenerationRequest
+from app.services.markdown_service import markdown_service
+from app.services.pdf_service import pdf_service
+from app.services.stage_timing import record_stages
+
+
+def _median_stages(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    names = sorted({name for sample in samples for name in sample})
+    return {name: round(statistics.median(sample.get(name, 0.0) for sample in samples), 3)
+            for name in names}
+
+
+def _measure(markdown_text: str, pdf: bool, repeat: int) -> dict:
+    request = PDFGenerationRequest(markdown=markdown_text, include_index=True)
+    html_samples: List[Dict[str, float]] = []
+    html_totals: List[float] = []
+    pdf_samples: List[Dict[str, float]] = []
+    pdf_totals: List[float] = []
+    for _ in range(repeat):
+        markdown_service.clear_cache()
+        with record_stages() as timings:
+            started = time.perf_counter()
+            markdown_service.convert_to_html(markdown_text, css="", include_index=True)
+            html_totals.append((time.perf_counter() - started) * 1000)
+        html_samples.append(timings)
+
+        if pdf:
+            markdown_service.clear_cache()
+            with record_stages() as timings:
+                started = time.perf_counter()
+                pdf_service.generate_pdf(request)
+                pdf_totals.append((time.perf_counter() - started) * 1000)
+            pdf_samples.append(timings)
+
+    # Peak Python heap of one cold end-to-end conversion, measured separately
+    # because tracing allocations distorts the timings above.
+    markdown_service.clear_cache()
+    tracemalloc.start()
+    try:
+        if pdf:
+            pdf_service.generate_pdf(request)
+        else:
+            markdown_service.convert_to_html(markdown_text, css="", include_index=True)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        "input_bytes": len(markdown_text.encode("utf-8")),
+        "html": {"stages_ms": _median_stages(html_samples),
+                 "end_to_end_ms": round(statistics.median(html_totals), 3)},
+        "peak_memory_kb": peak // 1024,
+    }
+    if pdf:
+        result["pdf"] = {"stages_ms": _median_stages(pdf_samples),
+                         "end_to_end_ms": round(statistics.median(pdf_totals), 3)}
+    return result
+
+
+def run_benchmarks(scale: int = 1, repeat: int = 3, pdf: bool = True,
+                   names: List[str] | None = None) -> dict:
+    """Benchmark every corpus document and return a JSON-friendly report."""
+    corpus = build_corpus(scale=scale, names=names)
+    # Fonts, stylesheets and imports are one-off costs; keep them out of the numbers.
+    _measure("# Warm-up\n\ntext\n", pdf, 1)
+
+    documents = {name: _measure(text, pdf, repeat) for name, text in corpus.items()}
+    total_bytes = sum(doc["input_bytes"] for doc in documents.values())
+    report: dict = {
+        "meta": {
+            "scale": scale,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "documents": documents,
+        "throughput": {},
+    }
+    for kind in ("html", "pdf") if pdf else ("html",):
+        seconds = sum(doc[kind]["end_to_end_ms"] for doc in documents.values()) / 1000
+        report["throughput"][kind] = {
+            "docs_per_s": round(len(documents) / seconds, 3),
+            "mb_per_s": round(total_bytes / seconds / 1e6, 3),
+        }
+    return report
+
+
+def run_table_layouts(rows: int = 10000, columns: int = 6, repeat: int = 1) -> dict:
+    """Time PDF rendering of one large table with auto and fixed table layout.
+
+    Run with ``M2P_AUTO_TABLE_MAX_ROWS=0`` (the CLI does) so that the auto mode
+    is not switched to the fixed layout for long tables.
+    """
+    markdown_text = large_table(rows, columns)
+    _measure("# Warm-up\n\n| a |\n| - |\n| 1 |\n", True, 1)
+    report: dict = {"meta": {"rows": rows, "columns": columns, "repeat": repeat,
+                             "python": platform.python_version(),
+                             "machine": platform.machine()},
+                    "modes": {}}
+    for mode, auto_width_tables in (("auto", True), ("fixed", False)):
+        request = PDFGenerationRequest(markdown=markdown_text, auto_width_tables=auto_width_tables)
+        samples: List[Dict[str, float]] = []
+        totals: List[float] = []
+        for _ in range(repeat):
+            markdown_service.clear_cache()
+            with record_stages() as timings:
+                started = time.perf_counter()
+                pdf_service.generate_pdf(request)
+                totals.append((time.perf_counter() - started) * 1000)
+            samples.append(timings)
+        report["modes"][mode] = {"stages_ms": _median_stages(samples),
+                                 "end_to_end_ms": round(statistics.median(totals), 3)}
+    return report
+
+
+def run_output_profiles(scale: int = 1, repeat: int = 3, names: List[str] | None = None) -> dict:
+    """Time PDF rendering of the corpus with every output profile and record the PDF sizes.
+
+    A photo gallery is rendered along with the corpus so that the image
+    recompression of the ``compact`` profile is measured too.
+    """
+    corpus = {**build_corpus(scale=scale, names=names), "photo_gallery": photo_gallery()}
+    _measure("# Warm-up\n\ntext\n", True, 1)
+    report: dict = {"meta": {"scale": scale, "repeat": repeat,
+                             "python": platform.python_version(),
+                             "machine": platform.machine()},
+                    "profiles": {}}
+    for profile in OutputProfile:
+        documents: Dict[str, dict] = {}
+        for name, markdown_text in corpus.items():
+            request = PDFGenerationRequest(markdown=markdown_text, include_index=True,
+                                           output_profile=profile)
+            samples: List[Dict[str, float]] = []
+            totals: List[float] = []
+            pdf_bytes = 0
+            for _ in range(repeat):
+                markdown_service.clear_cache()
+                with record_stages() as timings:
+                    started = time.perf_counter()
+                    pdf_bytes = len(pdf_service.generate_pdf(request))
+                    totals.append((time.perf_counter() - started) * 1000)
+                samples.append(timings)
+            documents[name] = {"stages_ms": _median_stages(samples),
+                               "end_to_end_ms": round(statistics.median(totals), 3),
+                               "pdf_kb": round(pdf_bytes / 1024, 1)}
+        report["profiles"][profile.value] = {
+            "documents": documents,
+            "end_to_end_ms": round(sum(doc["end_to_end_ms"] for doc in documents.values()), 3),
+            "pdf_kb": round(sum(doc["pdf_kb"] for doc in documents.values()), 1),
+        }
+    return report
+
+
+def _payload(size: int) -> bytes:
+    """Stand-in for a rendered PDF of ``size`` bytes, built inside the worker."""
+    return bytes(size)
+
+
+def run_result_transport(sizes_mb: List[float], repeat: int = 3) -> dict:  # pylint: disable=too-many-locals
+    """Time handing results of each size from a worker process to this one.
+
+    ``pickle`` is the plain process-pool result, ``shared_memory`` the
+    transport used for buffered render results. The time runs from
+    submitting the job until every byte has been read in this process; the
+    traced heap peak shows the copies made here.
+    """
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor
+
+    from app.services.render_executor import _timed_call  # pylint: disable=protected-access
+    from app.services.result_transport import CHUNK_SIZE, ResultBuffer
+
+    report: dict = {"meta": {"repeat": repeat, "python": platform.python_version(),
+                             "machine": platform.machine()},
+                    "sizes": {}}
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        pool.submit(_payload, 1).result()
+        for size_mb in sizes_mb:
+            size = int(size_mb * 1024 * 1024)
+            modes = {}
+            for mode, export in (("pickle", False), ("shared_memory", True)):
+                totals: List[float] = []
+                peaks: List[int] = []
+                for _ in range(repeat):
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    result, _ = pool.submit(_timed_call, _payload, (size,), export).result()
+                    with ResultBuffer(result) as buffer, buffer.view() as view:
+                        for start in range(0, buffer.size, CHUNK_SIZE):
+                            bytes(view[start:start + CHUNK_SIZE])
+                    totals.append((time.perf_counter() - started) * 1000)
+                    del result
+                    peaks.append(tracemalloc.get_traced_memory()[1] // 1024)
+                    tracemalloc.stop()
+                modes[mode] = {"end_to_end_ms": round(statistics.median(totals), 3),
+                               "peak_memory_kb": max(peaks)}
+            report["sizes"][f"{size_mb:g}MB"] = modes
+    return report
+
+
+def run_engines(scale: int = 1, repeat: int = 3, names: List[str] | None = None) -> dict:
+    """Time HTML conversion of the corpus with every markdown engine and check their parity.
+
+    Only the ``markdown`` stage differs between engines; the end-to-end time
+    includes the shared post-processing so the numbers match ``run --html-only``.
+    """
+    corpus = build_corpus(scale=scale, names=names)
+    total_bytes = sum(len(text.encode("utf-8")) for text in corpus.values())
+    report: dict = {"meta": {"scale": scale, "repeat": repeat,
+                             "python": platform.python_version(),
+                             "machine": platform.machine()},
+                    "engines": {},
+                    "parity": compare_engines(corpus)}
+    for engine in markdown_service.engines:
+        markdown_service.convert_body("# Warm-up\n\ntext\n", engine=engine)
+        documents: Dict[str, dict] = {}
+        for name, markdown_text in corpus.items():
+            samples: List[Dict[str, float]] = []
+            totals: List[float] = []
+            for _ in range(repeat):
+                markdown_service.clear_cache()
+                with record_stages() as timings:
+                    started = time.perf_counter()
+                    markdown_service.convert_body(markdown_text, add_heading_ids=True,
+                                                  engine=engine)
+                    totals.append((time.perf_counter() - started) * 1000)
+                samples.append(timings)
+            documents[name] = {"stages_ms": _median_stages(samples),
+                               "end_to_end_ms": round(statistics.median(totals), 3)}
+        seconds = sum(doc["end_to_end_ms"] for doc in documents.values()) / 1000
+        report["engines"][engine] = {
+            "documents": documents,
+            "markdown_ms": round(sum(doc["stages_ms"].get("markdown", 0.0)
+                                     for doc in documents.values()), 3),
+            "end_to_end_ms": round(seconds * 1000, 3),
+            "mb_per_s": round(total_bytes / seconds / 1e6, 3),
+        }
+    return report
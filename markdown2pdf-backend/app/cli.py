@@ -0,0 +1,361 @@
+"""Command-line batch converter for Markdown trees.
+
+Converts every ``.md`` file below a directory into a PDF in a mirrored output
+tree, rendering in parallel across a process pool. A manifest in the output
+directory records a fingerprint of each input (its text, the images it
+references, the styling options and the stylesheets), so unchanged files are
+skipped on re-run and ``--watch`` only re-renders what changed.
+
+Usage::
+
+    python -m app.cli docs/ -o build/pdf --size-level 2 --include-index
+    python -m app.cli docs/ -o build/pdf --watch
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models import MarkdownEngineOption, OutputProfile, PDFGenerationRequest, SpacingOption
+from app.services.font_service import font_service
+from app.services.theme_service import theme_registry
+
+MANIFEST_NAME = ".m2p-manifest.json"
+_MANIFEST_VERSION = 1
+
+# Local images referenced from markdown or inline HTML.
+_IMAGE_RE = re.compile(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)>?(?:\s+[\"'][^)]*)?\)")
+_IMG_TAG_RE = re.compile(r"<img\b[^>]*\bsrc=[\"']([^\"']+)[\"']", re.IGNORECASE)
+_URL_SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def asset_paths(markdown_text: str, base_dir: Path) -> List[Path]:
+    """Return the existing local files referenced as images by ``markdown_text``."""
+    assets = set()
+    for match in (*_IMAGE_RE.finditer(markdown_text), *_IMG_TAG_RE.finditer(markdown_text)):
+        target = match.group(1).split("#", 1)[0].split("?", 1)[0]
+        if not target or _URL_SCHEME_RE.match(target) or target.startswith("//"):
+            continue
+        path = (base_dir / target).resolve()
+        if path.is_file():
+            assets.add(path)
+    return sorted(assets)
+
+
+@dataclass
+class SourceFile:
+    """A markdown input with the fingerprint of everything its PDF depends on."""
+
+    path: Path
+    relative: str
+    fingerprint: str
+    size: int
+    assets: List[Path] = field(default_factory=list)
+
+
+class Manifest:
+    """Fingerprints of the inputs behind each PDF in the output directory."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") == _MANIFEST_VERSION:
+            self.entries = data.get("files", {})
+
+    def is_current(self, source: SourceFile, output: Path) -> bool:
+        """Return whether ``output`` was rendered from exactly this input."""
+        entry = self.entries.get(source.relative)
+        return (entry is not None and entry["fingerprint"] == source.fingerprint
+                and output.exists())
+
+    def update(self, source: SourceFile, output: Path) -> None:
+        """Record that ``output`` is up to date for ``source``."""
+        self.entries[source.relative] = {
+            "fingerprint": source.fingerprint,
+            "output": str(output),
+            "assets": [str(asset) for asset in source.assets],
+        }
+
+    def forget(self, relative: str) -> None:
+        """Drop the entry of an input that no longer exists."""
+        self.entries.pop(relative, None)
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps({"version": _MANIFEST_VERSION, "files": self.entries},
+                       indent=2, sort_keys=True),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class Summary:
+    """Outcome and throughput of one conversion pass."""
+
+    converted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    elapsed_s: float = 0.0
+
+    def __str__(self) -> str:
+        elapsed = max(self.elapsed_s, 1e-6)
+        return (f"converted {self.converted}, skipped {self.skipped}, failed {self.failed} "
+                f"in {self.elapsed_s:.2f} s ({self.converted / elapsed:.1f} files/s, "
+                f"{self.input_bytes / elapsed / 1e6:.2f} MB/s markdown, "
+                f"{self.output_bytes / 1e6:.1f} MB PDF)")
+
+
+def _render_file(source: str, output: str, options: dict) -> Tuple[int, float]:
+    """Render one markdown file to ``output`` (runs in a worker process)."""
+    # pylint: disable=import-outside-toplevel
+    from app.services.pdf_service import pdf_service
+
+    started = time.perf_counter()
+    source_path = Path(source).resolve()
+    markdown_text = source_path.read_text(encoding="utf-8")
+    # Images are resolved next to the source, as ``asset_paths`` fingerprints them.
+    pdf_bytes = pdf_service.generate_pdf(PDFGenerationRequest(markdown=markdown_text, **options),
+                                         base_dir=source_path.parent)
+    output_path = Path(output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(".pdf.tmp")
+    tmp_path.write_bytes(pdf_bytes)
+    os.replace(tmp_path, output_path)
+    return len(pdf_bytes), (time.perf_counter() - started) * 1000
+
+
+class TreeConverter:
+    """Incrementally convert a tree of markdown files into PDFs."""
+
+    def __init__(self, input_path: Path, output_dir: Path, options: dict) -> None:
+        self.input_path = input_path.resolve()
+        self.root = self.input_path if self.input_path.is_dir() else self.input_path.parent
+        self.output_dir = output_dir.resolve()
+        self.options = options
+        self.manifest = Manifest(self.output_dir / MANIFEST_NAME)
+        # The stylesheets' hash is included so a theme change re-renders everything.
+        self._options_key = json.dumps(options, sort_keys=True) + theme_registry.fingerprint()
+        # Stat signature of a source and its assets -> SourceFile, so watch
+        # mode only re-reads files whose size or mtime changed.
+        self._scan_cache: Dict[Path, Tuple[tuple, SourceFile]] = {}
+
+    def discover(self) -> List[Path]:
+        """Return the markdown files to convert, skipping hidden and output directories."""
+        if self.input_path.is_file():
+            return [self.input_path]
+        found = []
+        for path in sorted(self.root.rglob("*.md")):
+            relative_parts = path.relative_to(self.root).parts
+            if any(part.startswith(".") for part in relative_parts):
+                continue
+            if self.output_dir in path.parents:
+                continue
+            found.append(path)
+        return found
+
+    def scan(self, paths: Iterable[Path]) -> List[SourceFile]:
+        """Fingerprint each source, reusing results for files that did not change."""
+        sources = []
+        for path in paths:
+            cached = self._scan_cache.get(path)
+            if cached is not None and cached[0] == _stat_signature([path, *cached[1].assets]):
+                sources.append(cached[1])
+                continue
+            try:
+                source = self._fingerprint(path)
+            except OSError as e:
+                # Removed or replaced since discover(), e.g. by an editor that
+                # saves by renaming; the next pass picks the new file up.
+                self._scan_cache.pop(path, None)
+                print(f"SKIPPED {path.relative_to(self.root).as_posix()}: {e}", file=sys.stderr)
+                continue
+            self._scan_cache[path] = (_stat_signature([path, *source.assets]), source)
+            sources.append(source)
+        return sources
+
+    def _fingerprint(self, path: Path) -> SourceFile:
+        """Hash a source with the options and the images it references."""
+        raw = path.read_bytes()
+        assets = asset_paths(raw.decode("utf-8", errors="replace"), path.parent)
+        digest = hashlib.sha256(self._options_key.encode("utf-8"))
+        digest.update(raw)
+        for asset in assets:
+            digest.update(str(asset).encode("utf-8"))
+            digest.update(_sha256_file(asset).encode("ascii"))
+        return SourceFile(path=path, relative=path.relative_to(self.root).as_posix(),
+                          fingerprint=digest.hexdigest(), size=len(raw), assets=assets)
+
+    def output_for(self, source: SourceFile) -> Path:
+        """Return the PDF path mirroring ``source`` below the output directory."""
+        return self.output_dir / Path(source.relative).with_suffix(".pdf")
+
+    def run_once(self, pool: Executor, force: bool = False) -> Summary:
+        """Convert every stale source and return the pass summary."""
+        started = time.perf_counter()
+        summary = Summary()
+        paths = self.discover()
+        self._forget_missing(paths)
+        sources = self.scan(paths)
+
+        futures: Dict[Future, SourceFile] = {}
+        for source in sources:
+            output = self.output_for(source)
+            if not force and self.manifest.is_current(source, output):
+                summary.skipped += 1
+                continue
+            futures[pool.submit(_render_file, str(source.path), str(output), self.options)] = source
+
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                pdf_size, render_ms = future.result()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                summary.failed += 1
+                print(f"FAILED {source.relative}: {e}", file=sys.stderr)
+                continue
+            summary.converted += 1
+            summary.input_bytes += source.size
+            summary.output_bytes += pdf_size
+            self.manifest.update(source, self.output_for(source))
+            output = self.output_for(source)
+            print(f"{source.relative} -> {output.relative_to(self.output_dir)} "
+                  f"({render_ms:.0f} ms)")
+
+        self.manifest.save()
+        summary.elapsed_s = time.perf_counter() - started
+        return summary
+
+    def _forget_missing(self, paths: Iterable[Path]) -> None:
+        """Drop manifest entries of sources that are gone.
+
+        Entries follow the discovered files rather than the scanned ones, so a
+        file skipped by one scan is not re-rendered on the next.
+        """
+        present = {path.relative_to(self.root).as_posix() for path in paths}
+        for relative in list(self.manifest.entries):
+            if relative not in present:
+                self.manifest.forget(relative)
+
+    def watch(self, pool: Executor, interval: float) -> None:
+        """Re-render changed files until interrupted."""
+        print(f"Watching {self.input_path} (Ctrl+C to stop)")
+        while True:
+            time.sleep(interval)
+            summary = self.run_once(pool)
+            if summary.converted or summary.failed:
+                print(summary)
+
+
+def _stat_signature(paths: Iterable[Path]) -> tuple:
+    signature: List[tuple] = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            signature.append((str(path), None))
+        else:
+            signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def _parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli",
+        description="Convert a tree of Markdown files into PDFs.",
+    )
+    parser.add_argument("input", type=Path, help="markdown file or directory")
+    parser.add_argument("-o", "--output", type=Path, default=Path("pdf"),
+                        help="output directory (default: ./pdf)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--font-family", default="Inter",
+                        choices=font_service.get_available_fonts())
+    parser.add_argument("--size-level", type=int, default=3, choices=range(1, 6))
+    parser.add_argument("--spacing", default=SpacingOption.DEFAULT.value,
+                        choices=[option.value for option in SpacingOption])
+    parser.add_argument("--no-auto-width-tables", dest="auto_width_tables",
+                        action="store_false")
+    parser.add_argument("--image-dpi", type=int, default=150,
+                        help="resolution images are downsampled to (default: 150)")
+    parser.add_argument("--output-profile", default=OutputProfile.STANDARD.value,
+                        choices=[profile.value for profile in OutputProfile],
+                        help="draft renders fastest, compact writes the smallest files")
+    parser.add_argument("--markdown-engine", default=None,
+                        choices=[engine.value for engine in MarkdownEngineOption],
+                        help="markdown parser (default: $M2P_MARKDOWN_ENGINE or python-markdown)")
+    parser.add_argument("--code-theme", default=None, choices=theme_registry.code_themes(),
+                        help="code highlighting theme (default: code-highlight.css)")
+    parser.add_argument("--include-index", action="store_true")
+    parser.add_argument("--index-depth", type=int, default=3, choices=range(1, 7),
+                        help="deepest heading level listed in the index (default: 3)")
+    parser.add_argument("--add-page-breaks", action="store_true")
+    parser.add_argument("--force", action="store_true",
+                        help="re-render files even if the manifest says they are current")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and re-render files as they change")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="watch polling interval in seconds (default: 1)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the converter; return the process exit code."""
+    args = _parse_args(argv)
+    if not args.input.exists():
+        print(f"No such file or directory: {args.input}", file=sys.stderr)
+        return 2
+
+    options = {
+        "font_family": args.font_family,
+        "size_level": args.size_level,
+        "spacing": args.spacing,
+        "auto_width_tables": args.auto_width_tables,
+        "image_dpi": args.image_dpi,
+        "output_profile": args.output_profile,
+        "markdown_engine": args.markdown_engine,
+        "code_theme": args.code_theme,
+        "include_index": args.include_index,
+        "index_depth": args.index_depth,
+        "add_page_breaks": args.add_page_breaks,
+    }
+    converter = TreeConverter(args.input, args.output, options)
+    with ProcessPoolExecutor(max_workers=args.jobs or os.cpu_count() or 1) as pool:
+        summary = converter.run_once(pool, force=args.force)
+        print(summary)
+        if args.watch:
+            try:
+                converter.watch(pool, args.interval)
+            except KeyboardInterrupt:
+                pass
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,55 @@
 """FastAPI application entrypoint for Markdown to PDF service."""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
-from fastapi import FastAPI
+
+# Load environment variables before the services read their configuration
+load_dotenv()
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+# pylint: disable=wrong-import-position
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.api import api_router
+from app.services import render_executor
+from app.services.result_transport import sweep_orphans
+from app.services.warmup import WARMUP_ENABLED, warm_up, worker_status
+
+# Probe endpoints don't count as the worker's first real request.
+_PROBE_PATHS = {"/health", "/ready"}
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Warm the worker up in the background and shut the render pools down on exit."""
+    warmup_task = None
+    # Workers the prefork server starts on reload warm up before serving.
+    if worker_status.pid != os.getpid() or not worker_status.ready:
+        worker_status.start()
+        if WARMUP_ENABLED:
+            warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+        else:
+            worker_status.ready = True
+    # Shared memory left behind by render results of a crashed server.
+    sweep_orphans()
+    yield
+    if warmup_task is not None:
+        await warmup_task
+    render_executor.shutdown()
 
-# Load environment variables
-load_dotenv()
 
 # Create FastAPI app
 app = FastAPI(
     title="Markdown2PDF API",
     description="API for converting Markdown to PDF with custom styling",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -34,7 +71,25 @@ app.add_middleware(
 app.include_router(api_router)
 
 
+@app.middleware("http")
+async def track_first_request(request: Request, call_next):
+    """Record request counts and the latency of the worker's first request."""
+    if request.url.path in _PROBE_PATHS:
+        return await call_next(request)
+    started = time.perf_counter()
+    response = await call_next(request)
+    worker_status.record_request((time.perf_counter() - started) * 1000)
+    return response
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "ok"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint: 503 until this worker has finished its warm-up render"""
+    status = worker_status.as_dict()
+    return JSONResponse(status_code=200 if worker_status.ready else 503, content=status)
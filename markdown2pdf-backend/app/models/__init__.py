@@ -1,5 +1,29 @@
 """Public exports for request models."""
 
-from .pdf_request import PDFGenerationRequest, SpacingOption
+from .pdf_request import (
+    BatchDocument,
+    MarkdownEngineOption,
+    MergeSection,
+    OutputProfile,
+    PDFBatchRequest,
+    PDFGenerationRequest,
+    PDFMergeRequest,
+    PDFStyleOptions,
+    PDFVariantsRequest,
+    SpacingOption,
+    StyleVariant,
+)
 
-__all__ = ["PDFGenerationRequest", "SpacingOption"]
+__all__ = [
+    "BatchDocument",
+    "MarkdownEngineOption",
+    "MergeSection",
+    "OutputProfile",
+    "PDFBatchRequest",
+    "PDFGenerationRequest",
+    "PDFMergeRequest",
+    "PDFStyleOptions",
+    "PDFVariantsRequest",
+    "SpacingOption",
+    "StyleVariant",
+]
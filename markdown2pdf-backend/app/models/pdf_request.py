@@ -1,10 +1,17 @@
 """Request models for PDF generation and formatting options."""
+import os
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, validator
 
 from app.services.font_service import font_service
+from app.services.image_service import DEFAULT_IMAGE_DPI
+from app.services.theme_service import theme_registry
+
+BATCH_MAX_DOCUMENTS = int(os.getenv("M2P_BATCH_MAX_DOCUMENTS", "1000"))
+MERGE_MAX_SECTIONS = int(os.getenv("M2P_MERGE_MAX_SECTIONS", "200"))
+MAX_STYLE_VARIANTS = int(os.getenv("M2P_MAX_STYLE_VARIANTS", "16"))
 
 
 class SpacingOption(str, Enum):
@@ -15,31 +22,177 @@ class SpacingOption(str, Enum):
     SPACIOUS = "spacious"
 
 
-class PDFGenerationRequest(BaseModel):
-    """Payload for generating PDFs or previews."""
+class OutputProfile(str, Enum):
+    """Trade-off between PDF size and render speed."""
+
+    DRAFT = "draft"
+    STANDARD = "standard"
+    COMPACT = "compact"
+
+
+class MarkdownEngineOption(str, Enum):
+    """Markdown parser; unset uses the deployment's ``M2P_MARKDOWN_ENGINE``."""
+
+    PYTHON_MARKDOWN = "python-markdown"
+    MARKDOWN_IT = "markdown-it"
+
+
+class PDFStyleOptions(BaseModel):
+    """Styling options shared by single, batch and multi-document requests."""
 
-    markdown: str
     font_family: Optional[str] = "Inter"
-    size_level: int = Field(3, ge=1, le=5)
+    size_level: int = Field(default=3, ge=1, le=5)
     spacing: SpacingOption = SpacingOption.DEFAULT
     auto_width_tables: bool = True
-    filename: Optional[str] = None
+    image_dpi: int = Field(default=DEFAULT_IMAGE_DPI, ge=36, le=600)
+    output_profile: OutputProfile = OutputProfile.STANDARD
+    markdown_engine: Optional[MarkdownEngineOption] = None
+    # Code highlighting theme (see GET /code-themes); unset uses the default theme
+    code_theme: Optional[str] = None
     include_index: bool = False
+    # Deepest heading level in the index (and the PDF bookmarks)
+    index_depth: int = Field(default=3, ge=1, le=6)
     add_page_breaks: bool = False
 
+    @validator("font_family")
+    @classmethod
+    def font_family_available(cls, v):
+        """Ensure the requested font is available."""
+        return _validate_font_family(v)
+
+    @validator("code_theme")
+    @classmethod
+    def code_theme_available(cls, v):
+        """Ensure the requested code theme is loaded."""
+        return _validate_code_theme(v)
+
+
+def _validate_font_family(v: Optional[str]) -> Optional[str]:
+    if v:
+        if v not in font_service.get_available_fonts():
+            raise ValueError("Unsupported font family")
+    return v
+
+
+def _validate_code_theme(v: Optional[str]) -> Optional[str]:
+    if v and v not in theme_registry.code_themes():
+        raise ValueError("Unsupported code theme")
+    return v
+
+
+def _validate_markdown(v: str) -> str:
+    # isspace() instead of strip(): no copy of a multi-megabyte document
+    if not v or v.isspace():
+        raise ValueError("Markdown cannot be empty")
+    return v
+
+
+class PDFGenerationRequest(PDFStyleOptions):
+    """Payload for generating PDFs or previews."""
+
+    markdown: str
+    filename: Optional[str] = None
+
     @validator("markdown")
     @classmethod
     def markdown_must_not_be_empty(cls, v):
         """Reject empty markdown submissions."""
-        if not v.strip():
-            raise ValueError("Markdown cannot be empty")
-        return v
+        return _validate_markdown(v)
+
+
+class BatchDocument(BaseModel):
+    """A single document in a batch request.
+
+    ``style`` only needs the fields that differ from the batch-wide style.
+    """
+
+    markdown: str
+    filename: Optional[str] = None
+    style: Optional[PDFStyleOptions] = None
+
+    @validator("markdown")
+    @classmethod
+    def markdown_must_not_be_empty(cls, v):
+        """Reject empty markdown submissions."""
+        return _validate_markdown(v)
+
+
+class PDFBatchRequest(BaseModel):
+    """Payload for converting many documents into a ZIP of PDFs."""
+
+    documents: List[BatchDocument] = Field(..., min_length=1, max_length=BATCH_MAX_DOCUMENTS)
+    style: PDFStyleOptions = PDFStyleOptions()
+    filename: Optional[str] = None
+
+    def document_requests(self) -> List[PDFGenerationRequest]:
+        """Resolve every document against the batch-wide style."""
+        shared = self.style.model_dump()
+        return [
+            PDFGenerationRequest(
+                markdown=doc.markdown,
+                filename=doc.filename,
+                **{**shared, **(doc.style.model_dump(exclude_unset=True) if doc.style else {})},
+            )
+            for doc in self.documents
+        ]
+
+
+class MergeSection(BaseModel):
+    """One section of a merged document.
+
+    ``id`` is an optional stable key; it prefixes the section's heading IDs
+    and lets unchanged sections be reused even when sections are reordered.
+    """
+
+    markdown: str
+    id: Optional[str] = Field(default=None, max_length=64)
+
+    @validator("markdown")
+    @classmethod
+    def markdown_must_not_be_empty(cls, v):
+        """Reject empty markdown submissions."""
+        return _validate_markdown(v)
+
+
+class PDFMergeRequest(PDFStyleOptions):
+    """Payload for merging several markdown sections into a single PDF."""
+
+    sections: List[MergeSection] = Field(..., min_length=1, max_length=MERGE_MAX_SECTIONS)
+    filename: Optional[str] = None
+
+
+class StyleVariant(BaseModel):
+    """One styling variant of a document; unset fields keep the request's values."""
+
+    name: Optional[str] = Field(default=None, max_length=64)
+    font_family: Optional[str] = None
+    size_level: Optional[int] = Field(default=None, ge=1, le=5)
+    spacing: Optional[SpacingOption] = None
+    output_profile: Optional[OutputProfile] = None
+    code_theme: Optional[str] = None
 
     @validator("font_family")
     @classmethod
     def font_family_available(cls, v):
         """Ensure the requested font is available."""
-        if v:
-            if v not in font_service.get_available_fonts():
-                raise ValueError("Unsupported font family")
-        return v
+        return _validate_font_family(v)
+
+    @validator("code_theme")
+    @classmethod
+    def code_theme_available(cls, v):
+        """Ensure the requested code theme is loaded."""
+        return _validate_code_theme(v)
+
+
+class PDFVariantsRequest(PDFGenerationRequest):
+    """Payload for rendering one document in several styling variants."""
+
+    variants: List[StyleVariant] = Field(..., min_length=1, max_length=MAX_STYLE_VARIANTS)
+
+    def variant_styles(self) -> List[PDFStyleOptions]:
+        """Resolve every variant against the request's own styling options."""
+        base = self.model_dump(exclude={"markdown", "filename", "variants"})
+        return [
+            PDFStyleOptions(**{**base, **variant.model_dump(exclude_unset=True, exclude={"name"})})
+            for variant in self.variants
+        ]
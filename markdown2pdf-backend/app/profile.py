@@ -0,0 +1,17 @@
+"""Deployment profile selected with ``M2P_PROFILE``.
+
+``full`` (the default) serves every endpoint. ``preview`` serves only the
+HTML preview, font and operational endpoints and never imports WeasyPrint or
+ReportLab, which keeps cold starts short for scale-to-zero preview fleets.
+"""
+import os
+
+FULL_PROFILE = "full"
+PREVIEW_PROFILE = "preview"
+
+PROFILE = os.getenv("M2P_PROFILE", FULL_PROFILE).lower()
+
+
+def preview_only() -> bool:
+    """Return whether this process runs the preview-only profile."""
+    return PROFILE == PREVIEW_PROFILE
@@ -0,0 +1,139 @@
+"""Render worker that runs render jobs for API servers on other nodes.
+
+The worker preloads everything a render needs, like the prefork server, and
+runs the jobs it receives in a pool of ``--workers`` processes (threads with
+``M2P_RENDER_POOL=thread``). Health checks are answered with the pool's size
+and the number of jobs in flight, which the API uses to pick the least loaded
+worker. See ``app.services.remote_render`` for the protocol.
+
+Usage::
+
+    M2P_RENDER_WORKER_SECRET=... python -m app.render_worker --host 0.0.0.0 --port 9000
+
+and list the worker in the API's ``M2P_RENDER_WORKERS``.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import pickle
+import signal
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Tuple
+
+from app.services.remote_render import (
+    ProtocolError, ReplayGuard, read_message, write_message,
+)
+from app.services.render_executor import _timed_call  # pylint: disable=protected-access
+from app.services.warmup import preload
+
+logger = logging.getLogger(__name__)
+
+_POOL_KIND = os.getenv("M2P_RENDER_POOL", "process").lower()
+_WORKERS = int(os.getenv("M2P_RENDER_WORKER_PROCESSES", str(os.cpu_count() or 1)))
+
+
+def _portable(error: Exception) -> Exception:
+    """Return ``error`` if it can be sent back, else a ``RuntimeError`` describing it."""
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:  # pylint: disable=broad-exception-caught
+        return RuntimeError(f"{type(error).__name__}: {error}")
+    return error
+
+
+class RenderWorker:  # pylint: disable=too-few-public-methods
+    """Serve render jobs and health checks on one TCP port."""
+
+    def __init__(self, workers: int, secret: bytes) -> None:
+        self.capacity = max(1, workers)
+        self.in_flight = 0
+        self._secret = secret
+        self._replays = ReplayGuard()
+        self._pool: Executor
+        if _POOL_KIND == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=self.capacity,
+                                            thread_name_prefix="render-remote")
+        else:
+            self._pool = ProcessPoolExecutor(max_workers=self.capacity)
+
+    async def serve(self, host: str, port: int) -> None:
+        """Accept connections until cancelled, then wait for running jobs."""
+        serving = asyncio.current_task()
+        if serving is not None:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+        server = await asyncio.start_server(self._handle, host, port)
+        logger.info("render worker %d listening on %s:%d with %d slots", os.getpid(), host, port,
+                    self.capacity)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._pool.shutdown(wait=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    message = await read_message(reader, self._secret)
+                except asyncio.IncompleteReadError:
+                    return
+                request_id, body = self._replays.accept(message)
+                reply = await self._answer(body)
+                try:
+                    await write_message(writer, (request_id, reply), self._secret)
+                except ProtocolError as e:
+                    # A result too large for one frame: report it rather than
+                    # dropping the connection, which the API would retry.
+                    reply = ("failed", RuntimeError(str(e)), 0.0, self.in_flight)
+                    await write_message(writer, (request_id, reply), self._secret)
+        except ProtocolError as e:
+            logger.warning("dropping connection from %s: %s", writer.get_extra_info("peername"), e)
+        except ConnectionError:
+            # The API gave up on the job (its client went away); nothing to send.
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, message: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        if message[0] == "health":
+            return ("health", self.capacity, self.in_flight)
+        if message[0] != "render":
+            raise ProtocolError(f"Unknown message {message[0]!r}")
+        _, fn, args = message
+        self.in_flight += 1
+        try:
+            result, elapsed_ms = await asyncio.wrap_future(self._pool.submit(_timed_call, fn, args))
+            reply: Tuple[Any, ...] = ("done", result, elapsed_ms)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            reply = ("failed", _portable(e), 0.0)
+        finally:
+            self.in_flight -= 1
+        return (*reply, self.in_flight)
+
+
+def main() -> None:
+    """Parse command-line options and run the render worker."""
+    parser = argparse.ArgumentParser(description="Run a Markdown2PDF render worker.")
+    parser.add_argument("--host", default=os.getenv("M2P_RENDER_WORKER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int,
+                        default=int(os.getenv("M2P_RENDER_WORKER_PORT", "9000")))
+    parser.add_argument("--workers", type=int, default=_WORKERS)
+    args = parser.parse_args()
+    secret = os.getenv("M2P_RENDER_WORKER_SECRET", "")
+    if not secret:
+        parser.error("M2P_RENDER_WORKER_SECRET must be set")
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    # Loaded once here and inherited by the forked pool processes.
+    preload()
+    try:
+        asyncio.run(RenderWorker(args.workers, secret.encode("utf-8")).serve(args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("render worker %d stopped", os.getpid())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Production prefork server for the Markdown to PDF service.
+
+The master process imports the application, preloads WeasyPrint, fonts,
+stylesheets and Markdown extensions (see ``app.services.warmup``), binds the
+listening socket and then forks uvicorn workers that share all of it
+copy-on-write. Workers are recycled after a (jittered) number of requests or
+when their RSS grows past a limit, and are replaced as they exit.
+
+Signals: ``SIGTERM``/``SIGINT`` stop gracefully, ``SIGHUP`` replaces every
+worker one at a time, retiring each old worker only once its replacement
+has finished its warm-up render (see ``/ready``) and is serving.
+
+Usage::
+
+    python -m app.server --host 0.0.0.0 --port 8000 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Optional, Set
+
+import uvicorn
+
+from app.main import app
+from app.services.warmup import WARMUP_ENABLED, preload, rss_kb, warm_up, worker_status
+
+logger = logging.getLogger(__name__)
+
+_WORKERS = int(os.getenv("M2P_WORKERS", str(os.cpu_count() or 1)))
+# Requests served before a worker is replaced (0 disables), plus random jitter
+# so that workers started together don't all restart together.
+_MAX_REQUESTS = int(os.getenv("M2P_WORKER_MAX_REQUESTS", "1000"))
+_MAX_REQUESTS_JITTER = int(os.getenv("M2P_WORKER_MAX_REQUESTS_JITTER", "100"))
+# Resident memory after which a worker finishes its requests and exits (0 disables).
+_MAX_RSS_MB = int(os.getenv("M2P_WORKER_MAX_RSS_MB", "0"))
+_GRACEFUL_TIMEOUT = float(os.getenv("M2P_GRACEFUL_TIMEOUT", "30"))
+# Seconds a replacement worker may take to warm up and serve before a reload gives up.
+_READY_TIMEOUT = float(os.getenv("M2P_WORKER_READY_TIMEOUT", "60"))
+
+# A worker dying sooner than this after start is likely crashing on boot.
+_MIN_WORKER_LIFETIME_S = 5.0
+
+
+def _watch_rss(server: uvicorn.Server) -> None:
+    limit_kb = _MAX_RSS_MB * 1024
+    while not server.should_exit:
+        if rss_kb() > limit_kb:
+            logger.info("worker %d exceeded %d MB RSS; recycling", os.getpid(), _MAX_RSS_MB)
+            server.should_exit = True
+            return
+        time.sleep(5)
+
+
+def _report_ready(server: uvicorn.Server, ready_fd: int) -> None:
+    """Tell the master through ``ready_fd`` once the server has warmed up and accepts requests."""
+    try:
+        while not (server.started and worker_status.ready) and not server.should_exit:
+            time.sleep(0.05)
+        if not server.should_exit:
+            os.write(ready_fd, b"1")
+    except OSError:
+        pass  # the master stopped waiting
+    finally:
+        os.close(ready_fd)
+
+
+def _serve_worker(sock: socket.socket, ready_fd: Optional[int] = None) -> None:
+    """Run one uvicorn server on the inherited listening socket."""
+    max_requests = None
+    if _MAX_REQUESTS:
+        max_requests = _MAX_REQUESTS + random.randint(0, _MAX_REQUESTS_JITTER)
+    config = uvicorn.Config(
+        app,
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=int(_GRACEFUL_TIMEOUT),
+        # Keep the logging configured by app.main.
+        log_config=None,
+    )
+    server = uvicorn.Server(config)
+    if _MAX_RSS_MB:
+        threading.Thread(target=_watch_rss, args=(server,), daemon=True).start()
+    if ready_fd is not None:
+        # A replacement shares the listening socket with the workers it
+        # replaces; it warms up before it starts taking connections from it.
+        worker_status.start()
+        if WARMUP_ENABLED:
+            warm_up()
+        worker_status.ready = True
+        threading.Thread(target=_report_ready, args=(server, ready_fd), daemon=True).start()
+    logger.info("worker %d started (rss=%d KiB)", os.getpid(), rss_kb())
+    server.run(sockets=[sock])
+
+
+class PreforkServer:  # pylint: disable=too-few-public-methods
+    """Fork and supervise uvicorn workers sharing one listening socket."""
+
+    def __init__(self, host: str, port: int, workers: int) -> None:
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self._children: Dict[int, float] = {}
+        self._retiring: Set[int] = set()
+        self._stopping = False
+        self._reload = False
+
+    def run(self) -> None:
+        """Preload, fork the workers and supervise them until stopped."""
+        preload()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        logger.info("master %d listening on %s:%d with %d workers",
+                    os.getpid(), self.host, self.port, self.workers)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        for _ in range(self.workers):
+            self._spawn(sock)
+        try:
+            while not self._stopping:
+                if self._reload:
+                    self._reload = False
+                    self._replace_all(sock)
+                self._reap(sock)
+                time.sleep(0.5)
+        finally:
+            self._shutdown()
+            sock.close()
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _handle_stop(self, _signum, _frame) -> None:
+        self._stopping = True
+
+    def _handle_reload(self, _signum, _frame) -> None:
+        self._reload = True
+
+    def _spawn(self, sock: socket.socket, ready_fd: Optional[int] = None) -> int:
+        pid = os.fork()
+        if pid == 0:
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            code = 0
+            try:
+                _serve_worker(sock, ready_fd)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = time.monotonic()
+        return pid
+
+    def _reap(self, sock: socket.socket) -> None:
+        """Collect exited workers and start replacements."""
+        while self._children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            started_at = self._children.pop(pid, None)
+            if started_at is None:
+                continue
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+                continue
+            logger.info("worker %d exited with status %d", pid, os.waitstatus_to_exitcode(status))
+            if self._stopping:
+                continue
+            if time.monotonic() - started_at < _MIN_WORKER_LIFETIME_S:
+                time.sleep(1)
+            self._spawn(sock)
+
+    def _replace_all(self, sock: socket.socket) -> None:
+        """Start a fresh worker for each current one and retire the old one once it is ready.
+
+        If a replacement fails to start, it is stopped and the remaining old
+        workers keep serving.
+        """
+        for pid in list(self._children):
+            if pid in self._retiring:
+                continue
+            read_fd, write_fd = os.pipe()
+            try:
+                new_pid = self._spawn(sock, write_fd)
+            finally:
+                os.close(write_fd)
+            try:
+                ready = self._wait_ready(read_fd)
+            finally:
+                os.close(read_fd)
+            if not ready:
+                if not self._stopping:
+                    logger.warning("worker %d did not become ready; keeping the old workers",
+                                   new_pid)
+                self._retire(new_pid)
+                return
+            self._retire(pid)
+
+    def _wait_ready(self, ready_fd: int) -> bool:
+        """Wait until the worker writing to ``ready_fd`` serves, exits or times out."""
+        deadline = time.monotonic() + _READY_TIMEOUT
+        while not self._stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([ready_fd], [], [], min(remaining, 0.5))
+            if readable:
+                return os.read(ready_fd, 1) == b"1"  # b"" when the worker died
+        return False
+
+    def _retire(self, pid: int) -> None:
+        self._retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _shutdown(self) -> None:
+        for pid in self._children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + _GRACEFUL_TIMEOUT + 5
+        while self._children and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.1)
+            else:
+                self._children.pop(pid, None)
+        for pid in self._children:
+            logger.warning("worker %d did not stop in time; killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+
+
+def main() -> None:
+    """Parse command-line options and run the prefork server."""
+    parser = argparse.ArgumentParser(description="Run the Markdown2PDF API with prefork workers.")
+    parser.add_argument("--host", default=os.getenv("M2P_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("M2P_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=_WORKERS)
+    args = parser.parse_args()
+    PreforkServer(args.host, args.port, args.workers).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,27 @@
 """Expose service singletons for convenient imports."""
 
+from app.services.artifact_service import artifact_store
+from app.services.cost_service import cost_estimator
 from app.services.font_service import font_service
+from app.services.font_subset_service import font_subsetter
+from app.services.image_service import image_service
 from app.services.markdown_service import markdown_service
 from app.services.pdf_service import pdf_service
+from app.services.remote_render import remote_workers
+from app.services.render_executor import render_executor
+from app.services.scheduler import scheduler
+from app.services.theme_service import theme_registry
 
-__all__ = ["font_service", "markdown_service", "pdf_service"]
+__all__ = [
+    "artifact_store",
+    "cost_estimator",
+    "font_service",
+    "font_subsetter",
+    "image_service",
+    "markdown_service",
+    "pdf_service",
+    "remote_workers",
+    "render_executor",
+    "scheduler",
+    "theme_registry",
+]
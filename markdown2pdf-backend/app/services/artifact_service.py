@@ -0,0 +1,199 @@
+"""Short-lived, on-disk store for rendered PDFs.
+
+Render workers write the PDF straight into a file here instead of returning
+its bytes, so a large PDF is neither pickled back from the worker process nor
+held in memory while it is sent. Files are served with ``Content-Length``,
+``HEAD`` and byte ranges, and kept for ``M2P_ARTIFACT_TTL`` seconds so that
+retries and resumed downloads of the same render are answered from disk.
+The directory is limited to ``M2P_ARTIFACT_MAX_BYTES``; past it the least
+recently served PDFs are evicted. With a TTL of 0 each PDF is deleted as soon
+as its response has been sent.
+
+Artifacts are keyed by a hash of the request, which makes them shared by all
+workers of a server and means identical requests are rendered only once.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.services.disk_cache import DiskBudget, touch
+
+logger = logging.getLogger(__name__)
+
+_ARTIFACT_DIR = Path(os.getenv("M2P_ARTIFACT_DIR",
+                               str(Path(tempfile.gettempdir()) / "m2p-artifacts")))
+# Seconds a rendered PDF is kept; 0 disables retention (files are still spooled).
+_ARTIFACT_TTL = float(os.getenv("M2P_ARTIFACT_TTL", "300"))
+# Bytes of rendered PDFs kept on disk (0 disables the limit).
+_ARTIFACT_MAX_BYTES = int(os.getenv("M2P_ARTIFACT_MAX_BYTES", str(2 << 30)))
+# Seconds between looking a PDF up and opening it for a response; an open
+# file is still sent in full after it is deleted.
+_OPEN_GRACE = 10.0
+# Temporary files are deleted after this many seconds, so renders still
+# writing them are never cut short.
+_PURGE_GRACE = 600
+# Bump when rendering changes so stale artifacts are not served after a deploy.
+_ARTIFACT_VERSION = 1
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+@dataclass(frozen=True)
+class Artifact:
+    """A rendered file and the key it is served under."""
+
+    key: str
+    path: Path
+    size: int
+
+
+class ArtifactStore:  # pylint: disable=too-many-instance-attributes
+    """Spool renders to disk, share identical in-flight renders and expire old files."""
+
+    def __init__(self, directory: Path = _ARTIFACT_DIR, ttl: float = _ARTIFACT_TTL,
+                 max_bytes: int = _ARTIFACT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.budget = DiskBudget(max_bytes, (".pdf",), _OPEN_GRACE)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Responses still to send each PDF returned by ``get_or_create``.
+        self._readers: Dict[str, int] = {}
+        self._readers_lock = threading.Lock()
+        self._last_purge = 0.0
+        self._purge_lock = threading.Lock()
+
+    @staticmethod
+    def key_for(kind: str, payload: str) -> str:
+        """Return the artifact key of a ``kind`` render of ``payload`` (e.g. request JSON)."""
+        digest = hashlib.sha256(f"{_ARTIFACT_VERSION}\0{kind}\0".encode("utf-8"))
+        digest.update(payload.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Artifact]:
+        """Return the artifact stored under ``key`` unless it is unknown or expired."""
+        if not _KEY_RE.match(key):
+            return None
+        path = self.directory / f"{key}.pdf"
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        if time.time() - stat.st_mtime > self.ttl:
+            return None
+        touch(path)
+        return Artifact(key, path, stat.st_size)
+
+    async def get_or_create(self, key: str,
+                            render: Callable[[str], Awaitable[object]]) -> Artifact:
+        """Return the artifact for ``key``, calling ``render(path)`` to write it if needed.
+
+        Concurrent calls for the same key share one render. Each call must be
+        matched by a ``release`` once its response has been sent.
+        """
+        artifact = await self._get_or_create(key, render)
+        with self._readers_lock:
+            self._readers[key] = self._readers.get(key, 0) + 1
+        return artifact
+
+    def release(self, artifact: Artifact) -> None:
+        """Drop a response's hold on ``artifact``; without retention the last one deletes it."""
+        with self._readers_lock:
+            readers = self._readers.pop(artifact.key, 0) - 1
+            if readers > 0:
+                self._readers[artifact.key] = readers
+                return
+        if self.ttl <= 0:
+            artifact.path.unlink(missing_ok=True)
+
+    async def _get_or_create(self, key: str,
+                             render: Callable[[str], Awaitable[object]]) -> Artifact:
+        artifact = self.get(key)
+        if artifact is not None:
+            return artifact
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request that was rendering it went away: render it here.
+                return await self._get_or_create(key, render)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            artifact = await self._create(key, render)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiting callers re-raise it; don't warn when nobody was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(artifact)
+            return artifact
+        finally:
+            del self._inflight[key]
+
+    async def _create(self, key: str, render: Callable[[str], Awaitable[object]]) -> Artifact:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.purge()
+        path = self.directory / f"{key}.pdf"
+        tmp_path = path.with_name(f"{path.name}.{secrets.token_hex(8)}.tmp")
+        try:
+            await render(str(tmp_path))
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        size = path.stat().st_size
+        self.budget.charge(self.directory, size)
+        return Artifact(key, path, size)
+
+    def purge(self, force: bool = False) -> int:
+        """Delete expired artifacts, at most once a minute unless forced."""
+        now = time.time()
+        with self._purge_lock:
+            if not force and now - self._last_purge < 60:
+                return 0
+            self._last_purge = now
+        removed = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return 0
+        for entry in entries:
+            # Leftover temporary files of crashed renders are deleted too.
+            is_pdf = entry.name.endswith(".pdf")
+            max_age = self.ttl + _OPEN_GRACE if is_pdf else _PURGE_GRACE
+            try:
+                if now - entry.stat().st_mtime <= max_age:
+                    continue
+                os.unlink(entry.path)
+            except OSError:
+                continue
+            removed += 1
+            if is_pdf:
+                # Responses that never finished sending don't hold it any more.
+                with self._readers_lock:
+                    self._readers.pop(entry.name[:-len(".pdf")], None)
+        if removed:
+            logger.debug("purged %d expired artifact(s)", removed)
+        return removed
+
+
+# Singleton instance
+artifact_store = ArtifactStore()
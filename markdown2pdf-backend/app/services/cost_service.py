@@ -0,0 +1,120 @@
+"""Pre-flight render cost estimation for Markdown documents.
+
+The estimator walks the raw Markdown once, before ``convert_to_html`` runs,
+with the same scanner that preprocesses it for parsing (``markdown_scan``),
+and counts the features that dominate WeasyPrint layout time (blocks, table
+cells, code lines, list nesting and headings). The counts are combined into a
+predicted render time which is used to route requests to the low-latency or
+the bulk render lane. Predicted and actual timings are logged so the weights
+can be calibrated against production traffic.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import asdict, dataclass
+
+from app.services.markdown_scan import scan_markdown
+
+logger = logging.getLogger(__name__)
+
+FAST_LANE = "fast"
+BULK_LANE = "bulk"
+MERGE_LANE = "merge"
+
+# Predicted milliseconds per unit of each feature. These are starting values;
+# recalibrate them from the ``render cost`` log lines.
+_COST_WEIGHTS = {
+    "base": 40.0,
+    "kilobyte": 1.5,
+    "block": 0.8,
+    "table_cell": 0.2,
+    "code_line": 0.3,
+    "heading": 0.5,
+    "list_depth": 2.0,
+}
+
+# Previews skip WeasyPrint layout entirely, so they cost a fraction of a PDF.
+_PREVIEW_COST_FACTOR = 0.1
+
+_FAST_LANE_MAX_COST_MS = float(os.getenv("M2P_FAST_LANE_MAX_COST_MS", "750"))
+
+
+@dataclass
+class DocumentCost:  # pylint: disable=too-many-instance-attributes
+    """Feature counts and predicted render cost for a single document."""
+
+    total_bytes: int = 0
+    blocks: int = 0
+    table_cells: int = 0
+    code_lines: int = 0
+    list_depth: int = 0
+    headings: int = 0
+    predicted_ms: float = 0.0
+    lane: str = FAST_LANE
+
+    def as_dict(self) -> dict:
+        """Return the cost as a plain dict for logging and metrics."""
+        return asdict(self)
+
+
+class CostEstimator:
+    """Predict render cost from cheap structural statistics."""
+
+    def estimate(self, markdown_text: str, for_preview: bool = False) -> DocumentCost:
+        """Analyse ``markdown_text`` in a single pass and predict its render cost."""
+        stats = scan_markdown(markdown_text, rewrite=False).stats
+        cost = DocumentCost(
+            total_bytes=len(markdown_text.encode("utf-8")),
+            blocks=stats.blocks,
+            table_cells=stats.table_cells,
+            code_lines=stats.code_lines,
+            list_depth=stats.list_depth,
+            headings=stats.headings,
+        )
+        cost.predicted_ms = self._predict_ms(cost)
+        if for_preview:
+            cost.predicted_ms *= _PREVIEW_COST_FACTOR
+        cost.lane = FAST_LANE if cost.predicted_ms <= _FAST_LANE_MAX_COST_MS else BULK_LANE
+        return cost
+
+    def estimate_many(self, markdown_texts: list[str], lane: str) -> DocumentCost:
+        """Estimate the combined cost of several documents rendered as one job on ``lane``."""
+        total = DocumentCost(lane=lane)
+        for markdown_text in markdown_texts:
+            cost = self.estimate(markdown_text)
+            total.total_bytes += cost.total_bytes
+            total.blocks += cost.blocks
+            total.table_cells += cost.table_cells
+            total.code_lines += cost.code_lines
+            total.list_depth = max(total.list_depth, cost.list_depth)
+            total.headings += cost.headings
+            total.predicted_ms += cost.predicted_ms
+        return total
+
+    def record(self, cost: DocumentCost, actual_ms: float, kind: str) -> None:
+        """Log predicted versus actual cost so the weights can be calibrated."""
+        ratio = actual_ms / cost.predicted_ms if cost.predicted_ms else 0.0
+        logger.info(
+            "render cost kind=%s lane=%s predicted_ms=%.1f actual_ms=%.1f ratio=%.2f "
+            "bytes=%d blocks=%d table_cells=%d code_lines=%d list_depth=%d headings=%d",
+            kind, cost.lane, cost.predicted_ms, actual_ms, ratio,
+            cost.total_bytes, cost.blocks, cost.table_cells, cost.code_lines,
+            cost.list_depth, cost.headings,
+        )
+
+    @staticmethod
+    def _predict_ms(cost: DocumentCost) -> float:
+        return (
+            _COST_WEIGHTS["base"]
+            + _COST_WEIGHTS["kilobyte"] * cost.total_bytes / 1024
+            + _COST_WEIGHTS["block"] * cost.blocks
+            + _COST_WEIGHTS["table_cell"] * cost.table_cells
+            + _COST_WEIGHTS["code_line"] * cost.code_lines
+            + _COST_WEIGHTS["heading"] * cost.headings
+            + _COST_WEIGHTS["list_depth"] * cost.list_depth
+        )
+
+
+# Singleton instance
+cost_estimator = CostEstimator()
@@ -0,0 +1,97 @@
+"""Byte budgets for the on-disk caches (processed images, font subsets, artifacts).
+
+Each cache owns a directory. ``DiskBudget`` keeps a running estimate of the
+directory's size and, once a new file takes it past the budget, rescans it and
+deletes the least recently used files until it is back below a low-water mark.
+A file counts as used when it is written or passed to ``touch``, which sets
+its access time explicitly (``noatime`` mounts only skip implicit updates).
+Rescanning corrects the estimates of processes that share one directory.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Eviction frees space down to this fraction of the budget, so that every
+# new file does not trigger another scan.
+_LOW_WATER = 0.9
+
+
+def touch(path: Path) -> None:
+    """Mark ``path`` as just used without changing its modification time."""
+    try:
+        os.utime(path, ns=(time.time_ns(), path.stat().st_mtime_ns))
+    except OSError:
+        pass
+
+
+class DiskBudget:  # pylint: disable=too-few-public-methods
+    """Keep the files of a cache directory under ``max_bytes``, evicting the least recently used.
+
+    Only files ending in one of ``suffixes`` are counted and evicted. Files
+    used within the last ``min_idle`` seconds are kept even over budget, as a
+    render may be about to open them. A budget of 0 disables eviction.
+    """
+
+    def __init__(self, max_bytes: int, suffixes: Tuple[str, ...], min_idle: float = 10.0) -> None:
+        self.max_bytes = max_bytes
+        self.suffixes = suffixes
+        self.min_idle = min_idle
+        self._used: Dict[Path, int] = {}
+        self._lock = threading.Lock()
+
+    def charge(self, directory: Path, size: int) -> int:
+        """Account for a new ``size``-byte file in ``directory`` and return the files evicted."""
+        if self.max_bytes <= 0:
+            return 0
+        with self._lock:
+            used = self._used.get(directory)
+            if used is not None and used + size <= self.max_bytes:
+                self._used[directory] = used + size
+                return 0
+            removed, self._used[directory] = self._evict(directory)
+        if removed:
+            logger.debug("evicted %d file(s) from %s", removed, directory)
+        return removed
+
+    def _evict(self, directory: Path) -> Tuple[int, int]:
+        """Delete the least recently used files down to the low-water mark.
+
+        Returns the number of files removed and the bytes left.
+        """
+        entries = []
+        try:
+            with os.scandir(directory) as scan:
+                for entry in scan:
+                    if not entry.name.endswith(self.suffixes):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entry.path))
+        except OSError:
+            return 0, 0
+        used = sum(size for _, size, _ in entries)
+        if used <= self.max_bytes:
+            return 0, used
+
+        removed = 0
+        target = self.max_bytes * _LOW_WATER
+        idle_before = time.time() - self.min_idle
+        for last_used, size, path in sorted(entries):
+            if used <= target or last_used > idle_before:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            used -= size
+            removed += 1
+        return removed, used
@@ -0,0 +1,140 @@
+"""Fallback fonts for scripts the document fonts don't cover.
+
+The bundled families cover Latin (most also Greek and Cyrillic). Text in
+other scripts used to fall through ``_FONT_STACKS`` to ``'DejaVu Sans'``,
+after which Pango asks fontconfig for a font with each missing glyph, which
+is slow and depends on what the host has installed.
+
+``detect_scripts`` finds the scripts a document uses, and the registry maps
+them to fallback families bundled in ``M2P_FALLBACK_FONTS_DIR`` (see
+``download_fonts.py``). Only the families whose scripts appear are added to
+the render's stylesheet, as ``@font-face`` rules limited to their scripts'
+``unicode-range`` and named in the font stacks right after the document font.
+ASCII documents return from ``detect_scripts`` after one ``isascii`` check.
+"""
+from __future__ import annotations
+
+import os
+from bisect import bisect_right
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_FALLBACK_FONTS_DIR = Path(os.getenv(
+    "M2P_FALLBACK_FONTS_DIR", str(Path(__file__).parent.parent / "static" / "fonts" / "fallback")))
+
+# Code point ranges of the scripts that have fallback fonts. Latin, and
+# everything else not listed, is left to the document fonts.
+SCRIPT_RANGES: Dict[str, Tuple[Tuple[int, int], ...]] = {
+    "greek": ((0x0370, 0x03FF), (0x1F00, 0x1FFF)),
+    "cyrillic": ((0x0400, 0x052F), (0x1C80, 0x1C8F), (0x2DE0, 0x2DFF), (0xA640, 0xA69F)),
+    "hebrew": ((0x0590, 0x05FF), (0xFB1D, 0xFB4F)),
+    "arabic": ((0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF), (0xFB50, 0xFDFF),
+               (0xFE70, 0xFEFF)),
+    "devanagari": ((0x0900, 0x097F), (0xA8E0, 0xA8FF)),
+    "thai": ((0x0E00, 0x0E7F),),
+    "hangul": ((0x1100, 0x11FF), (0x3130, 0x318F), (0xAC00, 0xD7AF)),
+    "cjk": ((0x2E80, 0x2FDF), (0x3000, 0x30FF), (0x31F0, 0x31FF), (0x3400, 0x4DBF),
+            (0x4E00, 0x9FFF), (0xF900, 0xFAFF), (0xFF00, 0xFFEF), (0x20000, 0x2FA1F)),
+    "emoji": ((0x2600, 0x27BF), (0x1F000, 0x1FAFF)),
+}
+
+_RANGES = sorted((start, end, script) for script, ranges in SCRIPT_RANGES.items()
+                 for start, end in ranges)
+_STARTS = [start for start, _, _ in _RANGES]
+
+
+def detect_scripts(text: str) -> frozenset[str]:
+    """Return the scripts in ``SCRIPT_RANGES`` that ``text`` has characters of."""
+    if text.isascii():
+        return frozenset()
+    scripts = set()
+    for char in set(text):
+        codepoint = ord(char)
+        if codepoint < 0x0370:
+            continue
+        index = bisect_right(_STARTS, codepoint) - 1
+        if index >= 0 and codepoint <= _RANGES[index][1]:
+            scripts.add(_RANGES[index][2])
+    return frozenset(scripts)
+
+
+@dataclass(frozen=True)
+class FallbackFont:
+    """A bundled font family that covers some scripts."""
+
+    family: str
+    filename: str
+    scripts: Tuple[str, ...]
+
+    @property
+    def unicode_range(self) -> str:
+        """The CSS ``unicode-range`` of the font's scripts."""
+        return ", ".join(f"U+{start:04X}-{end:04X}" for script in self.scripts
+                         for start, end in SCRIPT_RANGES[script])
+
+
+# Tried in order; the first available font covering a script is used for it.
+FALLBACK_FONTS: Tuple[FallbackFont, ...] = (
+    FallbackFont("Noto Sans", "NotoSans-Regular.ttf", ("greek", "cyrillic")),
+    FallbackFont("Noto Sans Hebrew", "NotoSansHebrew-Regular.ttf", ("hebrew",)),
+    FallbackFont("Noto Sans Arabic", "NotoSansArabic-Regular.ttf", ("arabic",)),
+    FallbackFont("Noto Sans Devanagari", "NotoSansDevanagari-Regular.ttf", ("devanagari",)),
+    FallbackFont("Noto Sans Thai", "NotoSansThai-Regular.ttf", ("thai",)),
+    FallbackFont("Noto Sans CJK SC", "NotoSansCJKsc-Regular.otf", ("cjk", "hangul")),
+    FallbackFont("Noto Color Emoji", "NotoColorEmoji.ttf", ("emoji",)),
+)
+
+
+class FallbackFontRegistry:
+    """Fallback fonts present on disk, looked up by script."""
+
+    def __init__(self, fonts_dir: Path = _FALLBACK_FONTS_DIR,
+                 fonts: Iterable[FallbackFont] = FALLBACK_FONTS) -> None:
+        self.fonts_dir = fonts_dir
+        self._fonts = list(fonts)
+        self._available: Optional[List[FallbackFont]] = None
+
+    def register(self, font: FallbackFont) -> None:
+        """Add a fallback font, tried after the ones already registered."""
+        self._fonts.append(font)
+        self._available = None
+
+    def available(self) -> List[FallbackFont]:
+        """Return the registered fonts whose files exist, checked once."""
+        if self._available is None:
+            self._available = [font for font in self._fonts
+                               if (self.fonts_dir / font.filename).is_file()]
+        return self._available
+
+    def for_scripts(self, scripts: Iterable[str]) -> List[FallbackFont]:
+        """Return the fonts to add for ``scripts``, one per script, in registry order."""
+        missing = set(scripts)
+        chosen = []
+        for font in self.available() if missing else ():
+            if missing.intersection(font.scripts):
+                missing.difference_update(font.scripts)
+                chosen.append(font)
+        return chosen
+
+    def font_face_css(self, fonts: Iterable[FallbackFont]) -> str:
+        """Return ``@font-face`` rules loading ``fonts`` for their scripts only."""
+        return "\n".join(
+            f"@font-face {{ font-family: '{font.family}'; "
+            f"src: url('{(self.fonts_dir / font.filename).resolve().as_uri()}'); "
+            f"unicode-range: {font.unicode_range}; }}"
+            for font in fonts
+        )
+
+    @staticmethod
+    def font_stack(stack: str, fonts: Iterable[FallbackFont]) -> str:
+        """Name ``fonts`` in a CSS font stack right after its first family."""
+        families = [f"'{font.family}'" for font in fonts]
+        if not families:
+            return stack
+        first, _, rest = stack.partition(", ")
+        return ", ".join([first, *families, *([rest] if rest else [])])
+
+
+# Singleton instance
+fallback_fonts = FallbackFontRegistry()
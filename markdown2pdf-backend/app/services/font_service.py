@@ -1,10 +1,11 @@
 """Font registration and lookup helpers for PDF/preview rendering."""
 # pylint: disable=line-too-long,too-many-branches,too-many-return-statements,broad-exception-caught,no-else-return
-from typing import List
+from typing import Iterable, List, Optional
 import os
 from pathlib import Path
-from reportlab.pdfbase import pdfmetrics  # type: ignore[import-untyped]
-from reportlab.pdfbase.ttfonts import TTFont  # type: ignore[import-untyped]
+
+from app.profile import preview_only
+from app.services.font_subset_service import font_subsetter
 
 
 class FontService:
@@ -133,6 +134,22 @@ class FontService:
         if self._fonts_registered:
             return
 
+        if preview_only():
+            # HTML previews load fonts through @font-face; skip importing ReportLab.
+            self._monospace_font = next(
+                (family for family in ("MesloLGS", "SourceCodePro")
+                 if all(os.path.exists(self.fonts_path / filename)
+                        for filename in self.available_fonts[family].values())),
+                "Courier",
+            )
+            self._fonts_registered = True
+            return
+
+        # ReportLab is only needed here; import it lazily to keep startup fast.
+        # pylint: disable=import-outside-toplevel
+        from reportlab.pdfbase import pdfmetrics  # type: ignore[import-untyped]
+        from reportlab.pdfbase.ttfonts import TTFont  # type: ignore[import-untyped]
+
         # Register all available fonts
         for font_family, variants in self.available_fonts.items():
             try:
@@ -173,8 +190,14 @@ class FontService:
 
         self._fonts_registered = True
 
-    def get_font_face_css(self, font_family: str, for_preview: bool = False) -> str:
-        """Return @font-face CSS for the given font family if available."""
+    def get_font_face_css(self, font_family: str, for_preview: bool = False,
+                          subset_base: Optional[str] = None,
+                          codepoints: Iterable[int] = ()) -> str:
+        """Return @font-face CSS for the given font family if available.
+
+        With ``subset_base`` previews load WOFF2 subsets covering ``codepoints``
+        from that URL prefix (see ``font_subset_service``) instead of whole fonts.
+        """
         css_rules = []
         files = self.available_fonts.get(font_family)
         if not files:
@@ -193,7 +216,14 @@ class FontService:
                 font_format = "truetype"
 
             # Choose the appropriate path based on context
-            if for_preview:
+            if for_preview and subset_base:
+                try:
+                    font_src = font_subsetter.subset_url(subset_base, filename, codepoints)
+                    font_format = "woff2"
+                except Exception as e:
+                    print(f"Error subsetting font {filename}: {e}")
+                    font_src = f"/fonts/{filename}"
+            elif for_preview:
                 # For web preview: use webapp public fonts path (accessible via web server)
                 font_src = f"/fonts/{filename}"
             else:
@@ -206,6 +236,10 @@ class FontService:
 
         return "\n".join(css_rules)
 
+    def font_files(self) -> set[str]:
+        """Return the file names of every bundled font face."""
+        return {filename for files in self.available_fonts.values() for filename in files.values()}
+
     def get_available_fonts(self) -> List[str]:
         """Return list of available font families"""
         # Include the built-in ReportLab fonts and custom fonts
@@ -0,0 +1,191 @@
+"""WOFF2 subsets of the bundled fonts for HTML previews.
+
+A preview used to load every face of its font family in full, a few hundred
+KB each. With a subset URL prefix, ``font_service.get_font_face_css`` points
+each face at ``/font-subsets/<file>`` instead, naming the face's version and
+the code points of the document (plus ``BASE_CODEPOINTS``) the face has. The
+endpoint builds the subset with fontTools once and keeps it in a disk cache
+keyed by face version and code points, so a URL always names the same bytes
+and browsers may cache it for good. Builds run on the render lanes under the
+caller's rate limit, and the cache is limited to ``M2P_FONT_SUBSET_CACHE_BYTES``
+with the least recently served subsets evicted first.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
+from html import unescape
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from app.services.disk_cache import DiskBudget, touch
+
+logger = logging.getLogger(__name__)
+
+_FONT_SUBSET_CACHE_DIR = Path(os.getenv("M2P_FONT_SUBSET_CACHE_DIR",
+                                        str(Path(tempfile.gettempdir()) / "m2p-font-subsets")))
+# Bytes of built subsets kept on disk (0 disables the limit).
+_FONT_SUBSET_CACHE_BYTES = int(os.getenv("M2P_FONT_SUBSET_CACHE_BYTES", str(256 << 20)))
+# Bump when the subsetting options change so stale cache entries are not reused.
+_PIPELINE_VERSION = 1
+# Typical time to build one subset, for scheduling the build as a render job.
+BUILD_COST_MS = 150.0
+# A request naming more code points than this is refused.
+_MAX_CODEPOINTS = 0x10000
+
+# Always included, so edits that add ordinary text don't need a new subset.
+BASE_CODEPOINTS = frozenset([
+    *range(0x20, 0x7F),   # ASCII
+    *range(0xA0, 0x100),  # Latin-1
+    0x200B,               # zero-width space
+    0x2010, 0x2013, 0x2014,  # hyphen, en and em dash
+    0x2018, 0x2019, 0x201C, 0x201D,  # curly quotes
+    0x2022, 0x2026,       # bullet, ellipsis
+    0x20AC, 0x2122,       # euro, trade mark
+])
+
+_ENTITY_RE = re.compile(r"&(?:#[0-9]+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);")
+_RANGE_RE = re.compile(r"([0-9a-f]{1,6})(?:-([0-9a-f]{1,6}))?")
+
+
+def document_codepoints(text: str) -> frozenset[int]:
+    """Return the code points ``text`` can show: its characters, entities and the base set."""
+    chars = set(text)
+    if "&" in chars:
+        chars.update(unescape("".join(set(_ENTITY_RE.findall(text)))))
+    return BASE_CODEPOINTS.union(map(ord, chars))
+
+
+def encode_ranges(codepoints: Iterable[int]) -> str:
+    """Encode code points as sorted hex ranges, e.g. ``20-7e,a0-ff,2013``."""
+    ranges: List[Tuple[int, int]] = []
+    for codepoint in sorted(codepoints):
+        if ranges and ranges[-1][1] == codepoint - 1:
+            ranges[-1] = (ranges[-1][0], codepoint)
+        else:
+            ranges.append((codepoint, codepoint))
+    return ",".join(f"{start:x}" if start == end else f"{start:x}-{end:x}" for start, end in ranges)
+
+
+def decode_ranges(text: str) -> frozenset[int]:
+    """Parse ``encode_ranges`` output; raise ``ValueError`` if it is malformed or too large."""
+    codepoints: set[int] = set()
+    for part in text.split(","):
+        match = _RANGE_RE.fullmatch(part)
+        if match is None:
+            raise ValueError(f"Bad code point range {part[:20]!r}")
+        start = int(match.group(1), 16)
+        end = int(match.group(2), 16) if match.group(2) else start
+        if end < start or end > 0x10FFFF or len(codepoints) + end - start >= _MAX_CODEPOINTS:
+            raise ValueError(f"Bad code point range {part[:20]!r}")
+        codepoints.update(range(start, end + 1))
+    return frozenset(codepoints)
+
+
+@dataclass(frozen=True)
+class FontFace:
+    """A bundled font file, its content version and the code points it has glyphs for."""
+
+    filename: str
+    version: str
+    codepoints: frozenset[int]
+
+
+class FontSubsetter:
+    """Build, cache and address WOFF2 subsets of the bundled font files."""
+
+    def __init__(self, fonts_dir: Optional[Path] = None,
+                 cache_dir: Path = _FONT_SUBSET_CACHE_DIR) -> None:
+        self.fonts_dir = fonts_dir or Path(__file__).parent.parent / "static" / "fonts"
+        self.cache_dir = cache_dir
+        self.budget = DiskBudget(_FONT_SUBSET_CACHE_BYTES, (".woff2",))
+        # filename -> (mtime and size the face was read at, face)
+        self._faces: Dict[str, Tuple[Tuple[int, int], FontFace]] = {}
+        self._lock = threading.Lock()
+
+    def __reduce__(self) -> str:
+        # Builds run in the render pools; pickle as the worker's own singleton.
+        return "font_subsetter"
+
+    def face(self, filename: str) -> FontFace:
+        """Return a face's version and coverage, re-reading it when the file changed."""
+        path = self.fonts_dir / filename
+        stat = path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._faces.get(filename)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        from fontTools.ttLib import TTFont  # type: ignore[import-untyped]  # pylint: disable=import-outside-toplevel
+
+        data = path.read_bytes()
+        with TTFont(io.BytesIO(data), lazy=True) as font:
+            cmap = frozenset(font.getBestCmap() or {})
+        face = FontFace(filename, hashlib.sha256(data).hexdigest()[:16], cmap)
+        with self._lock:
+            self._faces[filename] = (signature, face)
+        return face
+
+    def subset_url(self, base_url: str, filename: str, codepoints: Iterable[int]) -> str:
+        """Return the URL of the subset of ``filename`` for the given code points."""
+        face = self.face(filename)
+        ranges = encode_ranges(face.codepoints.intersection(codepoints))
+        return f"{base_url}/{quote(filename)}?v={face.version}&u={ranges}"
+
+    def cached_path(self, filename: str, version: str, codepoints: Iterable[int]) -> Path:
+        """Return where the subset of this face version and code points is cached."""
+        key = f"{filename}\0{version}\0{_PIPELINE_VERSION}\0{encode_ranges(codepoints)}"
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{Path(filename).stem}-{digest[:32]}.woff2"
+
+    def build(self, filename: str, codepoints: Iterable[int]) -> bytes:
+        """Subset ``filename`` to ``codepoints`` and return it as WOFF2."""
+        from fontTools import subset  # type: ignore[import-untyped]  # pylint: disable=import-outside-toplevel
+
+        options = subset.Options()
+        options.flavor = "woff2"
+        font = subset.load_font(str(self.fonts_dir / filename), options)
+        try:
+            subsetter = subset.Subsetter(options)
+            subsetter.populate(unicodes=codepoints)
+            subsetter.subset(font)
+            output = io.BytesIO()
+            subset.save_font(font, output, options)
+        finally:
+            font.close()
+        return output.getvalue()
+
+    def cached(self, filename: str, version: str, codepoints: Iterable[int]) -> Optional[Path]:
+        """Return the cached subset of a face version, or None if it was not built yet."""
+        path = self.cached_path(filename, version, codepoints)
+        if not path.exists():
+            return None
+        touch(path)
+        return path
+
+    def subset(self, filename: str, version: str, codepoints: Iterable[int]) -> Path:
+        """Return the cached subset of a face version, building it first if needed."""
+        cached = self.cached(filename, version, codepoints)
+        if cached is not None:
+            return cached
+        path = self.cached_path(filename, version, codepoints)
+        data = self.build(filename, codepoints)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self.budget.charge(self.cache_dir, len(data))
+        logger.info("built font subset %s (%d bytes)", path.name, len(data))
+        return path
+
+
+# Singleton instance
+font_subsetter = FontSubsetter()
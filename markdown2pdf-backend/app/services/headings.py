@@ -0,0 +1,156 @@
+"""Heading IDs and document outlines, collected while Markdown is parsed.
+
+Both Markdown engines hand their headings to a ``HeadingCollector`` as they
+build the document (Python-Markdown through ``HeadingExtension``, markdown-it
+through ``collect_token_headings``), so the index and the PDF bookmarks come
+from the parse instead of from scanning the HTML afterwards.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, replace
+from html import unescape
+
+from markdown.extensions import Extension  # type: ignore[import-untyped]
+from markdown.extensions.toc import remove_fnrefs, render_inner_html, strip_tags  # type: ignore[import-untyped]
+from markdown.treeprocessors import Treeprocessor  # type: ignore[import-untyped]
+from markdown.util import AtomicString  # type: ignore[import-untyped]
+
+# Deepest heading level listed in the table of contents by default.
+DEFAULT_INDEX_DEPTH = 3
+
+
+@dataclass(frozen=True)
+class Heading:
+    """One entry of a document outline: the table of contents and the PDF bookmarks."""
+
+    level: int
+    id: str
+    text: str  # plain text; escape it before writing it into HTML
+    slug: str | None  # the ID before prefixing and de-duplication; None if the document set it
+
+
+_NON_WORD_RE = re.compile(r'[^\w\s-]')
+_SEPARATORS_RE = re.compile(r'[-\s]+')
+
+
+def heading_slug(text: str) -> str:
+    """Return the ID base for a heading: lowercase words joined by hyphens."""
+    return _SEPARATORS_RE.sub('-', _NON_WORD_RE.sub('', text.lower())).strip('-')
+
+
+class HeadingCollector:
+    """Assigns heading IDs while a document is parsed and records its outline.
+
+    IDs only depend on the document (and ``id_prefix``): a repeated heading
+    gets ``-1``, ``-2``... appended, and a heading without any word characters
+    is called ``heading``. ``reserved_ids`` are treated as already taken, so
+    a document converted in pieces gets the IDs it would get as a whole.
+    """
+
+    def __init__(self, depth: int = DEFAULT_INDEX_DEPTH, id_prefix: str = "",
+                 add_page_breaks: bool = False, reserved_ids: frozenset[str] = frozenset()) -> None:
+        self.depth = depth
+        self.id_prefix = id_prefix
+        self.add_page_breaks = add_page_breaks
+        self.headings: list[Heading] = []
+        self._used = set(reserved_ids)
+        # Next suffix to try per ID base, so many repeats stay linear.
+        self._suffixes: dict[str, int] = {}
+
+    @property
+    def used_ids(self) -> frozenset[str]:
+        """The IDs taken so far."""
+        return frozenset(self._used)
+
+    def add(self, level: int, text: str, existing_id: str | None = None) -> dict[str, str]:
+        """Record a heading and return the attributes to set on it.
+
+        Headings deeper than ``depth`` are not recorded and get no attributes;
+        a heading that already has an ID keeps it.
+        """
+        if level > self.depth:
+            return {}
+        text = ' '.join(text.split())
+        if existing_id:
+            self._used.add(existing_id)
+            self.headings.append(Heading(level, existing_id, text, None))
+            return {}
+        slug = heading_slug(text)
+        heading_id = self._claim(slug)
+        self.headings.append(Heading(level, heading_id, text, slug))
+        page_break = self.add_page_breaks and level == 1
+        return {"class": "page-break-heading" if page_break else "", "id": heading_id}
+
+    def replay(self, headings: list[Heading]) -> list[Heading]:
+        """Re-assign the IDs of headings collected from a later piece of the same document."""
+        replayed = []
+        for heading in headings:
+            if heading.slug is None:
+                self._used.add(heading.id)
+                replayed.append(heading)
+            else:
+                replayed.append(replace(heading, id=self._claim(heading.slug)))
+        self.headings.extend(replayed)
+        return replayed
+
+    def _claim(self, slug: str) -> str:
+        base = f"{self.id_prefix}{slug or 'heading'}"
+        heading_id = base
+        suffix = self._suffixes.get(base, 1)
+        while heading_id in self._used:
+            heading_id = f"{base}-{suffix}"
+            suffix += 1
+        self._suffixes[base] = suffix
+        self._used.add(heading_id)
+        return heading_id
+
+
+class HeadingTreeprocessor(Treeprocessor):  # pylint: disable=too-few-public-methods
+    """Hands every heading of the parsed tree to a ``HeadingCollector``."""
+
+    def __init__(self, md, collector: HeadingCollector) -> None:
+        super().__init__(md)
+        self.collector = collector
+
+    def run(self, root):
+        for element in root.iter():
+            if len(element.tag) != 2 or element.tag[0] != 'h' or not element.tag[1].isdigit():
+                continue
+            # Footnote references are not part of the heading's name.
+            content = remove_fnrefs(element)
+            text = ''.join(unescape(part) if isinstance(part, AtomicString) else part
+                           for part in content.itertext())
+            if '\x02' in text:
+                # Raw HTML or escapes are still placeholders; render them like the toc extension.
+                text = unescape(strip_tags(render_inner_html(content, self.md)))
+            for name, value in self.collector.add(int(element.tag[1]), text,
+                                                  element.get('id')).items():
+                element.set(name, value)
+
+
+class HeadingExtension(Extension):
+    """Extension collecting headings (and setting their IDs) while parsing."""
+    def __init__(self, collector: HeadingCollector) -> None:
+        super().__init__()
+        self.collector = collector
+
+    def extendMarkdown(self, md):
+        # After the inline patterns (20) so heading text is final, like the toc extension.
+        md.treeprocessors.register(HeadingTreeprocessor(md, self.collector), 'headings', 5)
+
+
+def collect_token_headings(tokens: list, collector: HeadingCollector) -> None:
+    """Hand every heading of a markdown-it token stream to ``collector``."""
+    for index, token in enumerate(tokens):
+        if token.type != 'heading_open':
+            continue
+        text = []
+        for child in tokens[index + 1].children or []:
+            if child.type in ('text', 'code_inline'):
+                text.append(child.content)
+            elif child.type in ('softbreak', 'hardbreak'):
+                text.append(' ')
+        for name, value in collector.add(int(token.tag[1]), ''.join(text),
+                                         token.attrGet('id')).items():
+            token.attrSet(name, value)
@@ -0,0 +1,223 @@
+"""Image stage run on the HTML body before WeasyPrint lays it out.
+
+Every ``<img>`` source is read once, checked against the size and pixel
+limits and downsampled to the requested DPI for the widest it can be
+rendered (the printable width of the page). Processed images are written to
+a disk cache keyed by the source hash and the settings, and the ``src`` is
+rewritten to the cached file. Identical images therefore share one URL, which
+WeasyPrint decodes and embeds only once per document. The cache is limited to
+``M2P_IMAGE_CACHE_BYTES``; the least recently used images are evicted first.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import urllib.request
+from collections import OrderedDict
+from html import escape, unescape
+from pathlib import Path
+from typing import Optional, Tuple
+
+from app.services.disk_cache import DiskBudget, touch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMAGE_DPI = 150
+
+_IMAGE_CACHE_DIR = Path(os.getenv("M2P_IMAGE_CACHE_DIR",
+                                  str(Path(tempfile.gettempdir()) / "m2p-image-cache")))
+_MAX_IMAGE_BYTES = int(os.getenv("M2P_IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+_MAX_IMAGE_PIXELS = int(os.getenv("M2P_IMAGE_MAX_PIXELS", str(50_000_000)))
+_FETCH_TIMEOUT = float(os.getenv("M2P_IMAGE_FETCH_TIMEOUT", "10"))
+# Bytes of processed images kept on disk (0 disables the limit).
+_IMAGE_CACHE_BYTES = int(os.getenv("M2P_IMAGE_CACHE_BYTES", str(1 << 30)))
+# Images used this recently are never evicted: a render that resolved them
+# may not have laid them out yet.
+_IMAGE_CACHE_MIN_IDLE_S = 300.0
+# Local files whose processed URI is remembered by path, mtime and size.
+_RESOLVED_CACHE_SIZE = 1024
+
+_JPEG_QUALITY = 85
+_EXIF_ORIENTATION = 0x0112
+# Bump when the processing changes so stale cache entries are not reused.
+_PIPELINE_VERSION = 1
+
+# Printable width of the A4 page in ``pdf_service._PAGE_CSS`` (12.5 mm margins),
+# in inches: ``img { max-width: 100% }`` in styles.css keeps every image
+# within it. Heights are not bounded, so only the width is used.
+_CONTENT_WIDTH_IN = (210 - 2 * 12.5) / 25.4
+
+_IMG_TAG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_SRC_RE = re.compile(r'\bsrc=(["\'])(.*?)\1', re.IGNORECASE | re.DOTALL)
+_ALT_RE = re.compile(r'\balt=(["\'])(.*?)\1', re.IGNORECASE | re.DOTALL)
+_URL_SCHEME_RE = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*):')
+_FETCHED_SCHEMES = {"data", "file", "http", "https"}
+
+
+class ImageRejected(ValueError):
+    """Raised when an image exceeds the configured size or pixel limits."""
+
+
+def process_image(data: bytes, dpi: int) -> Tuple[bytes, str]:
+    """Return ``(image_bytes, extension)`` for ``data`` downsampled to ``dpi``.
+
+    Images that already fit are returned unchanged if they are JPEG or PNG.
+    Raises ``ImageRejected`` for images over the pixel limit and Pillow's
+    ``UnidentifiedImageError`` for formats it cannot decode (e.g. SVG).
+    """
+    # Pillow ships with WeasyPrint; import it with the renderer, not at startup.
+    from PIL import Image, ImageOps  # pylint: disable=import-outside-toplevel
+
+    with Image.open(io.BytesIO(data)) as image:
+        # Only the header has been read so far: check before decoding pixels.
+        if image.width * image.height > _MAX_IMAGE_PIXELS:
+            raise ImageRejected(f"{image.width}x{image.height} pixels exceeds the "
+                                f"{_MAX_IMAGE_PIXELS} pixel limit")
+        max_width = round(_CONTENT_WIDTH_IN * dpi)
+        source_format = image.format
+        if image.width <= max_width and source_format in ("JPEG", "PNG"):
+            return data, "jpg" if source_format == "JPEG" else "png"
+
+        # EXIF orientations 5-8 are rotated by 90 degrees: the height is displayed as the width.
+        rotated = image.getexif().get(_EXIF_ORIENTATION, 1) in (5, 6, 7, 8)
+        scale = max_width / (image.height if rotated else image.width)
+        if source_format == "JPEG" and scale < 1:
+            # Let the decoder scale down by powers of two while decoding.
+            image.draft("RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        processed = ImageOps.exif_transpose(image)
+        if processed.width > max_width:
+            size = (max_width, max(1, round(processed.height * max_width / processed.width)))
+            processed = processed.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        output = io.BytesIO()
+        if source_format == "JPEG" and processed.mode in ("RGB", "L", "CMYK"):
+            processed.save(output, "JPEG", quality=_JPEG_QUALITY, optimize=True)
+            return output.getvalue(), "jpg"
+        processed.save(output, "PNG", optimize=True)
+        return output.getvalue(), "png"
+
+
+class ImageService:
+    """Resolve, downsample, deduplicate and cache the images of HTML bodies."""
+
+    def __init__(self, cache_dir: Path = _IMAGE_CACHE_DIR) -> None:
+        self.cache_dir = cache_dir
+        self.budget = DiskBudget(_IMAGE_CACHE_BYTES, (".jpg", ".png"), _IMAGE_CACHE_MIN_IDLE_S)
+        self._resolved: OrderedDict[tuple, Path] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prepare(self, html: str, dpi: int = DEFAULT_IMAGE_DPI,
+                base_dir: Optional[Path] = None) -> str:
+        """Rewrite every ``<img>`` in ``html`` to its processed, cached version.
+
+        Sources that cannot be processed are left for WeasyPrint to fetch as
+        before; images over the limits are replaced by their alt text.
+        """
+        if '<img' not in html:
+            return html
+        base_dir = base_dir or Path.cwd()
+        resolved: dict[str, Optional[str]] = {}
+
+        def rewrite(match: re.Match) -> str:
+            tag = match.group(0)
+            src_match = _SRC_RE.search(tag)
+            if src_match is None:
+                return tag
+            src = unescape(src_match.group(2))
+            if src not in resolved:
+                try:
+                    resolved[src] = self.resolve(src, dpi, base_dir)
+                except ImageRejected as e:
+                    logger.warning("image %.100s omitted: %s", src, e)
+                    alt_match = _ALT_RE.search(tag)
+                    alt = f": {alt_match.group(2)}" if alt_match and alt_match.group(2) else ""
+                    return f'<span class="image-omitted">[image omitted{alt}]</span>'
+            uri = resolved[src]
+            if uri is None:
+                return tag
+            return tag[:src_match.start(2)] + escape(uri) + tag[src_match.end(2):]
+
+        return _IMG_TAG_RE.sub(rewrite, html)
+
+    def resolve(self, src: str, dpi: int, base_dir: Path) -> Optional[str]:
+        """Return the ``file://`` URI of the processed image for ``src``, or None."""
+        scheme_match = _URL_SCHEME_RE.match(src)
+        if scheme_match is None and not src.startswith("//"):
+            cached = self._resolve_local(
+                (base_dir / src.split("#", 1)[0].split("?", 1)[0]).resolve(), dpi)
+        elif scheme_match is not None and scheme_match.group(1).lower() in _FETCHED_SCHEMES:
+            cached = self._resolve_url(src, dpi)
+        else:
+            cached = None
+        return None if cached is None else cached.as_uri()
+
+    def _resolve_local(self, path: Path, dpi: int) -> Optional[Path]:
+        if not path.is_file():
+            return None
+        stat = path.stat()
+        # Skip reading and hashing unchanged local files on every render.
+        memo_key = (str(path), stat.st_mtime_ns, stat.st_size, dpi)
+        with self._lock:
+            cached = self._resolved.get(memo_key)
+            if cached is not None and cached.exists():
+                self._resolved.move_to_end(memo_key)
+                touch(cached)
+                return cached
+        if stat.st_size > _MAX_IMAGE_BYTES:
+            raise ImageRejected(f"{stat.st_size} bytes exceeds the {_MAX_IMAGE_BYTES} byte limit")
+        cached = self._store(path.read_bytes(), dpi)
+        if cached is not None:
+            with self._lock:
+                self._resolved[memo_key] = cached
+                while len(self._resolved) > _RESOLVED_CACHE_SIZE:
+                    self._resolved.popitem(last=False)
+        return cached
+
+    def _resolve_url(self, url: str, dpi: int) -> Optional[Path]:
+        try:
+            with urllib.request.urlopen(url, timeout=_FETCH_TIMEOUT) as response:
+                data = response.read(_MAX_IMAGE_BYTES + 1)
+        except (OSError, ValueError) as e:
+            logger.warning("image %.100s could not be fetched: %s", url, e)
+            return None
+        if len(data) > _MAX_IMAGE_BYTES:
+            raise ImageRejected(f"more than {_MAX_IMAGE_BYTES} bytes")
+        return self._store(data, dpi)
+
+    def _store(self, data: bytes, dpi: int) -> Optional[Path]:
+        """Process ``data`` into the disk cache unless it is already there."""
+        digest = hashlib.sha256(data)
+        digest.update(f"\0{dpi}\0{_PIPELINE_VERSION}".encode("ascii"))
+        key = digest.hexdigest()
+        for extension in ("jpg", "png"):
+            cached = self.cache_dir / f"{key}.{extension}"
+            if cached.exists():
+                touch(cached)
+                return cached
+
+        try:
+            image_bytes, extension = process_image(data, dpi)
+        except ImageRejected:
+            raise
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Not a raster image Pillow understands (e.g. SVG): leave it to WeasyPrint.
+            logger.debug("image left unprocessed: %s", e)
+            return None
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.cache_dir / f"{key}.{extension}"
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(image_bytes)
+        os.replace(tmp_path, path)
+        self.budget.charge(self.cache_dir, len(image_bytes))
+        return path
+
+
+# Singleton instance
+image_service = ImageService()
@@ -0,0 +1,176 @@
+"""One pass over the Markdown source before it is parsed.
+
+``scan_markdown`` splits the source into lines once and, outside fenced code,
+re-indents nested list items for Python-Markdown, drops blank lines between a
+list item and its first nested item and replaces the glyphs in ``GLYPH_MAP``.
+Fenced code is passed through untouched. The same walk counts the blocks,
+code lines, headings, table cells and list depth that the cost estimator
+needs.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# This is a dictionary of glyphs that are problematic in markdown and need to be replaced
+# with safe ASCII equivalents. The key is the problematic glyph, and the value is the safe
+# ASCII equivalent. It also handles cases were optional backslashes are found in chatGPT's
+# markdown output:
+#   - if a tilde is inside markdown formatting, chatGPT will output it as "\~"
+#   - if an ampersand is inside markdown formatting, chatGPT will output it as "\&"
+# this is a problem because the backslash will remain intact after the markdown to HTML
+# conversion, and it will appear in the PDF output.
+# Fenced code is left alone (see ``scan_markdown``).
+GLYPH_MAP: dict[str, str] = {
+    "\u2013": "-",   # en dash
+    "\u2014": "-",   # em dash
+    "\u00a0": " ",  # nbsp → normal space
+    "\u2018": "'",   # left single quote
+    "\u2019": "'",   # right single quote
+    "\u201c": '"',   # left double quote
+    "\u201d": '"',   # right double quote
+    r"\~": '~',   # tilde
+    r"\&": '&amp;',   # ampersand
+    r"\$": '$',   # dollar sign
+    r"\#": '#',   # hash
+    "\\*": '*',   # asterisk
+    "\\_": '_',   # underscore
+    "\\+": '+',   # plus
+    "\\-": '-',   # dash
+    "\\=": '=',   # equals
+}
+
+# One alternation instead of a replace() pass per glyph. A backslash before a
+# dash used to become "\-" on the dash pass and "-" on the escape pass.
+_REPLACEMENTS = {**GLYPH_MAP, "\\\u2013": "-", "\\\u2014": "-"}
+_GLYPH_RE = re.compile("|".join(re.escape(glyph) for glyph in
+                                sorted(_REPLACEMENTS, key=len, reverse=True)))
+
+# Three or more backticks or tildes. Every fence check in the converter
+# (``scan_markdown``, ``split_markdown``, ``LargeCodePreprocessor``) goes
+# through ``fence_opening`` and ``closes_fence`` below.
+_FENCE = r'(`{3,}|~{3,})'
+# Indentation, a fence and its info string.
+_FENCE_RE = re.compile(r'(\s*)' + _FENCE + r'(.*)')
+# Indentation, then what the line starts with: a fence, a heading, a table row or a list marker.
+_LINE_RE = re.compile(r'(\s*)(?:' + _FENCE + r'|(#)|(\|)|([*+-]|\d+\.)\s)?')
+_NO_MATCH: tuple[str, None, None, None, None] = ('', None, None, None, None)
+_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+
+
+def _replace_glyph(match: re.Match) -> str:
+    return _REPLACEMENTS[match.group()]
+
+
+@dataclass
+class ScanStats:
+    """Structural counts of a document, outside and inside its code blocks."""
+
+    blocks: int = 0
+    code_lines: int = 0
+    headings: int = 0
+    table_cells: int = 0
+    list_depth: int = 0
+
+
+@dataclass(frozen=True)
+class ScannedMarkdown:
+    """The preprocessed source and what the scan counted in it."""
+
+    text: str
+    stats: ScanStats
+
+
+def _is_blank(line: str) -> bool:
+    return not line or line.isspace()
+
+
+def _opens(fence: str, info: str) -> bool:
+    # A backtick run followed by another backtick is inline code, not a fence.
+    return fence[0] == '~' or '`' not in info
+
+
+def fence_opening(line: str) -> Optional[re.Match]:
+    """Return the match of ``line`` if it opens fenced code, else None.
+
+    Group 1 is the indentation and group 2 the fence.
+    """
+    match = _FENCE_RE.match(line)
+    if match is None or not _opens(match.group(2), match.group(3)):
+        return None
+    return match
+
+
+def closes_fence(line: str, fence: str) -> bool:
+    """Return whether ``line`` closes the code opened by ``fence``."""
+    if fence not in line:
+        return False
+    stripped = line.strip()
+    return stripped.startswith(fence) and not stripped.strip(fence[0])
+
+
+def scan_markdown(markdown_text: str, rewrite: bool = True) -> ScannedMarkdown:  # pylint: disable=too-many-branches,too-many-locals
+    """Preprocess ``markdown_text`` for parsing and count its features in one pass.
+
+    Without ``rewrite`` only the counts are made and the text is returned as is.
+    """
+    stats = ScanStats()
+    lines = markdown_text.split('\n')
+    output: list[str] = []
+    append = output.append
+    match_line = _LINE_RE.match
+    fence = ''
+    in_block = False
+    skip_blank = -1
+    for number, line in enumerate(lines):
+        if fence:
+            if closes_fence(line, fence):
+                fence = ''
+            else:
+                stats.code_lines += 1
+            if rewrite:
+                append(line)
+            continue
+
+        if not line or line.isspace():
+            in_block = False
+            if rewrite and number != skip_blank:
+                append(line)
+            continue
+        if not in_block:
+            stats.blocks += 1
+            in_block = True
+
+        match = match_line(line)
+        indent, opening, heading, table, marker = match.groups() if match else _NO_MATCH
+        if opening and match and _opens(opening, line[match.end():]):
+            fence = opening
+        elif heading:
+            stats.headings += 1
+        elif table:
+            stripped = line.strip()
+            if not _TABLE_SEPARATOR_RE.match(stripped):
+                stats.table_cells += max(1, stripped.strip("|").count("|") + 1)
+        elif marker:
+            stats.list_depth = max(stats.list_depth, len(indent.expandtabs(4)) // 2 + 1)
+            if not indent:
+                # A parent item: a blank line before its first nested item would end the list.
+                if (number + 2 < len(lines) and _is_blank(lines[number + 1])
+                        and _nested_item(lines[number + 2])):
+                    skip_blank = number + 1
+            elif rewrite:
+                # Nested items: two spaces per level become the four Python-Markdown expects.
+                line = '    ' * (len(indent) // 2) + line[len(indent):]
+        if rewrite:
+            # Most lines have nothing to replace; both checks run at C speed.
+            if '\\' in line or not line.isascii():
+                line = _GLYPH_RE.sub(_replace_glyph, line)
+            append(line)
+
+    return ScannedMarkdown('\n'.join(output) if rewrite else markdown_text, stats)
+
+
+def _nested_item(line: str) -> bool:
+    match = _LINE_RE.match(line)
+    return bool(match and match.group(1) and match.group(5))
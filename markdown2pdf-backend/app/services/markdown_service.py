@@ -6,9 +6,9 @@ handed to a PDF renderer (WeasyPrint).
 Key fixes
 ----------
 1. **Removed** the inline `<style>` injection that ReportLab was treating as literal text.
-2. **Added** a `sanitize_glyphs` pass to translate problematic Unicode (curly quotes,
-   em/en dashes, etc.) into safe ASCII equivalents when the chosen fonts do not contain
-   the glyphs.
+2. **Added** a glyph sanitisation pass (see `markdown_scan`) to translate problematic Unicode
+   (curly quotes, em/en dashes, etc.) into safe ASCII equivalents when the chosen fonts do
+   not contain the glyphs.
 3. The function can optionally receive a CSS string so that the caller (our PDF service)
    can inject page / font sizing rules that depend on the user's selections.
 4. **Fixed** whitespace preservation in code blocks to ensure proper formatting.
@@ -18,60 +18,39 @@ Key fixes
 # pylint: disable=line-too-long,fixme
 from __future__ import annotations
 
+import bisect
+import hashlib
+import os
 import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from html import escape
+from typing import Any, Iterator
+
 import markdown  # type: ignore[import-untyped]
-from markdown.extensions.codehilite import CodeHiliteExtension  # type: ignore[import-untyped]
+from markdown.extensions.codehilite import CodeHilite, CodeHiliteExtension  # type: ignore[import-untyped]
 from markdown.extensions.tables import TableExtension  # type: ignore[import-untyped]
 from markdown.extensions.fenced_code import FencedCodeExtension  # type: ignore[import-untyped]
 from markdown.extensions.extra import ExtraExtension  # type: ignore[import-untyped]
 from markdown.extensions import Extension  # type: ignore[import-untyped]
 from markdown.inlinepatterns import SubstituteTagInlineProcessor  # type: ignore[import-untyped]
+from markdown.preprocessors import Preprocessor  # type: ignore[import-untyped]
+
+from app.services.headings import DEFAULT_INDEX_DEPTH, Heading, HeadingCollector, HeadingExtension, collect_token_headings
+from app.services.markdown_scan import closes_fence, fence_opening, scan_markdown
+from app.services.stage_timing import stage
 
 # Import font service to get the monospace font
 # ---------- helpers ---------------------------------------------------------
 
-# This is a dictionary of glyphs that are problematic in markdown and need to be replaced with safe ASCII equivalents.
-# The key is the problematic glyph, and the value is the safe ASCII equivalent.
-# it also handles cases were optional backslashes are found in chatGPT's markdown output:
-#   - if a tilde is inside markdown formatting, chatGPT will output it as "\~"
-#   - if an ampersand is inside markdown formatting, chatGPT will output it as "\&"
-# this is a problem because the backslash will remain intact after the markdown to HTML conversion, and it will appear in the PDF output
-# This is an imperfect solution, because in some cases (inside code blocks) a backslashed character should be preserved.
-# TODO: add conditional logic to ignore backslashes inside code blocks.
-
-_GLYPH_MAP: dict[str, str] = {
-    "\u2013": "-",   # en dash
-    "\u2014": "-",   # em dash
-    "\u00a0": " ",  # nbsp → normal space
-    "\u2018": "'",   # left single quote
-    "\u2019": "'",   # right single quote
-    "\u201c": '"',   # left double quote
-    "\u201d": '"',   # right double quote
-    r"\~": '~',   # tilde
-    r"\&": '&amp;',   # ampersand
-    r"\$": '$',   # dollar sign
-    r"\#": '#',   # hash
-    "\\*": '*',   # asterisk
-    "\\_": '_',   # underscore
-    "\\+": '+',   # plus
-    "\\-": '-',   # dash
-    "\\=": '=',   # equals
-}
-
-def sanitize_glyphs(text: str) -> str:
-    """Replace problematic glyphs with safe equivalents."""
-    for bad, good in _GLYPH_MAP.items():
-        text = text.replace(bad, good)
-    return text
-
 def optimize_for_pdf_wrapping(html: str) -> str:
     """Post-process HTML to ensure better text wrapping in WeasyPrint/PDF generation."""
     # Add zero-width spaces after certain characters to encourage breaking
     # This helps WeasyPrint break long lines at better positions
 
     # Add break opportunities after commas, semicolons, and other punctuation in code blocks
-    def add_break_opportunities(match):
-        code_content = match.group(1)
+    def add_break_opportunities(code_content: str) -> str:
         # Add zero-width space (&#8203;) after punctuation to encourage line breaks
         code_content = re.sub(r'([,;])', r'\1&#8203;', code_content)
         code_content = re.sub(r'(\[)', r'\1&#8203;', code_content)
@@ -80,20 +59,179 @@ def optimize_for_pdf_wrapping(html: str) -> str:
         code_content = re.sub(r'(&quot;[^&]{10,}?)([^&]{5})', r'\1&#8203;\2', code_content)
         return f'<code>{code_content}</code>'
 
-    # Apply to code blocks
-    html = re.sub(r'<code>(.*?)</code>', add_break_opportunities, html, flags=re.DOTALL)
+    # Apply to code blocks. Equivalent to re.sub(r'<code>(.*?)</code>', ..., flags=re.DOTALL)
+    # but stops at the first <code> without a closing tag instead of rescanning
+    # the rest of the document from every later <code>.
+    parts = []
+    pos = 0
+    while True:
+        start = html.find('<code>', pos)
+        if start < 0:
+            break
+        end = html.find('</code>', start + 6)
+        if end < 0:
+            break
+        parts.append(html[pos:start])
+        parts.append(add_break_opportunities(html[start + 6:end]))
+        pos = end + 7
+    if not parts:
+        return html
+    parts.append(html[pos:])
+    return ''.join(parts)
+
+# A closing tag followed by the start of a list, found at every position
+# (the lookahead lets candidates overlap).
+_CLOSE_THEN_LIST_RE = re.compile(r'(?=(<\/[^>]+>\s*<[ou]l))')
+_CLOSE_THEN_P_LIST_RE = re.compile(r'(?=(<\/[^>]+>\s*<\/p>\s*<[ou]l))')
+_LI_RE = re.compile(r'<li>')
+_LI_P_RE = re.compile(r'<li>\s*<p>')
+_LIST_RE = re.compile(r'\s*<[ou]l')
+_P_LIST_RE = re.compile(r'\s*<\/p>\s*<[ou]l')
+
+
+def _mark_nested_lists(html: str, item_re: re.Pattern, close_re: re.Pattern,
+                       direct_re: re.Pattern) -> str:
+    """Add ``class="nested-list"`` to the list that follows each list item.
+
+    Linear-time equivalent of
+    ``re.sub(r'(ITEM(?:.*?</[^>]+>)?TAIL<[ou]l)', r'\1 class="nested-list"', html, flags=re.DOTALL)``:
+    the lazy ``.*?`` made that regex rescan the rest of the document from every
+    ``<li>`` without a nested list. Here every candidate "closing tag, then
+    list" position is found once and each item binary-searches for the first
+    candidate after it.
+    """
+    candidates = [(match.start(), match.end(1)) for match in close_re.finditer(html)]
+    candidate_starts = [start for start, _ in candidates]
+    parts = []
+    pos = search_from = 0
+    while True:
+        item = item_re.search(html, search_from)
+        if item is None:
+            break
+        index = bisect.bisect_left(candidate_starts, item.end())
+        if index < len(candidates):
+            match_end = candidates[index][1]
+        else:
+            direct = direct_re.match(html, item.end())
+            if direct is None:
+                search_from = item.start() + 1
+                continue
+            match_end = direct.end()
+        parts.append(html[pos:match_end])
+        parts.append(' class="nested-list"')
+        pos = search_from = match_end
+    if not parts:
+        return html
+    parts.append(html[pos:])
+    return ''.join(parts)
+
+
+def _iter_closed_tags(html: str, open_re: re.Pattern) -> Iterator[tuple[re.Match, int, int]]:
+    """Yield ``(open_match, content_end, end)`` for every ``OPEN(.*?)</tag>`` pair.
+
+    Behaves like ``re.finditer`` over ``open_re`` followed by a lazy DOTALL
+    ``(.*?)</\\1>``, where group 1 of ``open_re`` is the tag name, but runs in
+    linear time: closing-tag positions are collected once per tag name, so an
+    opening tag without a closing one no longer rescans the rest of the document.
+    """
+    closing: dict[str, list[int]] = {}
+    search_from = 0
+    while True:
+        opening = open_re.search(html, search_from)
+        if opening is None:
+            return
+        tag = opening.group(1)
+        if tag not in closing:
+            closing[tag] = [match.start() for match in re.finditer(f'</{tag}>', html)]
+        positions = closing[tag]
+        index = bisect.bisect_left(positions, opening.end())
+        if index == len(positions):
+            search_from = opening.start() + 1
+            continue
+        end = positions[index] + len(tag) + 3
+        yield opening, positions[index], end
+        search_from = end
+
+
+# Tables with more rows than this get the fixed layout even when
+# auto_width_tables is requested: WeasyPrint's auto layout measures every cell.
+# 0 disables the limit.
+_AUTO_TABLE_MAX_ROWS = int(os.getenv("M2P_AUTO_TABLE_MAX_ROWS", "1000"))
+# Rows sampled per table to estimate its column widths.
+_TABLE_SAMPLE_ROWS = int(os.getenv("M2P_TABLE_SAMPLE_ROWS", "200"))
+# Column weights are measured in characters and clamped to this range, so a
+# single very long cell cannot squeeze the other columns to nothing.
+_MIN_COLUMN_WEIGHT = 3
+_MAX_COLUMN_WEIGHT = 40
+
+_TABLE_OPEN_RE = re.compile(r'<(table)>')
+_ROW_RE = re.compile(r'<tr[ >]')
+_CELL_RE = re.compile(r'<t[hd][^>]*>(.*?)</t[hd]>', re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def _column_weights(rows: list[str]) -> list[int]:
+    """Estimate relative column widths from the text lengths of sampled rows."""
+    lengths: list[list[int]] = []
+    longest_words: list[int] = []
+    for row in rows:
+        for column, cell in enumerate(_CELL_RE.findall(row)):
+            text = _TAG_RE.sub('', cell).strip()
+            if column == len(lengths):
+                lengths.append([])
+                longest_words.append(0)
+            lengths[column].append(len(text))
+            longest_words[column] = max(longest_words[column],
+                                        max((len(word) for word in text.split()), default=0))
+    weights = []
+    for column_lengths, longest_word in zip(lengths, longest_words):
+        # The 90th percentile ignores the odd outlier cell; the longest word
+        # keeps the column wide enough to avoid breaking inside words.
+        typical = sorted(column_lengths)[int(0.9 * (len(column_lengths) - 1))]
+        weights.append(min(max(typical, longest_word, _MIN_COLUMN_WEIGHT), _MAX_COLUMN_WEIGHT))
+    return weights
+
+
+def fix_table_layouts(html: str, auto_width_tables: bool = True) -> str:
+    """Give tables a fixed layout with column widths computed from sampled rows.
+
+    With ``auto_width_tables`` only tables longer than ``M2P_AUTO_TABLE_MAX_ROWS``
+    rows are converted; otherwise every table is. The widths are emitted as a
+    ``<colgroup>``, so WeasyPrint lays rows out without measuring every cell.
+    """
+    parts = []
+    pos = 0
+    for opening, content_end, _ in _iter_closed_tags(html, _TABLE_OPEN_RE):
+        rows = [match.start() for match in _ROW_RE.finditer(html, opening.end(), content_end)]
+        if not rows or (auto_width_tables
+                        and (not _AUTO_TABLE_MAX_ROWS or len(rows) <= _AUTO_TABLE_MAX_ROWS)):
+            continue
+        # The header row plus evenly spaced body rows.
+        step = max(1, len(rows) // _TABLE_SAMPLE_ROWS)
+        sampled = list(range(0, len(rows), step))[:_TABLE_SAMPLE_ROWS + 1]
+        bounds = rows + [content_end]
+        weights = _column_weights([html[bounds[i]:bounds[i + 1]] for i in sampled])
+        if not weights:
+            continue
+        total = sum(weights)
+        columns = ''.join(f'<col style="width: {weight / total * 100:.2f}%">' for weight in weights)
+        parts.append(html[pos:opening.start()])
+        parts.append(f'<table class="table-fixed">\n<colgroup>{columns}</colgroup>')
+        pos = opening.end()
+    if not parts:
+        return html
+    parts.append(html[pos:])
+    return ''.join(parts)
 
-    return html
 
 def ensure_nested_lists(html: str) -> str:
     # pylint: disable=too-many-locals,too-many-branches
     """Ensure nested lists have proper class for styling in PDF."""
-    # First, add a class to all nested lists - this regex handles both basic list items and those with formatted content
-    html = re.sub(r'(<li>(?:.*?<\/[^>]+>)?\s*<[ou]l)', r'\1 class="nested-list"', html, flags=re.DOTALL)
+    # First, add a class to all nested lists - this handles both basic list items and those with formatted content
+    html = _mark_nested_lists(html, _LI_RE, _CLOSE_THEN_LIST_RE, _LIST_RE)
 
     # Handle specific case where list item starts with formatted text like <strong>
-    html = re.sub(r'(<li>\s*<p>(?:.*?<\/[^>]+>)?\s*<\/p>\s*<[ou]l)',
-                  r'\1 class="nested-list"', html, flags=re.DOTALL)
+    html = _mark_nested_lists(html, _LI_P_RE, _CLOSE_THEN_P_LIST_RE, _P_LIST_RE)
 
     # Process HTML as a DOM tree to properly handle nesting
     # This is a simplified approach using string operations
@@ -112,8 +250,6 @@ def ensure_nested_lists(html: str) -> str:
     list_positions.sort(key=lambda x: x[0])
 
     # Calculate nesting level at each point
-    modified_html = html
-    offset = 0
     current_level = 0
     list_with_levels = []
 
@@ -126,15 +262,22 @@ def ensure_nested_lists(html: str) -> str:
         else:  # action == "close"
             current_level = max(0, current_level - 1)
 
-    # Apply data-level attributes
+    # Apply data-level attributes, collecting the pieces and joining once
+    # (splicing into the whole string per list is quadratic)
+    parts = []
+    copied_to = 0
     for pos, list_type, level in list_with_levels:
-        actual_pos = pos + offset
+        if pos < copied_to:
+            # Malformed "<ul" whose tag never closed before this one; already rewritten.
+            continue
 
         # Find the end of this tag
-        tag_end = modified_html.find('>', actual_pos)
+        tag_end = html.find('>', pos)
+        if tag_end < 0:
+            tag_end = len(html) - 1
 
         # Check if this is a nested list (should have class="nested-list")
-        tag_content = modified_html[actual_pos:tag_end]
+        tag_content = html[pos:tag_end]
 
         if 'class="nested-list"' in tag_content:
             # Already has class, add or update data-level
@@ -154,10 +297,73 @@ def ensure_nested_lists(html: str) -> str:
 
         # Apply the modification
         if modified_tag != tag_content:
-            modified_html = modified_html[:actual_pos] + modified_tag + modified_html[tag_end:]
-            offset += len(modified_tag) - len(tag_content)
+            parts.append(html[copied_to:pos])
+            parts.append(modified_tag)
+            copied_to = tag_end
+
+    if not parts:
+        return html
+    parts.append(html[copied_to:])
+    return ''.join(parts)
+
+# Fenced code blocks with at least this many lines or bytes skip Pygments and
+# the zero-width-space pass (0 disables either limit).
+_LARGE_CODE_LINES = int(os.getenv("M2P_LARGE_CODE_LINES", "500"))
+_LARGE_CODE_BYTES = int(os.getenv("M2P_LARGE_CODE_BYTES", str(32 * 1024)))
+
+
+def is_large_code(lines: list[str]) -> bool:
+    """Return whether a code block is big enough for the plain-text fast path."""
+    if _LARGE_CODE_LINES and len(lines) >= _LARGE_CODE_LINES:
+        return True
+    return bool(_LARGE_CODE_BYTES) and sum(len(line) + 1 for line in lines) >= _LARGE_CODE_BYTES
+
+
+def render_plain_code(lines: list[str]) -> str:
+    """Render code lines without highlighting, one ``<span>`` per line.
+
+    Short spans keep WeasyPrint's line breaking to one line at a time instead
+    of re-measuring the rest of a huge text node for every line, and
+    ``code.code-plain`` breaks long lines through CSS rather than injected
+    zero-width spaces.
+    """
+    body = ''.join(f'<span class="line">{escape(line, quote=False)}</span>\n' for line in lines)
+    return f'<div class="code-highlight code-plain"><pre><code class="code-plain">{body}</code></pre></div>'
 
-    return modified_html
+
+class LargeCodePreprocessor(Preprocessor):  # pylint: disable=too-few-public-methods
+    """Replace very large fenced code blocks with plain pre-rendered HTML."""
+
+    def run(self, lines):
+        output = []
+        i = 0
+        while i < len(lines):
+            opening = fence_opening(lines[i])
+            # Python-Markdown's fenced code only starts at column 0.
+            if opening is None or opening.group(1):
+                output.append(lines[i])
+                i += 1
+                continue
+            fence = opening.group(2)
+            end = i + 1
+            while end < len(lines) and not closes_fence(lines[end], fence):
+                end += 1
+            code = lines[i + 1:end]
+            if end == len(lines) or not is_large_code(code):
+                # Unclosed or small: leave it to the fenced code extension.
+                output.extend(lines[i:end])
+                i = end
+                continue
+            output.extend(['', self.md.htmlStash.store(render_plain_code(code)), ''])
+            i = end + 1
+        return output
+
+
+class LargeCodeExtension(Extension):
+    """Extension rendering very large fenced code blocks as plain text."""
+    def extendMarkdown(self, md):
+        # Before fenced_code (25), after whitespace normalisation (30).
+        md.preprocessors.register(LargeCodePreprocessor(md), 'large_code', 27)
 
 # Custom extension to handle line breaks
 # TODO: VERIFY THIS IS STILL NEEDED
@@ -169,115 +375,222 @@ class LineBreakExtension(Extension):
         processor = SubstituteTagInlineProcessor(pattern, 'br')
         md.inlinePatterns.register(processor, 'linebreaks', 175)  # Priority higher than nl2br
 
-class MarkdownService:
-    """Singleton service that converts Markdown to HTML."""
 
-    # to generate new pygment stylesheet run:
-    # pygmentize -S lightbulb -f html -a .code-highlight > code.css
-    _extensions = [
-        TableExtension(),
-        CodeHiliteExtension(css_class="code-highlight", pygments_style="native", linenums=False),
-        #CodeHiliteExtension(css_class="code-highlight", pygments_style="monokai", linenums=False),
-        FencedCodeExtension(),  # Explicitly add fenced code extension
-        ExtraExtension(),       # Add Extra extension which includes proper list support
-        LineBreakExtension(),   # Add our custom line break extension
-    ]
+# to generate new pygment stylesheet run:
+# pygmentize -S lightbulb -f html -a .code-highlight > code.css
+_CODEHILITE = CodeHiliteExtension(css_class="code-highlight", pygments_style="native", linenums=False)
+#_CODEHILITE = CodeHiliteExtension(css_class="code-highlight", pygments_style="monokai", linenums=False)
 
-    def preprocess_nested_lists(self, markdown_text: str) -> str:
-        """
-        Preprocess markdown text to ensure proper handling of nested lists.
-        This specifically handles 2-space indentation that indicates nested lists
-        and fixes cases where blank lines appear between parent and nested items.
-        """
-        lines = markdown_text.split('\n')
-        processed_lines = []
-        i = 0
 
-        while i < len(lines):
-            line = lines[i]
-
-            # Check if this is a parent list item
-            parent_list_match = re.match(r'^([*+-]|\d+\.)\s', line)
-
-            if parent_list_match:
-                # This is a parent list item - add it
-                processed_lines.append(line)
-
-                # Check ahead for blank line followed by nested list
-                if i + 2 < len(lines) and lines[i+1].strip() == '':
-                    # Look for a nested list item after the blank line
-                    potential_nested = lines[i+2]
-                    nested_match = re.match(r'^(\s+)([*+-]|\d+\.)\s', potential_nested)
-
-                    if nested_match:
-                        # Found a nested list item after a blank line - skip the blank line
-                        i += 1  # Skip the blank line
-
-            elif re.match(r'^(\s+)([*+-]|\d+\.)\s', line):
-                # This is a nested list item
-                # Calculate indentation level (each 2 spaces = 1 level)
-                indent_match = re.match(r'^(\s+)', line)
-                assert indent_match is not None
-                indentation = indent_match.group(1)
-                indent_level = len(indentation) // 2
-
-                # Use 4 spaces for each level in the output for proper markdown parsing
-                new_indentation = '    ' * indent_level
-                processed_lines.append(new_indentation + line.lstrip())
-            else:
-                # Not a list item - add as is
-                processed_lines.append(line)
+def highlight_code(code: str, lang: str = "") -> str:
+    """Render a code block the way the CodeHilite extension does (large blocks stay plain)."""
+    lines = code.split('\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    if is_large_code(lines):
+        return render_plain_code(lines)
+    return CodeHilite(code, lang=lang or None, **_CODEHILITE.getConfigs()).hilite()
 
-            i += 1  # Move to next line
 
-        # Join all lines back together
-        return '\n'.join(processed_lines)
+class MarkdownEngine:  # pylint: disable=too-few-public-methods
+    """Turns (preprocessed) Markdown into an HTML body; one subclass per parser library."""
 
-    def _add_heading_ids(self, html: str, add_page_breaks: bool = False) -> str:
-        """Add unique IDs to headings for index linking."""
-        def add_id_to_heading(match):
-            tag = match.group(1)  # h1, h2, h3, etc.
-            content = match.group(2)  # heading text
+    name = ""
 
-            # Generate a slug from the heading content
-            # Remove HTML tags first
-            clean_text = re.sub(r'<[^>]+>', '', content)
-            # Convert to lowercase and replace spaces/special chars with hyphens
-            slug = re.sub(r'[^\w\s-]', '', clean_text.lower())
-            slug = re.sub(r'[-\s]+', '-', slug).strip('-')
+    def render(self, text: str, headings: HeadingCollector | None = None) -> str:
+        """Return the HTML for ``text``, giving its headings to ``headings`` if set."""
+        raise NotImplementedError
 
-            css_heading_page_break_class = ""
 
-            # Check for add_page_breaks and if this is an H1 heading, apply page-break-heading class
-            if add_page_breaks and tag == "h1":
-                css_heading_page_break_class = "page-break-heading"
+class PythonMarkdownEngine(MarkdownEngine):  # pylint: disable=too-few-public-methods
+    """Python-Markdown with the extension processors above."""
 
-            # Ensure the slug is not empty
-            if not slug:
-                slug = f"heading-{hash(content) % 10000}"
+    name = "python-markdown"
 
-            return f'<{tag} class="{css_heading_page_break_class}" id="{slug}">{content}</{tag}>'
+    def __init__(self, extensions: list) -> None:
+        self._extensions = extensions
 
-        # Match h1, h2, h3 headings and add IDs
-        html = re.sub(r'<(h[1-3])>(.*?)</\1>', add_id_to_heading, html, flags=re.DOTALL)
-        return html
+    def render(self, text: str, headings: HeadingCollector | None = None) -> str:
+        extensions = self._extensions
+        if headings is not None:
+            extensions = extensions + [HeadingExtension(headings)]
+        return markdown.markdown(text, extensions=extensions)
+
+
+class MarkdownItEngine(MarkdownEngine):  # pylint: disable=too-few-public-methods
+    """markdown-it-py configured to produce the same HTML as ``PythonMarkdownEngine``.
+
+    Single newlines become ``<br />`` (like ``LineBreakExtension``), tables,
+    footnotes and definition lists are enabled (like ``ExtraExtension``) and
+    code blocks are highlighted by the same CodeHilite code.
+    """
+
+    name = "markdown-it"
+
+    def __init__(self) -> None:
+        self._parser: Any = None
+        self._parser_lock = threading.Lock()
+
+    def render(self, text: str, headings: HeadingCollector | None = None) -> str:
+        parser = self._get_parser()
+        env: dict = {}
+        tokens = parser.parse(text, env)
+        if headings is not None:
+            collect_token_headings(tokens, headings)
+        return parser.renderer.render(tokens, parser.options, env)
+
+    def _get_parser(self) -> Any:
+        # Built on first use so deployments using Python-Markdown never import it.
+        with self._parser_lock:
+            if self._parser is None:
+                # pylint: disable=import-outside-toplevel
+                from markdown_it import MarkdownIt
+                from mdit_py_plugins.deflist import deflist_plugin
+                from mdit_py_plugins.footnote import footnote_plugin
+
+                parser = (MarkdownIt("commonmark", {"breaks": True, "html": True})
+                          .enable("table").use(footnote_plugin).use(deflist_plugin))
+                parser.add_render_rule("fence", _render_fence)
+                parser.add_render_rule("code_block", _render_fence)
+                self._parser = parser
+            return self._parser
+
+
+def _render_fence(_renderer: Any, tokens: list, idx: int, _options: Any, _env: Any) -> str:
+    token = tokens[idx]
+    info = token.info.split(maxsplit=1)
+    return highlight_code(token.content, info[0] if info else "") + "\n"
+
+
+# Engine used when a request does not pick one.
+DEFAULT_MARKDOWN_ENGINE = os.getenv("M2P_MARKDOWN_ENGINE", "python-markdown")
+
+_LIST_ITEM_RE = re.compile(r'^([*+-]|\d+\.)\s')
+_LINK_DEFINITION_RE = re.compile(r'^ {0,3}\[[^\]^][^\]]*\]:\s.*$', re.MULTILINE)
+_HTML_BLOCK_RE = re.compile(r'^<(address|article|aside|blockquote|details|div|dl|fieldset|figure'
+                            r'|footer|form|header|ol|p|pre|section|table|ul)[\s>]', re.IGNORECASE)
+
+
+def _iter_lines(text: str) -> Iterator[tuple[int, int]]:
+    """Yield ``(start, end)`` of every line without copying the text."""
+    start = 0
+    while start <= len(text):
+        end = text.find('\n', start)
+        if end < 0:
+            end = len(text)
+        yield start, end
+        start = end + 1
+
+
+def _can_split_before(line: str) -> bool:
+    """Whether a block starting with ``line`` (after a blank line) stands on its own."""
+    # Indented lines continue lists or code, and list items and quotes
+    # continue the list or quote before the blank line.
+    return bool(line.strip()) and not line[0].isspace() and not line.startswith('>') \
+        and not _LIST_ITEM_RE.match(line)
+
+
+def split_markdown(markdown_text: str, first_bytes: int, max_bytes: int) -> Iterator[str]:
+    """Yield consecutive pieces of ``markdown_text`` that can be converted independently.
+
+    Pieces end at blank lines outside code blocks, raw HTML blocks, lists and
+    quotes. The first piece is about ``first_bytes`` long and later ones double
+    up to ``max_bytes``. Reference link definitions are appended to every
+    piece; documents with footnotes are yielded whole.
+    """
+    if '[^' in markdown_text:
+        yield markdown_text
+        return
+    definitions = '\n'.join(_LINK_DEFINITION_RE.findall(markdown_text))
+    suffix = f'\n\n{definitions}\n' if definitions else ''
+
+    target = first_bytes
+    piece_start = 0
+    fence = ''
+    html_tag = ''
+    previous_blank = False
+    for start, end in _iter_lines(markdown_text):
+        line = markdown_text[start:end]
+        if fence:
+            if closes_fence(line, fence):
+                fence = ''
+            continue
+        if html_tag:
+            if f'</{html_tag}>' in line.lower():
+                html_tag = ''
+            continue
+        if (previous_blank and start - piece_start >= target and _can_split_before(line)):
+            yield markdown_text[piece_start:start] + suffix
+            piece_start = start
+            target = min(target * 2, max_bytes)
+        previous_blank = not line.strip()
+        opening = fence_opening(line)
+        if opening:
+            fence = opening.group(2)
+            continue
+        block = _HTML_BLOCK_RE.match(line)
+        if block and f'</{block.group(1).lower()}>' not in line.lower():
+            html_tag = block.group(1).lower()
+    if markdown_text[piece_start:].strip():
+        yield markdown_text[piece_start:] + suffix
+
+
+@dataclass(frozen=True)
+class ConvertedBody:
+    """An HTML body and the outline of the headings that got IDs."""
+
+    html: str
+    headings: list[Heading]
+
+
+# Characters of converted HTML kept in memory; larger bodies are not cached.
+_BODY_CACHE_BYTES = int(os.getenv("M2P_MARKDOWN_CACHE_BYTES", str(32 << 20)))
 
-    def _generate_index(self, html: str) -> str:
-        """Generate an index/table of contents from headings in the HTML."""
-        # Extract headings with their IDs - handles both with and without class attributes
-        headings = []
-        heading_pattern = r'<(h[1-3])(?:\s+class="[^"]*")?\s+id="([^"]+)">(.*?)</\1>'
-
-        for match in re.finditer(heading_pattern, html, re.DOTALL):
-            level = int(match.group(1)[1])  # Extract number from h1, h2, h3
-            heading_id = match.group(2)
-            text = re.sub(r'<[^>]+>', '', match.group(3))  # Remove HTML tags from heading text
-            headings.append({
-                'level': level,
-                'id': heading_id,
-                'text': text.strip()
-            })
+class MarkdownService:
+    """Singleton service that converts Markdown to HTML."""
 
+    _extensions = [
+        TableExtension(),
+        _CODEHILITE,
+        LargeCodeExtension(),   # Plain-text fast path for very large code blocks
+        FencedCodeExtension(),  # Explicitly add fenced code extension
+        ExtraExtension(),       # Add Extra extension which includes proper list support
+        LineBreakExtension(),   # Add our custom line break extension
+    ]
+
+    def __init__(self) -> None:
+        self._body_cache: OrderedDict[tuple, ConvertedBody] = OrderedDict()
+        self._body_cache_bytes = 0
+        self._body_cache_lock = threading.Lock()
+        self.engines: dict[str, MarkdownEngine] = {
+            engine.name: engine
+            for engine in (PythonMarkdownEngine(self._extensions), MarkdownItEngine())
+        }
+        if DEFAULT_MARKDOWN_ENGINE not in self.engines:
+            raise ValueError(f"Unknown M2P_MARKDOWN_ENGINE {DEFAULT_MARKDOWN_ENGINE!r}")
+
+    def clear_cache(self) -> None:
+        """Forget all converted bodies (used by benchmarks to measure cold conversions)."""
+        with self._body_cache_lock:
+            self._body_cache.clear()
+            self._body_cache_bytes = 0
+
+    def get_engine(self, name: str | None = None) -> MarkdownEngine:
+        """Return the engine called ``name``, or the deployment's default engine."""
+        name = getattr(name, "value", name) or DEFAULT_MARKDOWN_ENGINE
+        try:
+            return self.engines[name]
+        except KeyError:
+            raise ValueError(f"Unknown markdown engine {name!r}") from None
+
+    def render_index(self, headings: list[Heading], page_numbers: dict[str, int] | None = None) -> str:
+        """Render the table of contents for ``headings``.
+
+        Without ``page_numbers`` the page numbers are resolved by the renderer
+        with ``target-counter``; with them (e.g. for merged documents laid out
+        in several passes) the given numbers are written out literally and no
+        trailing page break is added.
+        """
         if not headings:
             return ""
 
@@ -287,20 +600,25 @@ class MarkdownService:
         index_html.append('<div class="index-content">')
 
         for heading in headings:
-            level_class = f"index-level-{heading['level']}"
+            level_class = f"index-level-{heading.level}"
+            if page_numbers is None:
+                page_number_html = f'<span class="index-page-number" data-target="{heading.id}"></span>'
+            else:
+                page_number_html = f'<span class="index-page-number-static">{page_numbers.get(heading.id, "")}</span>'
             index_html.append(
                 f'<div class="index-entry {level_class}">'
-                f'<a href="#{heading["id"]}" class="index-link">'
-                f'<span class="index-text">{heading["text"]}</span>'
+                f'<a href="#{heading.id}" class="index-link">'
+                f'<span class="index-text">{escape(heading.text, quote=False)}</span>'
                 f'<span class="index-leader"></span>'
-                f'<span class="index-page-number" data-target="{heading["id"]}"></span>'
+                f'{page_number_html}'
                 f'</a>'
                 f'</div>'
             )
 
         index_html.append('</div>')
         index_html.append('</div>')
-        index_html.append('<div class="page-break"></div>')
+        if page_numbers is None:
+            index_html.append('<div class="page-break"></div>')
 
         return '\n'.join(index_html)
 
@@ -355,7 +673,8 @@ class MarkdownService:
     content: "";
 }
 
-.index-page-number {
+.index-page-number,
+.index-page-number-static {
     flex-shrink: 0;
     font-weight: bold;
 }
@@ -383,6 +702,15 @@ class MarkdownService:
     color: #666;
 }
 
+.index-level-4,
+.index-level-5,
+.index-level-6 {
+    margin-left: 4.5em;
+    font-weight: normal;
+    font-size: 0.9em;
+    color: #666;
+}
+
 .page-break {
     page-break-after: always;
 }
@@ -396,6 +724,15 @@ h1,h2, h3, h4, h5, h6 {
     page-break-after: avoid;
 }
 
+/* PDF bookmarks follow the index: only headings it lists have an ID */
+h1, h2, h3, h4, h5, h6 { bookmark-level: none; }
+h1[id] { bookmark-level: 1; }
+h2[id] { bookmark-level: 2; }
+h3[id] { bookmark-level: 3; }
+h4[id] { bookmark-level: 4; }
+h5[id] { bookmark-level: 5; }
+h6[id] { bookmark-level: 6; }
+
 
 /* Print-specific styles */
 @media print {
@@ -405,45 +742,116 @@ h1,h2, h3, h4, h5, h6 {
 }
 """
 
-    def convert_to_html(self, markdown_text: str, css: str | None = None, include_index: bool = False, add_page_breaks: bool = False) -> str:
-        """Return **full HTML** (optionally wrapped with a `<style>` tag)."""
-        # Preprocess markdown to handle nested lists
-        markdown_text = self.preprocess_nested_lists(markdown_text)
-
-        cleaned = sanitize_glyphs(markdown_text)
+    def convert_body(self, markdown_text: str, add_heading_ids: bool = False, add_page_breaks: bool = False, id_prefix: str = "", auto_width_tables: bool = True, engine: str | None = None) -> str:  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        """Return the post-processed HTML body for ``markdown_text`` (no index, no wrapper)."""
+        return self.convert(markdown_text, add_heading_ids, add_page_breaks, id_prefix, auto_width_tables, engine).html
 
-        # Convert markdown to HTML
-        html_body = markdown.markdown(cleaned, extensions=self._extensions)
+    def convert(self, markdown_text: str, add_heading_ids: bool = False, add_page_breaks: bool = False, id_prefix: str = "", auto_width_tables: bool = True, engine: str | None = None, index_depth: int = DEFAULT_INDEX_DEPTH, reserved_ids: frozenset[str] = frozenset()) -> ConvertedBody:  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+        """Return the post-processed HTML body for ``markdown_text`` and its outline.
 
-        # Add IDs to headings for index linking if index is requested
-        if include_index:
-            html_body = self._add_heading_ids(html_body, add_page_breaks)
+        With ``add_heading_ids`` the parser gives headings down to ``index_depth``
+        IDs (see ``HeadingCollector``) and lists them in ``headings``.
+        Results are cached by content hash and options, so unchanged documents
+        (or sections of a merged document) are converted only once.
+        ``engine`` names the parser (see ``engines``); the default is ``M2P_MARKDOWN_ENGINE``.
+        """
+        parser = self.get_engine(engine)
+        cache_key = (
+            parser.name,
+            hashlib.sha256(markdown_text.encode("utf-8")).hexdigest(),
+            add_heading_ids,
+            add_page_breaks,
+            id_prefix,
+            auto_width_tables,
+            index_depth,
+            reserved_ids,
+        )
+        with self._body_cache_lock:
+            cached = self._body_cache.get(cache_key)
+            if cached is not None:
+                self._body_cache.move_to_end(cache_key)
+                return cached
+
+        # Nested list indentation and glyph sanitisation, in one pass over the lines
+        with stage("preprocess"):
+            cleaned = scan_markdown(markdown_text).text
+
+        # Convert markdown to HTML; heading IDs for index linking are set while parsing
+        collector = None
+        if add_heading_ids:
+            collector = HeadingCollector(index_depth, id_prefix, add_page_breaks, reserved_ids)
+        with stage("markdown"):
+            html_body = parser.render(cleaned, collector)
+
+        # Fixed layout with precomputed column widths for (large) tables
+        if '<table>' in html_body:
+            with stage("tables"):
+                html_body = fix_table_layouts(html_body, auto_width_tables)
 
         # Post-process for PDF-specific text wrapping
-        html_body = optimize_for_pdf_wrapping(html_body)
+        with stage("pdf_wrapping"):
+            html_body = optimize_for_pdf_wrapping(html_body)
 
         # Ensure nested lists are properly styled
-        html_body = ensure_nested_lists(html_body)
-
-        # Handle paragraph breaks more explicitly to ensure they render in PDF
-        # This replaces double newlines with properly spaced paragraphs
-        html_body = re.sub(r'</p>\s*<p>', '</p>\n\n<p>', html_body)
+        with stage("nested_lists"):
+            html_body = ensure_nested_lists(html_body)
+
+        with stage("line_breaks"):
+            # Handle paragraph breaks more explicitly to ensure they render in PDF
+            # This replaces double newlines with properly spaced paragraphs
+            html_body = re.sub(r'</p>\s*<p>', '</p>\n\n<p>', html_body)
+
+            # Ensure single line breaks within paragraphs are preserved (CommonMark treats single newlines as spaces)
+            # We need to do this after markdown conversion for content not in code blocks
+            html_body = re.sub(r'([^>])\n([^<])', r'\1<br>\n\2', html_body)
+
+        converted = ConvertedBody(html_body, collector.headings if collector else [])
+        size = len(html_body)
+        if size > _BODY_CACHE_BYTES:
+            return converted
+        with self._body_cache_lock:
+            previous = self._body_cache.pop(cache_key, None)
+            if previous is not None:
+                self._body_cache_bytes -= len(previous.html)
+            self._body_cache[cache_key] = converted
+            self._body_cache_bytes += size
+            while self._body_cache_bytes > _BODY_CACHE_BYTES:
+                _, evicted = self._body_cache.popitem(last=False)
+                self._body_cache_bytes -= len(evicted.html)
+        return converted
+
+    def convert_to_html(self, markdown_text: str, css: str | None = None, include_index: bool = False, add_page_breaks: bool = False, auto_width_tables: bool = True, engine: str | None = None, index_depth: int = DEFAULT_INDEX_DEPTH) -> str:  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        """Return **full HTML** (optionally wrapped with a `<style>` tag)."""
+        html_body = self.render_document_body(markdown_text, include_index, add_page_breaks, auto_width_tables, engine, index_depth)
+        with stage("wrap_html"):
+            return self.wrap_html(html_body, css, include_index)
 
-        # Ensure single line breaks within paragraphs are preserved (CommonMark treats single newlines as spaces)
-        # We need to do this after markdown conversion for content not in code blocks
-        html_body = re.sub(r'([^>])\n([^<])', r'\1<br>\n\2', html_body)
+    def render_document_body(self, markdown_text: str, include_index: bool = False, add_page_breaks: bool = False, auto_width_tables: bool = True, engine: str | None = None, index_depth: int = DEFAULT_INDEX_DEPTH) -> str:  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        """Return the style-independent document body, including the index if requested."""
+        converted = self.convert(markdown_text, add_heading_ids=include_index, add_page_breaks=add_page_breaks, auto_width_tables=auto_width_tables, engine=engine, index_depth=index_depth)
 
-        # Generate index if requested
+        # Generate index if requested, from the headings collected while parsing
         if include_index:
-            index_html = self._generate_index(html_body)
-            html_body = index_html + html_body
+            with stage("index"):
+                index_html = self.render_index(converted.headings)
+            return index_html + converted.html
+
+        return converted.html
 
+    def wrap_html(self, html_body: str, css: str | None = None, include_index: bool = False) -> str:
+        """Wrap an HTML body into a full document with the given CSS."""
         if css:
-            # Add index-specific CSS if index is included
-            if include_index:
-                css += self._get_index_css()
+            return self.open_document(css, include_index) + html_body + self.close_document()
+        # Caller will inject CSS later
+        return html_body
+
+    def open_document(self, css: str, include_index: bool = False) -> str:
+        """Return the start of a full document, up to where its body content goes."""
+        # Add index-specific CSS if index is included
+        if include_index:
+            css += self._get_index_css()
 
-            return f"""
+        return f"""
 <!DOCTYPE html>
 <html lang=\"en\">
   <head>
@@ -453,11 +861,13 @@ h1,h2, h3, h4, h5, h6 {
     </style>
   </head>
   <body>
-    {html_body}
+    """
+
+    def close_document(self) -> str:
+        """Return the end of a document started by ``open_document``."""
+        return """
   </body>
 </html>"""
-        # Caller will inject CSS later
-        return html_body
 
 
 # Expose a ready‑to‑use instance
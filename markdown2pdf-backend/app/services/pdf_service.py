@@ -9,42 +9,34 @@ This version fixes:
 # pylint: disable=line-too-long
 from __future__ import annotations
 
-import io
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import TYPE_CHECKING
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, BinaryIO, Optional, Sequence
 
-from weasyprint import HTML  # type: ignore[import-untyped]
-
-from app.services.markdown_service import markdown_service
+from app.services.headings import DEFAULT_INDEX_DEPTH, Heading
+from app.services.fallback_fonts import detect_scripts, fallback_fonts
+from app.services.markdown_service import ConvertedBody, markdown_service
 from app.services.font_service import font_service
+from app.services.font_subset_service import document_codepoints
+from app.services.image_service import DEFAULT_IMAGE_DPI, image_service
+from app.services.stage_timing import stage
+from app.services.theme_service import STYLES_NAME, theme_registry
 
 if TYPE_CHECKING:
-    from app.models import PDFGenerationRequest
-
-# Path to custom CSS files for PDF output
-_STYLES_CSS_PATH = (
-    Path(__file__).resolve().parent.parent / "static" / "css" / "styles.css"
-)
-
-_CODE_HIGHLIGHT_CSS_PATH = (
-    Path(__file__).resolve().parent.parent / "static" / "css" / "code-highlight.css"
-)
-
-def _read_styles_css() -> str:
-    """Return the contents of ``styles.css`` and  ``code-highlight.css`` if files exists."""
-    try:
-        return _STYLES_CSS_PATH.read_text(encoding="utf-8")
+    from app.models import MergeSection, PDFGenerationRequest, PDFMergeRequest, PDFStyleOptions
 
-    except OSError:
-        return ""
 
-def _read_code_highlight_css() -> str:
-    """Return the contents of ``styles.css`` and  ``code-highlight.css`` if files exists."""
-    try:
-        return _CODE_HIGHLIGHT_CSS_PATH.read_text(encoding="utf-8")
+@lru_cache(maxsize=None)
+def _weasyprint_html() -> Any:
+    """Import WeasyPrint on first use; it dominates the service's import time."""
+    from weasyprint import HTML  # type: ignore[import-untyped]  # pylint: disable=import-outside-toplevel
+    return HTML
 
-    except OSError:
-        return ""
 
 # ---------------------------------------------------------------------------
 # CSS templates
@@ -65,7 +57,7 @@ body {{
 }}
 
 code, pre {{
-  font-family: '{monospace_font}', 'DejaVu Sans Mono', monospace;
+  font-family: {monospace_stack};
 }}
 
 """
@@ -103,6 +95,24 @@ _FONT_STACKS = {
 
 _SIZE_LEVELS = {1: 9, 2: 12, 3: 14, 4: 16, 5: 20}
 
+# Estimated bytes of laid-out merge sections kept per worker. A WeasyPrint box
+# tree takes roughly ten times the memory of the HTML it was built from.
+_MERGE_LAYOUT_CACHE_BYTES = int(os.getenv("M2P_MERGE_LAYOUT_CACHE_BYTES", str(256 << 20)))
+_LAYOUT_BYTES_PER_CHAR = 10
+
+# Layout passes allowed for a merged index to settle on its own page count.
+_MERGE_INDEX_PASSES = 3
+
+# ``write_pdf`` options of each output profile. ``standard`` keeps WeasyPrint's
+# defaults (compressed streams and object streams, subset fonts without
+# hinting). ``draft`` skips zlib and font subsetting, which makes the file
+# several times larger; ``compact`` also re-encodes every image.
+_OUTPUT_PROFILES: dict[str, dict[str, Any]] = {
+    "draft": {"uncompressed_pdf": True, "full_fonts": True},
+    "standard": {},
+    "compact": {"optimize_images": True, "jpeg_quality": 70},
+}
+
 _SPACING_LEVELS = {
     "comfort": 1.6,
     "comfortable": 1.6,
@@ -117,55 +127,293 @@ _SPACING_LEVELS = {
 class PDFService:
     """Convert Markdown + user preferences into a PDF (bytes)."""
 
+    def __init__(self) -> None:
+        # Assembled CSS keyed by the style options it depends on; batches and
+        # repeat requests with the same styling reuse it.
+        self._css_cache: dict[tuple, str] = {}
+        # Laid-out WeasyPrint documents for merge sections, keyed by content.
+        self._section_layouts: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._section_layouts_bytes = 0
+        self._section_layouts_lock = threading.Lock()
+        theme_registry.on_reload(self.clear_style_caches)
+
+    def __reduce__(self) -> str:
+        # Bound methods are sent to process render pools by pickling; refer
+        # to the worker's own singleton instead of copying caches and locks.
+        return "pdf_service"
+
     # ---------------------------------------------------------------------
     # Public API
     # ---------------------------------------------------------------------
 
-    def generate_pdf(self, request: PDFGenerationRequest) -> bytes:
-        """Generate PDF from markdown respecting the user's styling choices."""
-        # Ensure fonts are registered
-        font_service.register_fonts()
+    def clear_style_caches(self) -> None:
+        """Forget CSS and layouts built from stylesheets that changed on disk."""
+        self._css_cache.clear()
+        with self._section_layouts_lock:
+            self._section_layouts.clear()
+            self._section_layouts_bytes = 0
+
+    def generate_pdf(self, request: PDFGenerationRequest, base_dir: Optional[Path] = None) -> bytes:
+        """Generate PDF from markdown respecting the user's styling choices.
+
+        Relative image paths are resolved against ``base_dir`` (default: the
+        working directory).
+        """
+        return self.generate_pdf_from_body(
+            self.render_body(request), request, getattr(request, 'include_index', False), base_dir
+        )
 
-        # Build CSS with font settings for PDF generation (use system paths)
-        css = self._build_css(request, for_preview=False)
-        html_doc = markdown_service.convert_to_html(
+    def render_body(self, request: PDFGenerationRequest) -> str:
+        """Parse, highlight and post-process the markdown into a style-independent HTML body."""
+        return markdown_service.render_document_body(
             request.markdown,
-            css=css,
             include_index=getattr(request, 'include_index', False),
-            add_page_breaks=getattr(request, 'add_page_breaks', False)
+            add_page_breaks=getattr(request, 'add_page_breaks', False),
+            auto_width_tables=getattr(request, 'auto_width_tables', True),
+            engine=getattr(request, 'markdown_engine', None),
+            index_depth=getattr(request, 'index_depth', DEFAULT_INDEX_DEPTH),
         )
 
-        # Newer WeasyPrint versions return bytes directly, older ones accept a file‑like target.
-        try:
-            return HTML(string=html_doc, base_url=str(Path.cwd())).write_pdf()
-        except TypeError:
-            # Compatibility fallback for older WeasyPrint that require a file‑like object
-            pdf_buffer = io.BytesIO()
-            HTML(string=html_doc, base_url=str(Path.cwd())).write_pdf(pdf_buffer)
-            pdf_buffer.seek(0)
-            return pdf_buffer.read()
-
-    def generate_pdf_preview(self, request: PDFGenerationRequest) -> str:
-        """Generate HTML preview for markdown respecting the user's styling choices."""
+    def generate_pdf_file(self, request: PDFGenerationRequest, path: str) -> int:
+        """Write the PDF for ``request`` to ``path`` and return its size in bytes.
+
+        Used by render workers so that the PDF never passes through memory as
+        one ``bytes`` object or gets pickled back to the server process.
+        """
+        document = self._layout(self.render_body(request), request,
+                                getattr(request, 'include_index', False))
+        with stage("write_pdf"), open(path, "wb") as target:
+            _write_pdf(document, request, target)
+            return target.tell()
+
+    def generate_pdf_from_body(self, html_body: str, style: PDFStyleOptions,
+                               include_index: bool = False,
+                               base_dir: Optional[Path] = None) -> bytes:
+        """Render an already converted HTML body with the given styling options."""
+        document = self._layout(html_body, style, include_index, base_dir)
+        with stage("write_pdf"):
+            return _write_pdf(document, style)
+
+    def generate_pdf_preview(self, request: PDFGenerationRequest,
+                             font_subsets: Optional[str] = None) -> str:
+        """Generate HTML preview for markdown respecting the user's styling choices.
+
+        ``font_subsets`` is the URL prefix of the font subset endpoint; the
+        preview then loads only the glyphs its text needs.
+        """
         # Ensure fonts are registered
         font_service.register_fonts()
 
         # Build CSS with font settings for preview (use web paths)
-        css = self._build_css(request, for_preview=True)
+        css = self._build_preview_css(request, font_subsets, request.markdown)
         html_doc = markdown_service.convert_to_html(
             request.markdown,
             css=css,
             include_index=getattr(request, 'include_index', False),
-            add_page_breaks=getattr(request, 'add_page_breaks', False)
+            add_page_breaks=getattr(request, 'add_page_breaks', False),
+            auto_width_tables=getattr(request, 'auto_width_tables', True),
+            engine=getattr(request, 'markdown_engine', None),
+            index_depth=getattr(request, 'index_depth', DEFAULT_INDEX_DEPTH),
         )
 
         return html_doc
 
+    def generate_preview_head(self, style: PDFStyleOptions, font_subsets: Optional[str] = None,
+                              markdown_text: str = "") -> str:
+        """Return the start of a streamed preview: the document head with its CSS.
+
+        With ``font_subsets`` the fonts are subset to the whole ``markdown_text``.
+        """
+        font_service.register_fonts()
+        css = self._build_preview_css(style, font_subsets, markdown_text)
+        return markdown_service.open_document(css, style.include_index)
+
+    def generate_preview_piece(self, markdown_text: str, style: PDFStyleOptions,
+                               reserved_ids: frozenset[str] = frozenset()) -> str:
+        """Convert one piece of a streamed preview (see ``markdown_service.split_markdown``).
+
+        ``reserved_ids`` are the heading IDs taken by earlier pieces.
+        """
+        return self._convert_preview_piece(markdown_text, style, reserved_ids).html
+
+    def preview_piece_headings(self, markdown_text: str, style: PDFStyleOptions) -> list[Heading]:
+        """Return the index entries of one piece of a streamed preview, numbered on their own."""
+        return self._convert_preview_piece(markdown_text, style).headings
+
+    def preload_stylesheets(self, font_families: Sequence[str | None]) -> int:
+        """Assemble and cache the stylesheet of every size/spacing combination for the given fonts."""
+        # app.models imports the services package, so import it at call time.
+        from app.models import PDFStyleOptions, SpacingOption  # pylint: disable=import-outside-toplevel
+
+        built = 0
+        for font_family in font_families:
+            for size_level in _SIZE_LEVELS:
+                for spacing in SpacingOption:
+                    style = PDFStyleOptions(font_family=font_family, size_level=size_level,
+                                            spacing=spacing)
+                    for for_preview in (False, True):
+                        self._build_css(style, for_preview=for_preview)
+                        built += 1
+        return built
+
+    def generate_merged_pdf(self, request: PDFMergeRequest) -> bytes:
+        """Lay out each section independently and write them as a single PDF.
+
+        Section bodies are cached by ``MarkdownService`` and section layouts
+        are cached here, so re-exporting after a one-section change only
+        converts and lays out that section. Writing all pages through one
+        document embeds a single subset per font and combines the outlines.
+        """
+        font_service.register_fonts()
+        scripts = frozenset().union(*(detect_scripts(section.markdown) for section in request.sections))
+        css = self._build_css(request, for_preview=False, scripts=scripts)
+
+        converted = [
+            markdown_service.convert(
+                section.markdown,
+                add_heading_ids=request.include_index,
+                add_page_breaks=request.add_page_breaks,
+                id_prefix=_section_prefix(section, index),
+                auto_width_tables=request.auto_width_tables,
+                engine=request.markdown_engine,
+                index_depth=request.index_depth,
+            )
+            for index, section in enumerate(request.sections)
+        ]
+        bodies = [image_service.prepare(body.html, request.image_dpi, Path.cwd()) for body in converted]
+
+        # Sections are laid out one after another in this process. Threads gain
+        # nothing while WeasyPrint holds the GIL, and other processes cannot
+        # hand their layouts back: pages keep Pango layouts (cffi pointers)
+        # that do not pickle, and combining pages in one document is what
+        # gives the single font subsets and outline. The layout cache keeps
+        # re-exports to the sections that changed.
+        documents = [self._layout_section(body, css, request.include_index) for body in bodies]
+
+        pages = [page for document in documents for page in document.pages]
+        # Keep the index document referenced until the PDF is written: its
+        # font configuration must outlive the pages that use it.
+        index_document = None
+        if request.include_index:
+            headings = [heading for body in converted for heading in body.headings]
+            index_document = self._layout_merged_index(headings, documents, css)
+            if index_document is not None:
+                pages = list(index_document.pages) + pages
+
+        return _write_pdf(documents[0].copy(pages), request)
+
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
 
-    def _build_css(self, request: PDFGenerationRequest, for_preview: bool = False) -> str:
+    def _convert_preview_piece(self, markdown_text: str, style: PDFStyleOptions,
+                               reserved_ids: frozenset[str] = frozenset()) -> ConvertedBody:
+        return markdown_service.convert(
+            markdown_text,
+            add_heading_ids=style.include_index,
+            add_page_breaks=style.add_page_breaks,
+            auto_width_tables=style.auto_width_tables,
+            engine=style.markdown_engine,
+            index_depth=style.index_depth,
+            reserved_ids=reserved_ids,
+        )
+
+    def _layout(self, html_body: str, style: PDFStyleOptions, include_index: bool,
+                base_dir: Optional[Path] = None) -> Any:
+        """Lay out an already converted HTML body with the given styling options.
+
+        Relative URLs in the body are resolved against ``base_dir``.
+        """
+        base_dir = base_dir or Path.cwd()
+        # Ensure fonts are registered
+        font_service.register_fonts()
+
+        # Build CSS with font settings for PDF generation (use system paths)
+        with stage("css"):
+            css = self._build_css(style, for_preview=False, scripts=detect_scripts(html_body))
+        with stage("images"):
+            html_body = image_service.prepare(
+                html_body, getattr(style, 'image_dpi', DEFAULT_IMAGE_DPI), base_dir
+            )
+        with stage("wrap_html"):
+            html_doc = markdown_service.wrap_html(html_body, css, include_index)
+
+        with stage("layout"):
+            return _weasyprint_html()(string=html_doc, base_url=str(base_dir)).render()
+
+    def _layout_section(self, html_body: str, css: str, include_index: bool) -> Any:
+        """Return the laid-out WeasyPrint document for one merge section."""
+        key = hashlib.sha256(f"{include_index}\0{css}\0{html_body}".encode("utf-8")).hexdigest()
+        with self._section_layouts_lock:
+            cached = self._section_layouts.get(key)
+            if cached is not None:
+                self._section_layouts.move_to_end(key)
+                return cached[0]
+
+        html_doc = markdown_service.wrap_html(html_body, css, include_index)
+        document = _weasyprint_html()(string=html_doc, base_url=str(Path.cwd())).render()
+
+        size = len(html_doc) * _LAYOUT_BYTES_PER_CHAR
+        if size > _MERGE_LAYOUT_CACHE_BYTES:
+            return document
+        with self._section_layouts_lock:
+            previous = self._section_layouts.pop(key, None)
+            if previous is not None:
+                self._section_layouts_bytes -= previous[1]
+            self._section_layouts[key] = (document, size)
+            self._section_layouts_bytes += size
+            while self._section_layouts_bytes > _MERGE_LAYOUT_CACHE_BYTES:
+                _, (_, evicted) = self._section_layouts.popitem(last=False)
+                self._section_layouts_bytes -= evicted
+        return document
+
+    def _layout_merged_index(self, headings: list[Heading], documents: list[Any], css: str) -> Any:
+        """Lay out a table of contents with page numbers continuous across all sections."""
+        if not headings:
+            return None
+
+        anchor_pages: dict[str, int] = {}
+        page_number = 0
+        for document in documents:
+            for page in document.pages:
+                page_number += 1
+                for anchor in page.anchors:
+                    anchor_pages.setdefault(anchor, page_number)
+
+        # The index shifts every section by its own length, so lay it out
+        # until its page count is stable.
+        index_pages = 1
+        index_document = None
+        for _ in range(_MERGE_INDEX_PASSES):
+            page_numbers = {anchor: number + index_pages for anchor, number in anchor_pages.items()}
+            html_doc = markdown_service.wrap_html(
+                markdown_service.render_index(headings, page_numbers), css, include_index=True
+            )
+            index_document = _weasyprint_html()(string=html_doc, base_url=str(Path.cwd())).render()
+            if len(index_document.pages) == index_pages:
+                break
+            index_pages = len(index_document.pages)
+
+        return index_document
+
+
+    def _build_preview_css(self, style: PDFStyleOptions, font_subsets: Optional[str],
+                           markdown_text: str) -> str:
+        if not font_subsets:
+            return self._build_css(style, for_preview=True)
+        font_face_css = font_service.get_font_face_css(
+            getattr(style, "font_family", "Inter"), for_preview=True, subset_base=font_subsets,
+            codepoints=document_codepoints(markdown_text))
+        return self._build_css(style, for_preview=True, font_face_css=font_face_css)
+
+    def _build_css(self, request: PDFStyleOptions, for_preview: bool = False,  # pylint: disable=too-many-locals
+                   font_face_css: Optional[str] = None,
+                   scripts: frozenset[str] = frozenset()) -> str:
+        """Assemble the stylesheet; a given ``font_face_css`` bypasses the cache.
+
+        PDFs of documents in ``scripts`` (see ``fallback_fonts.detect_scripts``)
+        get the fallback fonts for them; browsers find their own.
+        """
         base_size = _SIZE_LEVELS.get(getattr(request, "size_level", 3), 12)
 
         # `spacing` may be an Enum or a raw string; normalise to lowercase string
@@ -174,8 +422,20 @@ class PDFService:
         line_height = _SPACING_LEVELS.get(spacing_key, 1.4)
 
         requested_font = getattr(request, "font_family", "Inter")
-        font_stack = _FONT_STACKS.get(requested_font, "'DejaVu Sans', sans-serif")
-        font_face_css = font_service.get_font_face_css(requested_font, for_preview=for_preview)
+        styles = theme_registry.get(STYLES_NAME)
+        code_theme = theme_registry.code_theme(getattr(request, "code_theme", None))
+
+        fallbacks = [] if for_preview else fallback_fonts.for_scripts(scripts)
+        cache_key = (base_size, line_height, requested_font, for_preview, styles.digest, code_theme.digest, tuple(fallbacks))
+        per_document = font_face_css is not None
+        cached_css = None if per_document else self._css_cache.get(cache_key)
+        if cached_css is not None:
+            return cached_css
+
+        font_stack = fallback_fonts.font_stack(
+            _FONT_STACKS.get(requested_font, "'DejaVu Sans', sans-serif"), fallbacks)
+        if font_face_css is None:
+            font_face_css = font_service.get_font_face_css(requested_font, for_preview=for_preview)
 
         # Get the monospace font to use for code blocks
         monospace_font = font_service.get_monospace_font()
@@ -184,13 +444,16 @@ class PDFService:
             font_stack=font_stack,
             base_size=base_size,
             line_height=line_height,
-            monospace_font=monospace_font
+            monospace_stack=fallback_fonts.font_stack(
+                f"'{monospace_font}', 'DejaVu Sans Mono', monospace", fallbacks)
         )
 
         css_parts = [_PAGE_CSS]
-        theme_css = _read_styles_css() + _read_code_highlight_css()
+        theme_css = styles.css + code_theme.css
         if font_face_css:
             css_parts.append(font_face_css)
+        if fallbacks:
+            css_parts.append(fallback_fonts.font_face_css(fallbacks))
         if theme_css:
             css_parts.append(theme_css)
         css_parts.append(body_css)
@@ -200,7 +463,10 @@ class PDFService:
             preview_css = self._get_preview_specific_css()
             css_parts.append(preview_css)
 
-        return "\n".join(css_parts)
+        css = "\n".join(css_parts)
+        if not per_document:
+            self._css_cache[cache_key] = css
+        return css
 
     def _get_preview_specific_css(self) -> str:
         """Return CSS styles specific to preview mode to make page breaks visible."""
@@ -258,5 +524,24 @@ h1.page-break-heading::before {
 """
 
 
+def _write_pdf(document: Any, style: PDFStyleOptions, target: Optional[BinaryIO] = None) -> bytes:
+    """Write ``document`` with the ``write_pdf`` options of the requested output profile.
+
+    Returns the PDF, or ``b""`` when it is written to ``target`` instead.
+    """
+    profile = getattr(style, 'output_profile', 'standard')
+    options = _OUTPUT_PROFILES[getattr(profile, 'value', profile)]
+    if options.get("optimize_images"):
+        # Images WeasyPrint re-encodes are capped at the requested resolution too.
+        options = {**options, "dpi": getattr(style, 'image_dpi', DEFAULT_IMAGE_DPI)}
+    return document.write_pdf(target, **options) or b""
+
+
+def _section_prefix(section: MergeSection, index: int) -> str:
+    """Return the heading ID prefix that keeps a section's anchors unique."""
+    key = re.sub(r"[^\w-]+", "-", section.id or "").strip("-").lower()
+    return f"{key or f's{index + 1}'}-"
+
+
 # Singleton instance
 pdf_service = PDFService()
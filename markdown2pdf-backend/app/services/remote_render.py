@@ -0,0 +1,291 @@
+"""Dispatch render jobs to render workers running on other nodes.
+
+A render worker (``python -m app.render_worker``) runs the same code as the
+API and executes the jobs sent to it over TCP. Every message is one frame: a
+4-byte length, an HMAC-SHA256 of that length, an HMAC-SHA256 of the payload
+(both keyed with ``M2P_RENDER_WORKER_SECRET``) and the pickled payload. The
+length is checked against its signature and ``M2P_RENDER_WORKER_MAX_FRAME_BYTES``
+before any of the payload is read, and the payload against its signature
+before it is unpickled, so only holders of the secret can make a worker buffer
+or run anything. Each request carries a random ID and the time it was sent;
+workers refuse IDs they have seen and requests older than
+``M2P_RENDER_WORKER_REPLAY_WINDOW`` seconds, so a captured frame cannot be
+replayed, and every reply names the request it answers.
+
+The API probes the workers listed in ``M2P_RENDER_WORKERS`` (comma-separated
+``host:port``) at most every ``M2P_RENDER_WORKER_CHECK_INTERVAL`` seconds.
+Workers that answer take jobs, least loaded first; workers that don't are
+skipped until they answer again. A job whose worker is lost, or does not
+answer within ``M2P_RENDER_WORKER_JOB_TIMEOUT`` seconds, is retried on another
+one, and when no worker can take it ``RenderExecutor`` renders it in its local
+pools.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import heapq
+import hmac
+import logging
+import os
+import pickle
+import struct
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_ADDRESSES = [a.strip() for a in os.getenv("M2P_RENDER_WORKERS", "").split(",") if a.strip()]
+_SECRET = os.getenv("M2P_RENDER_WORKER_SECRET", "")
+_CHECK_INTERVAL = float(os.getenv("M2P_RENDER_WORKER_CHECK_INTERVAL", "5"))
+# Seconds to connect to a worker or to get a health check answered.
+_TIMEOUT = float(os.getenv("M2P_RENDER_WORKER_TIMEOUT", "2"))
+# Other workers tried after the one a job was sent to was lost.
+_RETRIES = int(os.getenv("M2P_RENDER_WORKER_RETRIES", "2"))
+# Seconds a worker may take to answer a render before the job is sent elsewhere.
+_JOB_TIMEOUT = float(os.getenv("M2P_RENDER_WORKER_JOB_TIMEOUT", "300"))
+# Largest job or result sent in one frame.
+_MAX_FRAME_BYTES = int(os.getenv("M2P_RENDER_WORKER_MAX_FRAME_BYTES", str(256 << 20)))
+# Seconds a request stays valid; also the clock skew tolerated between nodes.
+_REPLAY_WINDOW = float(os.getenv("M2P_RENDER_WORKER_REPLAY_WINDOW", "300"))
+
+# Length, HMAC-SHA256 of the length and HMAC-SHA256 of the pickled payload that follows.
+_HEADER = struct.Struct("!I32s32s")
+_LENGTH = struct.Struct("!I")
+
+# Failures that mean the worker (or the network to it) is gone.
+_CONNECTION_ERRORS = (OSError, EOFError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+
+class ProtocolError(Exception):
+    """A frame that is too large, badly signed or not understood."""
+
+
+class NoRenderWorker(Exception):
+    """No remote worker could take the job; render it locally instead."""
+
+
+def _sign(secret: bytes, payload: bytes) -> bytes:
+    return hmac.new(secret, payload, hashlib.sha256).digest()
+
+
+def _sign_length(secret: bytes, length: int) -> bytes:
+    return _sign(secret, b"m2p-frame-length\0" + _LENGTH.pack(length))
+
+
+async def write_message(writer: asyncio.StreamWriter, message: Any, secret: bytes) -> None:
+    """Pickle, sign and send one message.
+
+    Raises ``ProtocolError`` without sending anything when the message is too large.
+    """
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) > _MAX_FRAME_BYTES:
+        raise ProtocolError(f"Frame of {len(payload)} bytes is too large")
+    writer.write(_HEADER.pack(len(payload), _sign_length(secret, len(payload)),
+                              _sign(secret, payload)))
+    writer.write(payload)
+    await writer.drain()
+
+
+async def read_message(reader: asyncio.StreamReader, secret: bytes) -> Any:
+    """Receive one message, refusing it unless it was signed with ``secret``."""
+    length, length_signature, signature = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if not hmac.compare_digest(length_signature, _sign_length(secret, length)):
+        raise ProtocolError("Frame header signature does not match")
+    if length > _MAX_FRAME_BYTES:
+        raise ProtocolError(f"Frame of {length} bytes is too large")
+    payload = await reader.readexactly(length)
+    if not hmac.compare_digest(signature, _sign(secret, payload)):
+        raise ProtocolError("Frame signature does not match")
+    try:
+        return pickle.loads(payload)
+    except Exception as e:
+        # E.g. a job for code this side doesn't have (mixed versions mid-deploy).
+        raise ProtocolError(f"Cannot unpickle frame: {e}") from e
+
+
+class ReplayGuard:  # pylint: disable=too-few-public-methods
+    """Refuse requests whose ID was seen before or that were sent too long ago.
+
+    IDs are remembered for ``window`` seconds after they were sent; older
+    requests are refused by their timestamp alone.
+    """
+
+    def __init__(self, window: float = _REPLAY_WINDOW) -> None:
+        self.window = window
+        self._seen: Set[bytes] = set()
+        # (expiry, request ID), soonest first.
+        self._expiries: List[Tuple[float, bytes]] = []
+
+    def accept(self, message: Any) -> Tuple[bytes, Tuple[Any, ...]]:
+        """Return the ID and body of a request, or raise ``ProtocolError``."""
+        try:
+            request_id, sent_at, body = message
+            now = time.time()
+            fresh = abs(now - sent_at) <= self.window
+        except (TypeError, ValueError) as e:
+            raise ProtocolError("Malformed request") from e
+        if not isinstance(request_id, bytes):
+            raise ProtocolError("Malformed request")
+        if not fresh:
+            raise ProtocolError("Request is outside the replay window")
+        while self._expiries and self._expiries[0][0] < now:
+            self._seen.discard(heapq.heappop(self._expiries)[1])
+        if request_id in self._seen:
+            raise ProtocolError("Request was replayed")
+        self._seen.add(request_id)
+        heapq.heappush(self._expiries, (sent_at + self.window, request_id))
+        return request_id, body
+
+
+def split_address(address: str) -> Tuple[str, int]:
+    """Split ``host:port``; a bare ``:port`` means this machine."""
+    host, _, port = address.rpartition(":")
+    return host.strip("[]") or "127.0.0.1", int(port)
+
+
+@dataclass
+class WorkerState:
+    """What the API knows about one render worker."""
+
+    address: str
+    healthy: bool = False
+    # Jobs the worker runs at once, and how many it reported running.
+    capacity: int = 0
+    reported: int = 0
+    # Jobs this process has sent to it and not yet got back.
+    pending: int = 0
+
+    @property
+    def load(self) -> float:
+        """Share of the worker's capacity in use, as far as this process can tell."""
+        return max(self.pending, self.reported) / max(1, self.capacity)
+
+
+class RemoteWorkerPool:  # pylint: disable=too-many-instance-attributes
+    """Health-checked render workers on other nodes, used least loaded first."""
+
+    def __init__(self, addresses: Iterable[str] = (), secret: str = _SECRET,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                 check_interval: float = _CHECK_INTERVAL, timeout: float = _TIMEOUT,
+                 retries: int = _RETRIES, job_timeout: float = _JOB_TIMEOUT) -> None:
+        self.secret = secret.encode("utf-8")
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.retries = retries
+        self.job_timeout = job_timeout
+        self._workers: Dict[str, WorkerState] = {}
+        self._last_check: Optional[float] = None
+        self._checking: Optional[asyncio.Task] = None
+        for address in addresses:
+            self.register(address)
+        if self._workers and not self.secret:
+            logger.warning("M2P_RENDER_WORKERS is set without M2P_RENDER_WORKER_SECRET; "
+                           "rendering locally")
+
+    @property
+    def enabled(self) -> bool:
+        """Whether jobs may be sent to remote workers at all."""
+        return bool(self._workers and self.secret)
+
+    def register(self, address: str) -> None:
+        """Add a worker; it takes jobs once it has answered a health check."""
+        split_address(address)
+        self._workers.setdefault(address, WorkerState(address))
+        self._last_check = None
+
+    def unregister(self, address: str) -> None:
+        """Stop sending jobs to a worker."""
+        self._workers.pop(address, None)
+
+    def workers(self) -> List[WorkerState]:
+        """Return the registered workers."""
+        return list(self._workers.values())
+
+    def capacity(self) -> int:
+        """Return how many jobs the healthy workers run at once, as last reported."""
+        return sum(worker.capacity for worker in self._workers.values() if worker.healthy)
+
+    async def check(self) -> int:
+        """Health-check every worker now; return how many are up."""
+        self._last_check = time.monotonic()
+        await asyncio.gather(*(self._probe(worker) for worker in self.workers()))
+        return sum(worker.healthy for worker in self.workers())
+
+    async def run(self, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[Any, float]:
+        """Run ``fn(*args)`` on the least loaded worker; return its result and runtime in ms.
+
+        Exceptions raised by ``fn`` are re-raised here. A worker that does not
+        answer within ``job_timeout`` seconds is treated as lost. Raises
+        ``NoRenderWorker`` when no worker is up or every one tried was lost.
+        """
+        await self._refresh()
+        tried: Set[str] = set()
+        for _ in range(self.retries + 1):
+            worker = self._least_loaded(tried)
+            if worker is None:
+                break
+            tried.add(worker.address)
+            worker.pending += 1
+            try:
+                status, value, elapsed_ms, worker.reported = await asyncio.wait_for(
+                    self._request(worker.address, ("render", fn, args)), self.job_timeout)
+            except (*_CONNECTION_ERRORS, ProtocolError) as e:
+                worker.healthy = False
+                logger.warning("render worker %s lost (%s); trying another", worker.address,
+                               str(e) or type(e).__name__)
+                continue
+            finally:
+                worker.pending -= 1
+            if status == "failed":
+                raise value
+            return value, elapsed_ms
+        raise NoRenderWorker("No render worker available")
+
+    def _least_loaded(self, tried: Set[str]) -> Optional[WorkerState]:
+        candidates = [w for w in self._workers.values() if w.healthy and w.address not in tried]
+        return min(candidates, key=lambda worker: worker.load, default=None)
+
+    async def _refresh(self) -> None:
+        """Start a health check when due; wait for it only while no worker is up."""
+        if ((self._last_check is None
+             or time.monotonic() - self._last_check >= self.check_interval)
+                and (self._checking is None or self._checking.done())):
+            self._last_check = time.monotonic()
+            self._checking = asyncio.ensure_future(self.check())
+        if (self._checking is not None and not self._checking.done()
+                and not any(worker.healthy for worker in self.workers())):
+            await asyncio.shield(self._checking)
+
+    async def _probe(self, worker: WorkerState) -> None:
+        was_healthy = worker.healthy
+        try:
+            _, worker.capacity, worker.reported = await asyncio.wait_for(
+                self._request(worker.address, ("health",)), self.timeout)
+            worker.healthy = worker.capacity > 0
+        except (*_CONNECTION_ERRORS, ProtocolError, ValueError):
+            worker.healthy = False
+        if worker.healthy != was_healthy:
+            logger.info("render worker %s is %s", worker.address,
+                        "up" if worker.healthy else "down")
+
+    async def _request(self, address: str, message: Tuple[Any, ...]) -> Any:
+        host, port = split_address(address)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+        request_id = os.urandom(16)
+        try:
+            await write_message(writer, (request_id, time.time(), message), self.secret)
+            reply = await read_message(reader, self.secret)
+        finally:
+            writer.close()
+        try:
+            reply_id, body = reply
+        except (TypeError, ValueError) as e:
+            raise ProtocolError("Malformed reply") from e
+        if reply_id != request_id:
+            raise ProtocolError("Reply is for another request")
+        return body
+
+
+# Singleton instance
+remote_workers = RemoteWorkerPool(_ADDRESSES)
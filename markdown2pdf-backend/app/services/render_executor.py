@@ -0,0 +1,134 @@
+"""Lane-based executor that runs blocking render work off the event loop.
+
+Requests are routed by their predicted cost (see ``cost_service``) into one of
+two independent worker pools: a low-latency lane for short documents and a
+bulk lane for large ones, so small documents never queue behind whales.
+
+Jobs that produce large ``bytes`` (rendered PDFs) can ask for their result as a
+``ResultBuffer``; process workers then hand it over via shared memory instead
+of pickling it (see ``result_transport``).
+
+When render workers on other nodes are configured (see ``remote_render``),
+jobs are sent to them instead and the local pools only take over while no
+remote worker is available.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+from app.services.cost_service import (
+    BULK_LANE,
+    FAST_LANE,
+    MERGE_LANE,
+    DocumentCost,
+    cost_estimator,
+)
+from app.services.remote_render import NoRenderWorker, remote_workers
+from app.services.result_transport import ResultBuffer, discard_result, export_result
+
+# "process" gives real parallelism for CPU-bound WeasyPrint layout; "thread"
+# is useful for development and tests where forking is undesirable.
+_POOL_KIND = os.getenv("M2P_RENDER_POOL", "process").lower()
+
+_LANE_WORKERS = {
+    FAST_LANE: int(os.getenv("M2P_FAST_LANE_WORKERS", "2")),
+    BULK_LANE: int(os.getenv("M2P_BULK_LANE_WORKERS", "2")),
+    # Merges keep laid-out sections cached in the worker, so a single
+    # long-lived worker gives the best reuse across re-exports.
+    MERGE_LANE: int(os.getenv("M2P_MERGE_LANE_WORKERS", "1")),
+}
+
+
+def _timed_call(fn: Callable[..., Any], args: Tuple[Any, ...],
+                export: bool = False) -> Tuple[Any, float]:
+    """Run ``fn(*args)`` inside the worker and return its result and runtime in ms."""
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return (export_result(result) if export else result), elapsed_ms
+
+
+def _discard_unclaimed(future: Future) -> None:
+    """Release the result of a job whose caller was cancelled while it ran."""
+    if not future.cancelled() and future.exception() is None:
+        discard_result(future.result()[0])
+
+
+class RenderExecutor:
+    """Dispatch render jobs to per-lane worker pools."""
+
+    def __init__(self) -> None:
+        # Pools are created lazily so that forked server workers never inherit
+        # a pool (and its management threads) from the parent process.
+        self._pools: Dict[str, Executor] = {}
+
+    def lane_workers(self, lane: str) -> int:
+        """Return the configured number of workers for ``lane``."""
+        return max(1, _LANE_WORKERS.get(lane, 1))
+
+    def lane_capacity(self, lane: str) -> int:
+        """Return how many ``lane`` jobs may run at once.
+
+        While remote workers are up, jobs go to them, so that is their combined
+        capacity; otherwise it is the size of the lane's local pool.
+        """
+        if remote_workers.enabled:
+            remote = remote_workers.capacity()
+            if remote:
+                return remote
+        return self.lane_workers(lane)
+
+    async def run(self, cost: DocumentCost, kind: str, fn: Callable[..., Any], *args: Any,
+                  buffered: bool = False) -> Any:
+        """Run ``fn(*args)`` on the lane chosen for ``cost`` and log predicted vs actual cost.
+
+        With ``buffered``, ``fn`` must return ``bytes`` and the result is
+        returned as a ``ResultBuffer`` that the caller has to release.
+        """
+        if remote_workers.enabled:
+            try:
+                result, actual_ms = await remote_workers.run(fn, args)
+            except NoRenderWorker:
+                result, actual_ms = await self._run_local(cost.lane, fn, args, buffered)
+        else:
+            result, actual_ms = await self._run_local(cost.lane, fn, args, buffered)
+        cost_estimator.record(cost, actual_ms, kind)
+        return ResultBuffer(result) if buffered else result
+
+    async def _run_local(self, lane: str, fn: Callable[..., Any], args: Tuple[Any, ...],
+                         buffered: bool) -> Tuple[Any, float]:
+        pool = self._pool(lane)
+        export = buffered and isinstance(pool, ProcessPoolExecutor)
+        future = pool.submit(_timed_call, fn, args, export)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The worker keeps going; free whatever it hands back.
+            future.add_done_callback(_discard_unclaimed)
+            raise
+
+    def shutdown(self) -> None:
+        """Stop all worker pools, waiting for in-flight renders to finish."""
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
+        self._pools.clear()
+
+    def _pool(self, lane: str) -> Executor:
+        pool = self._pools.get(lane)
+        if pool is None:
+            workers = self.lane_workers(lane)
+            if _POOL_KIND == "thread":
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"render-{lane}")
+            else:
+                pool = ProcessPoolExecutor(max_workers=workers)
+            self._pools[lane] = pool
+        return pool
+
+
+# Singleton instance
+render_executor = RenderExecutor()
@@ -0,0 +1,162 @@
+"""Hand large render results from worker processes to the API without pickling them.
+
+A worker that produces a result of at least ``M2P_RESULT_SHM_BYTES`` copies it
+once into a ``multiprocessing.shared_memory`` segment and returns only the
+segment's name. The API process maps the same segment and streams straight
+from it, so a 50 MB PDF is neither pickled, sent through a pipe nor unpickled
+into a second 50 MB ``bytes`` object.
+
+Segments are released by :meth:`ResultBuffer.release`. As a fallback they are
+also released when the buffer is garbage collected, and segments left behind
+by a crashed server are removed by :func:`sweep_orphans` at start-up.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import secrets
+import weakref
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Any, Optional, Union, cast
+
+logger = logging.getLogger(__name__)
+
+# Smaller results are cheaper to pickle than to map; 0 sends everything via shared memory.
+_SHM_THRESHOLD = int(os.getenv("M2P_RESULT_SHM_BYTES", str(1024 * 1024)))
+# Bytes handed to the response per chunk when streaming a buffer.
+CHUNK_SIZE = 1024 * 1024
+
+_SEGMENT_PREFIX = "m2p-"
+# m2p-<API process pid>-<random>; the pid lets orphaned segments be recognised.
+_SEGMENT_RE = re.compile(r"^m2p-(\d+)-[0-9a-f]+$")
+_SHM_DIR = Path("/dev/shm")
+
+
+@dataclass(frozen=True)
+class SharedSegment:
+    """What a worker returns instead of a large result: where to find it."""
+
+    name: str
+    size: int
+
+
+def export_result(result: bytes) -> Union[bytes, SharedSegment]:
+    """Worker side: move a large result into a shared memory segment.
+
+    The segment outlives the worker's handle to it; the receiving process
+    owns it from here on and must release it.
+    """
+    if len(result) < max(1, _SHM_THRESHOLD):
+        return result
+    name = f"{_SEGMENT_PREFIX}{os.getppid()}-{secrets.token_hex(6)}"
+    segment = shared_memory.SharedMemory(name=name, create=True, size=len(result))
+    try:
+        cast(memoryview, segment.buf)[:len(result)] = result
+    except BaseException:
+        segment.close()
+        segment.unlink()
+        raise
+    # The API process unlinks it; the worker's resource tracker must not.
+    resource_tracker.unregister(getattr(segment, "_name"), "shared_memory")
+    segment.close()
+    return SharedSegment(segment.name, len(result))
+
+
+def _release_segment(segment: Optional[shared_memory.SharedMemory]) -> None:
+    if segment is None:
+        return
+    try:
+        segment.close()
+    except BufferError:
+        # A view into the segment is still alive; unlinking still frees the
+        # name, and the memory goes once the last view is gone.
+        logger.warning("shared memory segment %s released while still in use", segment.name)
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class ResultBuffer:
+    """A render result received from a worker, readable without further copies."""
+
+    def __init__(self, data: Union[bytes, SharedSegment]) -> None:
+        self._segment: Optional[shared_memory.SharedMemory] = None
+        self._data: Optional[bytes] = None
+        if isinstance(data, SharedSegment):
+            self._segment = shared_memory.SharedMemory(name=data.name)
+            self.size = data.size
+            self._finalizer = weakref.finalize(self, _release_segment, self._segment)
+        else:
+            self._data = data
+            self.size = len(data)
+            self._finalizer = weakref.finalize(self, _release_segment, None)
+
+    @property
+    def shared(self) -> bool:
+        """Whether the result lives in a shared memory segment."""
+        return self._segment is not None
+
+    @property
+    def released(self) -> bool:
+        """Whether :meth:`release` has been called."""
+        return not self._finalizer.alive
+
+    def view(self) -> memoryview:
+        """Return a read-only view of the result; release it before the buffer."""
+        if self.released:
+            raise ValueError("Result buffer has been released")
+        if self._segment is not None:
+            return cast(memoryview, self._segment.buf)[:self.size].toreadonly()
+        return memoryview(self._data or b"")
+
+    def release(self) -> None:
+        """Free the shared memory segment, if any; safe to call more than once."""
+        self._finalizer()
+        self._data = None
+
+    def __enter__(self) -> ResultBuffer:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+def discard_result(result: Any) -> None:
+    """Release a result nobody is going to read (e.g. the client went away)."""
+    if isinstance(result, SharedSegment):
+        ResultBuffer(result).release()
+
+
+def sweep_orphans(shm_dir: Path = _SHM_DIR) -> int:
+    """Remove segments whose API process is gone; return how many were removed."""
+    removed = 0
+    try:
+        entries = list(shm_dir.iterdir())
+    except OSError:
+        return 0
+    for entry in entries:
+        match = _SEGMENT_RE.match(entry.name)
+        if match is None or _pid_alive(int(match.group(1))):
+            continue
+        try:
+            entry.unlink()
+            removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info("removed %d orphaned shared memory segment(s)", removed)
+    return removed
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
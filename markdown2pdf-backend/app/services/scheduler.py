@@ -0,0 +1,353 @@
+"""In-process weighted fair scheduling of render jobs across API clients.
+
+Every render passes through :meth:`FairScheduler.slot` before it reaches the
+render executor. Each lane has its own queue ordered by start-time fair
+queueing (SFQ) tags, so a client's share of a lane is proportional to its
+weight rather than to how many requests it submits. Per-client concurrency
+caps and token-bucket rate limits are enforced here as well, and latency and
+throughput are tracked per client.
+
+Client policies are read from ``M2P_CLIENT_POLICIES`` (JSON mapping client
+name to ``weight``, ``max_concurrency``, ``rate`` and ``burst``; the
+``"default"`` entry applies to unlisted clients) and API keys are mapped to
+client names through ``M2P_API_KEYS`` (JSON mapping key to client name).
+
+Callers without a known API key can't be told apart by anything they choose
+themselves (unknown keys and ``X-Client-ID`` could be rotated for a fresh
+token bucket), so they are keyed by their network address. Set
+``M2P_TRUST_CLIENT_ID=1`` behind a gateway that sets ``X-Client-ID`` itself.
+Clients idle for ``M2P_CLIENT_IDLE_TTL`` seconds are forgotten.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from app.services.cost_service import DocumentCost
+from app.services.render_executor import render_executor
+
+ANONYMOUS_CLIENT = "anonymous"
+
+# Completions older than this are not counted in the throughput figure.
+_THROUGHPUT_WINDOW_S = 60.0
+_TRUST_CLIENT_ID = os.getenv("M2P_TRUST_CLIENT_ID", "0") == "1"
+_CLIENT_IDLE_TTL_S = float(os.getenv("M2P_CLIENT_IDLE_TTL", "600"))
+# Seconds between sweeps for idle clients.
+_SWEEP_INTERVAL_S = 1.0
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a client has exhausted its token bucket."""
+
+    def __init__(self, client_id: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for client {client_id}")
+        self.client_id = client_id
+        self.retry_after = retry_after
+
+
+@dataclass
+class ClientPolicy:
+    """Scheduling policy for a single client."""
+
+    weight: float = 1.0
+    max_concurrency: int = 4
+    rate: float = 0.0  # renders per second; 0 disables rate limiting
+    burst: int = 10
+
+    def __post_init__(self) -> None:
+        # Start tags are ``cost / weight``: a zero weight divides by zero and a
+        # negative one jumps the queue.
+        if not self.weight > 0:
+            raise ValueError(f"weight must be positive, got {self.weight!r}")
+        if self.max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {self.max_concurrency!r}")
+        if not self.rate >= 0:
+            raise ValueError(f"rate must be positive, or 0 to disable it, got {self.rate!r}")
+        if self.burst < 1:
+            raise ValueError(f"burst must be at least 1, got {self.burst!r}")
+
+
+@dataclass
+class ClientStats:  # pylint: disable=too-many-instance-attributes
+    """Latency and throughput counters for a single client."""
+
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rate_limited: int = 0
+    in_flight: int = 0
+    queued: int = 0
+    total_wait_ms: float = 0.0
+    total_latency_ms: float = 0.0
+    max_latency_ms: float = 0.0
+    recent_completions: Deque[float] = field(default_factory=deque)
+
+    def as_dict(self) -> dict:
+        """Return a JSON-friendly snapshot including derived averages."""
+        now = time.monotonic()
+        while self.recent_completions and now - self.recent_completions[0] > _THROUGHPUT_WINDOW_S:
+            self.recent_completions.popleft()
+        finished = self.completed + self.failed
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "avg_wait_ms": round(self.total_wait_ms / finished, 1) if finished else 0.0,
+            "avg_latency_ms": round(self.total_latency_ms / finished, 1) if finished else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 1),
+            "throughput_per_s": round(len(self.recent_completions) / _THROUGHPUT_WINDOW_S, 3),
+        }
+
+
+class _TokenBucket:  # pylint: disable=too-few-public-methods
+    """Classic token bucket refilled continuously at ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token; return 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+@dataclass
+class _ClientState:
+    policy: ClientPolicy
+    bucket: Optional[_TokenBucket]
+    stats: ClientStats = field(default_factory=ClientStats)
+    finish_tags: Dict[str, float] = field(default_factory=dict)
+    last_seen: float = field(default_factory=time.monotonic)
+
+    def idle_for(self, now: float) -> float:
+        """Seconds since the client was last active; 0 while it has work."""
+        if self.stats.in_flight or self.stats.queued:
+            return 0.0
+        return now - self.last_seen
+
+
+@dataclass
+class _LaneQueue:
+    name: str
+    active: int = 0
+    virtual_time: float = 0.0
+    # (start tag, sequence, client id, finish tag, waiter)
+    waiting: List[Tuple[float, int, str, float, asyncio.Future]] = field(default_factory=list)
+
+
+def _load_policies() -> Dict[str, ClientPolicy]:
+    raw = json.loads(os.getenv("M2P_CLIENT_POLICIES", "{}") or "{}")
+    policies = {}
+    for name, values in raw.items():
+        try:
+            policies[name] = ClientPolicy(**values)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Bad M2P_CLIENT_POLICIES entry for {name!r}: {e}") from None
+    return policies
+
+
+def _load_api_keys() -> Dict[str, str]:
+    return json.loads(os.getenv("M2P_API_KEYS", "{}") or "{}")
+
+
+class FairScheduler:  # pylint: disable=too-many-instance-attributes
+    """Weighted fair queueing with per-client concurrency caps and rate limits."""
+
+    def __init__(self, policies: Optional[Dict[str, ClientPolicy]] = None,  # pylint: disable=too-many-arguments
+                 api_keys: Optional[Dict[str, str]] = None,
+                 trust_client_id: bool = _TRUST_CLIENT_ID,
+                 idle_ttl: float = _CLIENT_IDLE_TTL_S) -> None:
+        self._policies = _load_policies() if policies is None else policies
+        self._api_keys = _load_api_keys() if api_keys is None else api_keys
+        self._trust_client_id = trust_client_id
+        self._idle_ttl = idle_ttl
+        self._clients: Dict[str, _ClientState] = {}
+        self._lanes: Dict[str, _LaneQueue] = {}
+        self._sequence = itertools.count()
+        self._last_sweep = time.monotonic()
+
+    def resolve_client(self, api_key: Optional[str], client_id: Optional[str],
+                       address: Optional[str] = None) -> str:
+        """Map request credentials to a client name.
+
+        Known API keys map to their configured name. Everyone else is keyed
+        by a short hash of their ``address`` (so it never appears in metrics),
+        or by ``X-Client-ID`` when that is trusted.
+        """
+        if api_key:
+            name = self._api_keys.get(api_key)
+            if name:
+                return name
+        if client_id and self._trust_client_id:
+            return client_id.strip()[:64] or ANONYMOUS_CLIENT
+        if address:
+            return f"{ANONYMOUS_CLIENT}-" + hashlib.sha256(address.encode("utf-8")).hexdigest()[:12]
+        return ANONYMOUS_CLIENT
+
+    def admit(self, client_id: str) -> None:
+        """Charge one request against the client's token bucket.
+
+        Raises :class:`RateLimitExceeded` when the bucket is empty.
+        """
+        client = self._client(client_id)
+        if client.bucket is not None:
+            retry_after = client.bucket.take()
+            if retry_after:
+                client.stats.rate_limited += 1
+                raise RateLimitExceeded(client_id, retry_after)
+
+    @asynccontextmanager
+    async def slot(self, client_id: str, cost: DocumentCost,
+                   admit: bool = True) -> AsyncIterator[None]:
+        """Wait for this client's fair turn on ``cost.lane`` and hold a worker slot.
+
+        Pass ``admit=False`` for jobs that belong to a request which was
+        already admitted as a whole (e.g. the documents of a batch).
+        """
+        if admit:
+            self.admit(client_id)
+        client = self._client(client_id)
+        stats = client.stats
+        stats.submitted += 1
+        lane = self._lane(cost.lane)
+        submitted_at = time.monotonic()
+        waiter = self._enqueue(lane, client_id, cost)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just before the client went away.
+                self._release(lane, client)
+            else:
+                # Cancelled waiters are skipped by ``_dispatch``.
+                waiter.cancel()
+                stats.queued -= 1
+            raise
+
+        started_at = time.monotonic()
+        stats.total_wait_ms += (started_at - submitted_at) * 1000
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            finished_at = time.monotonic()
+            latency_ms = (finished_at - submitted_at) * 1000
+            stats.total_latency_ms += latency_ms
+            stats.max_latency_ms = max(stats.max_latency_ms, latency_ms)
+            if ok:
+                stats.completed += 1
+                stats.recent_completions.append(finished_at)
+            else:
+                stats.failed += 1
+            self._release(lane, client)
+
+    def stats(self) -> Dict[str, dict]:
+        """Return per-client scheduling metrics."""
+        return {name: state.stats.as_dict() for name, state in sorted(self._clients.items())}
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _client(self, client_id: str) -> _ClientState:
+        now = time.monotonic()
+        state = self._clients.get(client_id)
+        if state is None:
+            if now - self._last_sweep >= _SWEEP_INTERVAL_S:
+                self._forget_idle(now)
+            policy = (self._policies.get(client_id)
+                      or self._policies.get("default")
+                      or ClientPolicy())
+            bucket = _TokenBucket(policy.rate, policy.burst) if policy.rate > 0 else None
+            state = _ClientState(policy=policy, bucket=bucket)
+            self._clients[client_id] = state
+        state.last_seen = now
+        return state
+
+    def _forget_idle(self, now: float) -> None:
+        """Drop clients idle for longer than the TTL and than their bucket takes to refill."""
+        self._last_sweep = now
+        for client_id, state in list(self._clients.items()):
+            ttl = self._idle_ttl
+            if state.bucket is not None:
+                # Forgetting a drained bucket early would hand out a full one.
+                ttl = max(ttl, state.bucket.capacity / state.bucket.rate)
+            if state.idle_for(now) > ttl:
+                del self._clients[client_id]
+
+    def _enqueue(self, lane: _LaneQueue, client_id: str, cost: DocumentCost) -> asyncio.Future:
+        client = self._clients[client_id]
+        # Start-time fair queueing: a job starts no earlier (in virtual time)
+        # than the client's previous job finished, and advances the client's
+        # clock by its cost scaled down by the client's weight.
+        start_tag = max(lane.virtual_time, client.finish_tags.get(cost.lane, 0.0))
+        finish_tag = start_tag + max(cost.predicted_ms, 1.0) / client.policy.weight
+        client.finish_tags[cost.lane] = finish_tag
+
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        entry = (start_tag, next(self._sequence), client_id, finish_tag, waiter)
+        heapq.heappush(lane.waiting, entry)
+        client.stats.queued += 1
+        self._dispatch(lane)
+        return waiter
+
+    def _lane(self, lane_name: str) -> _LaneQueue:
+        lane = self._lanes.get(lane_name)
+        if lane is None:
+            lane = _LaneQueue(lane_name)
+            self._lanes[lane_name] = lane
+        return lane
+
+    def _release(self, lane: _LaneQueue, client: _ClientState) -> None:
+        lane.active -= 1
+        client.stats.in_flight -= 1
+        # Capacity freed on this lane, and possibly a per-client cap on others.
+        for other in self._lanes.values():
+            self._dispatch(other)
+
+    def _dispatch(self, lane: _LaneQueue) -> None:
+        """Grant free slots to waiting jobs in start-tag order, honouring client caps."""
+        deferred = []
+        # Read on every dispatch: remote render workers come and go.
+        capacity = render_executor.lane_capacity(lane.name)
+        while lane.waiting and lane.active < capacity:
+            entry = heapq.heappop(lane.waiting)
+            start_tag, _, client_id, _, waiter = entry
+            if waiter.done():
+                continue
+            client = self._clients[client_id]
+            if client.stats.in_flight >= client.policy.max_concurrency:
+                deferred.append(entry)
+                continue
+            lane.active += 1
+            lane.virtual_time = max(lane.virtual_time, start_tag)
+            client.stats.in_flight += 1
+            client.stats.queued -= 1
+            waiter.set_result(None)
+        for entry in deferred:
+            heapq.heappush(lane.waiting, entry)
+
+
+# Singleton instance
+scheduler = FairScheduler()
@@ -0,0 +1,39 @@
+"""Opt-in timing of individual pipeline stages.
+
+The conversion and render code wraps each stage in :func:`stage`. Timings are
+only collected inside a :func:`record_stages` block (used by the benchmark
+suite); otherwise :func:`stage` costs a single context-variable lookup.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("m2p_stage_timings", default=None)
+
+
+@contextmanager
+def record_stages() -> Iterator[Dict[str, float]]:
+    """Collect the milliseconds spent in each stage run inside this block."""
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed code as stage ``name`` when recording is active."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - started) * 1000
@@ -0,0 +1,142 @@
+"""Stylesheets shipped in ``app/static/css``, kept in memory.
+
+``styles.css`` and every code highlighting theme are read once. Each
+stylesheet carries a content hash, so assembled CSS and rendered artifacts
+can be cached by what the stylesheets contain. The directory is checked at
+most every ``M2P_THEME_CHECK_INTERVAL`` seconds. Changed, added or removed
+files are reloaded, and listeners drop what they built from the old versions.
+
+``code-highlight.css`` is the default code theme; ``code-highlight-<name>.css``
+is selected with ``code_theme: "<name>"``.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CSS_DIR = Path(__file__).resolve().parent.parent / "static" / "css"
+# Seconds between checks of the stylesheets on disk; 0 disables hot reload.
+_CHECK_INTERVAL = float(os.getenv("M2P_THEME_CHECK_INTERVAL", "2"))
+
+STYLES_NAME = "styles"
+DEFAULT_CODE_THEME = "default"
+_CODE_THEME_PREFIX = "code-highlight"
+
+
+@dataclass(frozen=True)
+class Stylesheet:
+    """One stylesheet and the SHA-256 of its contents."""
+
+    name: str
+    css: str
+    digest: str
+
+
+def _theme_name(path: Path) -> str:
+    """Return the registry name of ``path``: ``styles``, ``default`` or the code theme."""
+    if path.stem == _CODE_THEME_PREFIX:
+        return DEFAULT_CODE_THEME
+    if path.stem.startswith(_CODE_THEME_PREFIX + "-"):
+        return path.stem[len(_CODE_THEME_PREFIX) + 1:]
+    return path.stem
+
+
+class ThemeRegistry:
+    """In-memory stylesheets, reloaded when the files change."""
+
+    def __init__(self, directory: Path = _CSS_DIR, check_interval: float = _CHECK_INTERVAL) -> None:
+        self.directory = directory
+        self.check_interval = check_interval
+        self._stylesheets: Dict[str, Stylesheet] = {}
+        # Modification time and size per file, to notice changes cheaply.
+        self._stats: Dict[Path, Tuple[int, int]] = {}
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._load()
+
+    def on_reload(self, listener: Callable[[], None]) -> None:
+        """Call ``listener`` after stylesheets changed on disk."""
+        self._listeners.append(listener)
+
+    def get(self, name: str) -> Stylesheet:
+        """Return the stylesheet called ``name``; an empty one if it does not exist."""
+        self._check()
+        return self._stylesheets.get(name) or Stylesheet(name, "", "")
+
+    def code_theme(self, name: Optional[str] = None) -> Stylesheet:
+        """Return the code highlighting theme ``name`` (the default theme if unset)."""
+        return self.get(name or DEFAULT_CODE_THEME)
+
+    def code_themes(self) -> List[str]:
+        """Return the names accepted as ``code_theme``."""
+        self._check()
+        return sorted(name for name in self._stylesheets if name != STYLES_NAME)
+
+    def fingerprint(self) -> str:
+        """Return a hash of every stylesheet, for keys of anything rendered with them."""
+        self._check()
+        stylesheets = self._stylesheets
+        digest = hashlib.sha256()
+        for name in sorted(stylesheets):
+            digest.update(f"{name}\0{stylesheets[name].digest}\0".encode("utf-8"))
+        return digest.hexdigest()
+
+    def reload(self) -> bool:
+        """Re-read the stylesheets that changed; return whether any did."""
+        with self._lock:
+            self._last_check = time.monotonic()
+            changed = self._load()
+        if changed:
+            logger.info("Stylesheets changed on disk; reloaded %s", self.directory)
+            for listener in self._listeners:
+                listener()
+        return changed
+
+    def _check(self) -> None:
+        if 0 < self.check_interval <= time.monotonic() - self._last_check:
+            self.reload()
+
+    def _load(self) -> bool:
+        """Read new and changed files and forget removed ones; return whether any changed."""
+        stats: Dict[Path, Tuple[int, int]] = {}
+        for path in sorted(self.directory.glob("*.css")):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            stats[path] = (stat.st_mtime_ns, stat.st_size)
+        if stats == self._stats:
+            return False
+
+        stylesheets = {}
+        for path, signature in list(stats.items()):
+            name = _theme_name(path)
+            previous = self._stylesheets.get(name)
+            if previous is not None and self._stats.get(path) == signature:
+                stylesheets[name] = previous
+                continue
+            try:
+                css = path.read_text(encoding="utf-8")
+            except OSError:
+                # Leave the file unrecorded so the next check reads it again.
+                del stats[path]
+                continue
+            digest = hashlib.sha256(css.encode("utf-8")).hexdigest()
+            stylesheets[name] = Stylesheet(name, css, digest)
+
+        self._stylesheets = stylesheets
+        self._stats = stats
+        return True
+
+
+# Singleton instance
+theme_registry = ThemeRegistry()
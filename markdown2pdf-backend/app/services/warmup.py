@@ -0,0 +1,202 @@
+"""Process warm-up and readiness tracking for server workers.
+
+``preload`` runs once in the prefork master (see ``app.server``) so that the
+imported modules, registered fonts, assembled stylesheets and Markdown
+extensions live in memory the forked workers share copy-on-write.
+``warm_up`` runs inside each worker and performs one small end-to-end render
+before the worker reports itself ready on ``/ready``.
+"""
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import resource
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from app.profile import preview_only
+
+logger = logging.getLogger(__name__)
+
+# Set to 0 to report ready immediately instead of after a warm-up render.
+WARMUP_ENABLED = os.getenv("M2P_WARMUP", "1") != "0"
+
+# Fonts whose stylesheets are assembled ahead of time (comma separated).
+_PRELOAD_FONTS = [
+    name.strip() for name in os.getenv("M2P_PRELOAD_FONTS", "Inter").split(",") if name.strip()
+]
+
+# Small document touching every stage of the pipeline: headings and the
+# index, tables, nested lists and highlighted code in common languages.
+_WARMUP_MARKDOWN = """# Warm-up
+
+## Table
+
+| Name | Value |
+| ---- | ----- |
+| a    | 1     |
+
+## Lists
+
+- one
+    - nested
+1. first
+
+## Code
+
+```python
+def answer():
+    return 42
+```
+
+```javascript
+const answer = () => 42;
+```
+
+```bash
+echo "$ANSWER"
+```
+
+```json
+{"answer": 42}
+```
+"""
+
+
+def rss_kb() -> int:
+    """Return the resident set size of the current process in KiB."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        # Not Linux: fall back to the peak RSS (KiB on Linux, bytes on macOS).
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _child_usage() -> Tuple[float, int]:
+    """Return CPU seconds and RSS (KiB) of the live child processes (Linux only)."""
+    parent = str(os.getpid())
+    cpu_ticks = rss_pages = 0
+    try:
+        proc_entries = os.listdir("/proc")
+    except OSError:
+        return 0.0, 0
+    for entry in proc_entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii", errors="replace") as stat:
+                # Fields after the parenthesised command name: state, ppid, ...
+                fields = stat.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if fields[1] == parent:
+            cpu_ticks += int(fields[11]) + int(fields[12])
+            rss_pages += int(fields[21])
+    return (cpu_ticks / os.sysconf("SC_CLK_TCK"),
+            rss_pages * os.sysconf("SC_PAGE_SIZE") // 1024)
+
+
+def cpu_seconds() -> float:
+    """Return the CPU time used by this process and its render processes."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    exited = resource.getrusage(resource.RUSAGE_CHILDREN)
+    live, _ = _child_usage()
+    return own.ru_utime + own.ru_stime + exited.ru_utime + exited.ru_stime + live
+
+
+@dataclass
+class WorkerStatus:
+    """Readiness and start-up timings of the current worker process."""
+
+    pid: int = field(default_factory=os.getpid)
+    started_at: float = field(default_factory=time.monotonic)
+    ready: bool = False
+    warmup_ms: Optional[float] = None
+    first_request_ms: Optional[float] = None
+    requests: int = 0
+
+    def start(self) -> None:
+        """Reset the status for a freshly started (possibly forked) worker."""
+        self.pid = os.getpid()
+        self.started_at = time.monotonic()
+        self.ready = False
+        self.warmup_ms = None
+        self.first_request_ms = None
+        self.requests = 0
+
+    def record_request(self, latency_ms: float) -> None:
+        """Count a served request and log the latency of the first one."""
+        self.requests += 1
+        if self.first_request_ms is None:
+            self.first_request_ms = latency_ms
+            logger.info("worker %d first request in %.0f ms (ready=%s, rss=%d KiB)",
+                        self.pid, latency_ms, self.ready, rss_kb())
+
+    def as_dict(self) -> dict:
+        """Return a JSON-friendly snapshot of the status."""
+        return {
+            "pid": self.pid,
+            "ready": self.ready,
+            "uptime_s": round(time.monotonic() - self.started_at, 1),
+            "warmup_ms": None if self.warmup_ms is None else round(self.warmup_ms, 1),
+            "first_request_ms": (None if self.first_request_ms is None
+                                 else round(self.first_request_ms, 1)),
+            "requests": self.requests,
+            "rss_kb": rss_kb(),
+            "children_rss_kb": _child_usage()[1],
+            "cpu_s": round(cpu_seconds(), 3),
+        }
+
+
+def preload() -> None:
+    """Load everything a render needs so forked workers inherit it ready to use."""
+    # pylint: disable=import-outside-toplevel,unused-import
+    started = time.perf_counter()
+    if not preview_only():
+        import weasyprint  # type: ignore[import-untyped]  # noqa: F401
+
+    from app.services.font_service import font_service
+    from app.services.markdown_service import markdown_service
+    from app.services.pdf_service import pdf_service
+
+    font_service.register_fonts()
+    stylesheets = pdf_service.preload_stylesheets(_PRELOAD_FONTS)
+    # Instantiates the Markdown extensions and the Pygments lexers used above.
+    markdown_service.convert_body(_WARMUP_MARKDOWN, add_heading_ids=True)
+
+    # Move everything allocated so far out of the collector's reach; otherwise
+    # the first collection in each worker touches (and copies) every page.
+    gc.collect()
+    gc.freeze()
+    logger.info("preloaded %d stylesheets in %.0f ms (rss=%d KiB)",
+                stylesheets, (time.perf_counter() - started) * 1000, rss_kb())
+
+
+def warm_up() -> None:
+    """Render a small document end to end and mark the worker ready."""
+    # pylint: disable=import-outside-toplevel
+    from app.models import PDFGenerationRequest
+    from app.services.pdf_service import pdf_service
+
+    started = time.perf_counter()
+    request = PDFGenerationRequest(markdown=_WARMUP_MARKDOWN, include_index=True)
+    try:
+        if preview_only():
+            pdf_service.generate_pdf_preview(request)
+        else:
+            pdf_service.generate_pdf(request)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        # A failed warm-up must not keep the worker out of rotation forever.
+        logger.warning("worker %d warm-up render failed: %s", os.getpid(), e)
+    worker_status.warmup_ms = (time.perf_counter() - started) * 1000
+    worker_status.ready = True
+    logger.info("worker %d ready after %.0f ms warm-up (rss=%d KiB)",
+                worker_status.pid, worker_status.warmup_ms, rss_kb())
+
+
+# Singleton instance
+worker_status = WorkerStatus()
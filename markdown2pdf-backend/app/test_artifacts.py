@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+Test script to verify spooled PDF artifacts and their range-capable downloads.
+"""
+import asyncio
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+import app.api.pdf as pdf_api
+from app.main import app
+from app.services import artifact_store
+from app.services.artifact_service import ArtifactStore
+
+_PDF = b"%PDF-1.7\n" + bytes(range(256)) * 40 + b"\n%%EOF\n"
+
+
+def test_concurrent_requests_share_one_render(tmp_path):
+    """Identical in-flight requests wait for the same render."""
+    store = ArtifactStore(tmp_path, ttl=60)
+    calls = []
+
+    async def render(path):
+        calls.append(path)
+        await asyncio.sleep(0.05)
+        with open(path, "wb") as target:
+            target.write(_PDF)
+
+    async def main():
+        key = store.key_for("pdf", "{}")
+        return await asyncio.gather(*(store.get_or_create(key, render) for _ in range(5)))
+
+    artifacts = asyncio.run(main())
+    assert len(calls) == 1
+    assert {artifact.path for artifact in artifacts} == {tmp_path / f"{artifacts[0].key}.pdf"}
+    assert artifacts[0].size == len(_PDF)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def _age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_expired_artifacts_are_not_served(tmp_path):
+    """Artifacts past the TTL are not served and are deleted shortly after."""
+    store = ArtifactStore(tmp_path, ttl=60)
+    key = store.key_for("pdf", "{}")
+    path = tmp_path / f"{key}.pdf"
+    path.write_bytes(_PDF)
+    tmp_file = tmp_path / f"{key}.pdf.0123.tmp"
+    tmp_file.write_bytes(_PDF)
+    assert store.get(key) is not None
+    assert store.get("../etc/passwd") is None
+
+    _age(path, 65)
+    assert store.get(key) is None
+    assert store.purge(force=True) == 0  # a response may be about to open it
+    _age(path, 120)
+    _age(tmp_file, 120)
+    assert store.purge(force=True) == 1
+    assert not path.exists() and tmp_file.exists()  # a render may still be writing it
+    _age(tmp_file, 3600)
+    assert store.purge(force=True) == 1
+
+
+def test_budget_evicts_least_recently_served(tmp_path):
+    """Past the byte budget the PDFs served least recently are deleted first."""
+    store = ArtifactStore(tmp_path, ttl=3600, max_bytes=int(len(_PDF) * 2.5))
+
+    async def render(path):
+        with open(path, "wb") as target:
+            target.write(_PDF)
+
+    async def create(name):
+        return await store.get_or_create(store.key_for("pdf", name), render)
+
+    first, second = asyncio.run(create("first")), asyncio.run(create("second"))
+    _age(first.path, 600)
+    _age(second.path, 600)
+    assert store.get(first.key) is not None  # served again
+    last = asyncio.run(create("third"))
+    assert [artifact.path.exists() for artifact in (first, second, last)] == [True, False, True]
+
+
+def test_zero_ttl_deletes_after_the_response(tmp_path, monkeypatch):
+    """Without retention the PDF is deleted as soon as every response using it is sent."""
+    store = ArtifactStore(tmp_path, ttl=0)
+    calls = []
+
+    async def render(path):
+        calls.append(path)
+        await asyncio.sleep(0.05)
+        with open(path, "wb") as target:
+            target.write(_PDF)
+
+    async def main():
+        key = store.key_for("pdf", "{}")
+        return await asyncio.gather(*(store.get_or_create(key, render) for _ in range(3)))
+
+    artifacts = asyncio.run(main())
+    assert len(calls) == 1
+    for artifact in artifacts[:2]:
+        store.release(artifact)
+        assert artifact.path.exists()
+    store.release(artifacts[2])
+    assert not artifacts[2].path.exists()
+
+    async def fake_schedule_render(_client_id, _cost, _kind, _fn, _request, path):
+        with open(path, "wb") as target:
+            target.write(_PDF)
+        return len(_PDF)
+
+    monkeypatch.setattr(pdf_api, "schedule_render", fake_schedule_render)
+    monkeypatch.setattr(pdf_api, "artifact_store", store)
+    response = TestClient(app).post("/generate-pdf", json={"markdown": "# Title"})
+    assert response.content == _PDF
+    assert not list(tmp_path.iterdir())
+
+
+def test_generate_pdf_serves_ranges_from_the_artifact(tmp_path, monkeypatch):
+    """The endpoint sends Content-Length, supports ranges and HEAD, and renders once."""
+    calls = []
+
+    async def fake_schedule_render(_client_id, _cost, _kind, _fn, _request, path):
+        calls.append(path)
+        with open(path, "wb") as target:
+            target.write(_PDF)
+        return len(_PDF)
+
+    monkeypatch.setattr(pdf_api, "schedule_render", fake_schedule_render)
+    monkeypatch.setattr(artifact_store, "directory", tmp_path)
+    client = TestClient(app)
+    payload = {"markdown": "# Title", "filename": "report"}
+
+    response = client.post("/generate-pdf", json=payload)
+    assert response.status_code == 200
+    assert response.content == _PDF
+    assert response.headers["content-length"] == str(len(_PDF))
+    assert response.headers["content-disposition"] == "attachment; filename=report.pdf"
+    location = response.headers["content-location"]
+
+    retry = client.post("/generate-pdf", json={**payload, "filename": "other"},
+                        headers={"Range": "bytes=100-199"})
+    assert retry.status_code == 206
+    assert retry.content == _PDF[100:200]
+    assert retry.headers["content-range"] == f"bytes 100-199/{len(_PDF)}"
+    assert len(calls) == 1
+
+    head = client.head(location)
+    assert head.status_code == 200
+    assert head.headers["content-length"] == str(len(_PDF))
+    assert client.get(location, headers={"Range": "bytes=-7"}).content == b"\n%%EOF\n"
+    assert client.get("/artifacts/" + "0" * 64).status_code == 404
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    import pytest
+
+    for test in (test_concurrent_requests_share_one_render,
+                 test_expired_artifacts_are_not_served,
+                 test_budget_evicts_least_recently_served):
+        with tempfile.TemporaryDirectory() as directory:
+            test(Path(directory))
+    with tempfile.TemporaryDirectory() as directory, pytest.MonkeyPatch.context() as patch:
+        test_zero_ttl_deletes_after_the_response(Path(directory), patch)
+    with tempfile.TemporaryDirectory() as third, pytest.MonkeyPatch.context() as patch:
+        test_generate_pdf_serves_ranges_from_the_artifact(Path(third), patch)
+    print("All artifact tests passed!")
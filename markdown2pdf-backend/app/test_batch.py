@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Test script to verify the streamed ZIP writer and the batch endpoint's archives.
+"""
+import io
+import json
+import sys
+import zipfile
+
+from fastapi.testclient import TestClient
+
+import app.api.batch as batch_api
+from app.main import app
+from app.services import markdown_service
+from app.services.result_transport import ResultBuffer
+from app.services.zip_stream import ZipStreamWriter
+
+# ``app.services`` re-exports the singleton under the module's name.
+markdown_module = sys.modules["app.services.markdown_service"]
+
+# ZIP general purpose flag: sizes and CRC follow the member in a data descriptor.
+_DATA_DESCRIPTOR = 0x08
+
+
+def _fake_pdf(source):
+    """Stand in for a WeasyPrint render, naming the markdown or body it came from."""
+    text = getattr(source, "markdown", source)
+    if "boom" in text:
+        raise ValueError("renderer exploded")
+    return b"%PDF-fake " + text.encode("utf-8")
+
+
+def _fake_schedule_render(jobs):
+    """Run jobs inline; PDF jobs are recorded but not laid out, so no WeasyPrint is needed."""
+    async def schedule_render(_client_id, _cost, kind, fn, *args, admit=True, buffered=False):
+        jobs.append((kind, fn.__name__, admit))
+        result = _fake_pdf(args[0]) if kind == "pdf" else fn(*args)
+        return ResultBuffer(result) if buffered else result
+    return schedule_render
+
+
+def test_zip_stream_writer_output_opens_with_zipfile():
+    """Members written chunk by chunk form a valid archive with data descriptors."""
+    writer = ZipStreamWriter()
+    chunks = [writer.add("notes.txt", b"hello " * 100, comment="status=ok", compress=True)]
+    payload = bytes(range(256)) * 5000
+    chunks += writer.add_stream(writer.unique_name("doc.pdf"), memoryview(payload),
+                                comment="status=ok", chunk_size=4096)
+    duplicate = writer.unique_name("doc.pdf")
+    chunks += writer.add_stream(duplicate, memoryview(b"%PDF-second"))
+    chunks.append(writer.close())
+    assert len(chunks) > 300  # flushed as it went, not at the end
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["notes.txt", "doc.pdf", "doc-2.pdf"]
+        assert duplicate == "doc-2.pdf"
+        assert archive.read("doc.pdf") == payload
+        assert archive.read("notes.txt") == b"hello " * 100
+        infos = {info.filename: info for info in archive.infolist()}
+        assert all(info.flag_bits & _DATA_DESCRIPTOR for info in infos.values())
+        assert infos["notes.txt"].compress_type == zipfile.ZIP_DEFLATED
+        assert infos["doc.pdf"].compress_type == zipfile.ZIP_STORED
+        assert infos["doc.pdf"].comment == b"status=ok"
+
+
+def test_batch_archive_with_error_entries(monkeypatch):
+    """Failed documents become error entries; the rest of the batch still renders."""
+    jobs: list = []
+    monkeypatch.setattr(batch_api, "schedule_render", _fake_schedule_render(jobs))
+    payload = {
+        "filename": "reports",
+        "documents": [
+            {"markdown": "# One", "filename": "one"},
+            {"markdown": "# boom", "filename": "two"},
+            {"markdown": "# Three", "filename": "one"},
+        ],
+    }
+    response = TestClient(app).post("/generate-pdf-batch", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    assert "reports.zip" in response.headers["content-disposition"]
+    # The request is admitted once; its documents are not charged again.
+    assert [admit for _, _, admit in jobs] == [False] * 3
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+        assert sorted(names) == ["manifest.json", "one-2.pdf", "one.pdf", "two.error.txt"]
+        assert names[-1] == "manifest.json"
+        assert archive.read("one.pdf") == b"%PDF-fake # One"
+        assert archive.read("one-2.pdf") == b"%PDF-fake # Three"
+        assert b"renderer exploded" in archive.read("two.error.txt")
+        assert archive.getinfo("two.error.txt").comment == b"status=error"
+        manifest = json.loads(archive.read("manifest.json"))
+    assert (manifest["documents"], manifest["succeeded"], manifest["failed"]) == (3, 2, 1)
+    assert [entry["status"] for entry in manifest["entries"]] == ["ok", "error", "ok"]
+    assert manifest["entries"][1]["error"] == "renderer exploded"
+
+
+def test_variants_parse_once_and_render_each_style(monkeypatch):
+    """The markdown is parsed once; every variant is laid out from that one body."""
+    jobs: list = []
+    parsed: list = []
+    scan_markdown = markdown_module.scan_markdown
+    monkeypatch.setattr(batch_api, "schedule_render", _fake_schedule_render(jobs))
+    monkeypatch.setattr(markdown_module, "scan_markdown",
+                        lambda text: parsed.append(text) or scan_markdown(text))
+    markdown_service.clear_cache()
+    payload = {
+        "markdown": "# Variants\n\nOne body, three looks.",
+        "filename": "report",
+        "variants": [{"name": "light"}, {"name": "dense", "spacing": "compact"},
+                     {"font_family": "Helvetica"}],
+    }
+    response = TestClient(app).post("/generate-pdf-variants", json=payload)
+    assert response.status_code == 200
+    assert "report-variants.zip" in response.headers["content-disposition"]
+    assert len(parsed) == 1
+    assert [(kind, name) for kind, name, _ in jobs] == (
+        [("body", "render_body")] + [("pdf", "generate_pdf_from_body")] * 3)
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+        # Variants are written as they finish; the manifest comes last.
+        assert sorted(names[:-1]) == ["report-3.pdf", "report-dense.pdf", "report-light.pdf"]
+        assert names[-1] == "manifest.json"
+        # Every variant is laid out from the one converted body.
+        assert all(archive.read(name).startswith(b"%PDF-fake <h1") for name in names[:-1])
+        manifest = json.loads(archive.read("manifest.json"))
+    assert (manifest["documents"], manifest["succeeded"], manifest["failed"]) == (3, 3, 0)
+
+
+if __name__ == "__main__":
+    import pytest
+
+    test_zip_stream_writer_output_opens_with_zipfile()
+    with pytest.MonkeyPatch.context() as patch:
+        test_batch_archive_with_error_entries(patch)
+    with pytest.MonkeyPatch.context() as patch:
+        test_variants_parse_once_and_render_each_style(patch)
+    print("All batch archive tests passed!")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Test script to verify the benchmark corpus and regression gate.
+"""
+import copy
+
+from app.benchmarks.compare import compare_reports
+from app.benchmarks.corpus import GENERATORS, build_corpus
+
+
+def test_corpus_is_deterministic():
+    """The same seed and scale always produce the same documents."""
+    first = build_corpus(scale=1)
+    assert first == build_corpus(scale=1)
+    assert set(first) == set(GENERATORS)
+    assert build_corpus(scale=2)["long_prose"] != first["long_prose"]
+
+
+def test_compare_flags_only_real_regressions():
+    """Slowdowns beyond the threshold fail; noise below the floor does not."""
+    baseline = {
+        "documents": {
+            "doc": {
+                "html": {"end_to_end_ms": 100.0, "stages_ms": {"markdown": 80.0, "index": 0.2}},
+                "peak_memory_kb": 4096,
+            }
+        },
+        "throughput": {"html": {"docs_per_s": 10.0, "mb_per_s": 1.0}},
+    }
+    current = copy.deepcopy(baseline)
+    current["documents"]["doc"]["html"]["stages_ms"]["index"] = 0.6  # +200%, but < 1 ms
+    assert not compare_reports(baseline, current)
+
+    current["documents"]["doc"]["html"]["stages_ms"]["markdown"] = 120.0
+    current["throughput"]["html"]["docs_per_s"] = 7.0
+    regressions = {r.metric for r in compare_reports(baseline, current, threshold=0.15)}
+    assert regressions == {"doc.html.markdown_ms", "throughput.html.docs_per_s"}
+
+
+if __name__ == "__main__":
+    test_corpus_is_deterministic()
+    test_compare_flags_only_real_regressions()
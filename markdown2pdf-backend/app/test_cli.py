@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Test script to verify the incremental command-line converter.
+"""
+import io
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr
+from pathlib import Path
+from types import SimpleNamespace
+
+from PIL import Image
+
+from app import cli
+from app.services import image_service
+
+# ``app.services`` re-exports the singleton under the module's name.
+pdf_module = sys.modules["app.services.pdf_service"]
+
+
+def _fake_render(source, output, options):  # pylint: disable=unused-argument
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_bytes(b"%PDF-fake")
+    return 9, 1.0
+
+
+def test_unchanged_files_are_skipped(tmp_path, monkeypatch):
+    """Only files whose text or referenced images changed are re-rendered."""
+    monkeypatch.setattr(cli, "_render_file", _fake_render)
+    docs = tmp_path / "docs"
+    (docs / "guide").mkdir(parents=True)
+    (docs / "index.md").write_text("# Home\n", encoding="utf-8")
+    (docs / "guide" / "intro.md").write_text("# Intro\n\n![diagram](diagram.png)\n",
+                                             encoding="utf-8")
+    (docs / "guide" / "diagram.png").write_bytes(b"v1")
+    output = tmp_path / "out"
+
+    def run():
+        converter = cli.TreeConverter(docs, output, {"size_level": 3})
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            return converter.run_once(pool)
+
+    first = run()
+    assert (first.converted, first.skipped) == (2, 0)
+    assert (output / "guide" / "intro.pdf").exists()
+
+    second = run()
+    assert (second.converted, second.skipped) == (0, 2)
+
+    (docs / "guide" / "diagram.png").write_bytes(b"v2")
+    third = run()
+    assert (third.converted, third.skipped) == (1, 1)
+
+
+def test_files_removed_before_scanning_are_skipped(tmp_path):
+    """A file that vanishes between discovery and scanning is skipped for that pass only."""
+    (tmp_path / "kept.md").write_text("# Kept\n", encoding="utf-8")
+    (tmp_path / "saved.md").write_text("# Saved\n", encoding="utf-8")
+    converter = cli.TreeConverter(tmp_path, tmp_path / "out", {})
+    paths = converter.discover()
+    (tmp_path / "saved.md").unlink()  # an editor saving by delete-and-rename
+
+    errors = io.StringIO()
+    with redirect_stderr(errors):
+        assert [source.relative for source in converter.scan(paths)] == ["kept.md"]
+    assert "SKIPPED saved.md" in errors.getvalue()
+    (tmp_path / "saved.md").write_text("# Saved again\n", encoding="utf-8")
+    assert [source.relative for source in converter.scan(converter.discover())] == [
+        "kept.md", "saved.md"]
+
+
+def _capture_layout(rendered):
+    def html(string, base_url):
+        rendered.append((string, base_url))
+        return SimpleNamespace(render=lambda: SimpleNamespace(
+            write_pdf=lambda _target=None, **_options: b"%PDF-fake"))
+    return lambda: html
+
+
+def test_images_resolve_next_to_their_source(tmp_path, monkeypatch):
+    """Relative images load from the markdown file's directory, not the working directory."""
+    guide = tmp_path / "docs" / "guide"
+    (guide / "img").mkdir(parents=True)
+    Image.new("RGB", (40, 30), (200, 80, 40)).save(guide / "img" / "diagram.png")
+    (guide / "intro.md").write_text("# Intro\n\n![diagram](img/diagram.png)\n", encoding="utf-8")
+    rendered: list = []
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(image_service, "cache_dir", tmp_path / "cache")
+    monkeypatch.setattr(pdf_module, "_weasyprint_html", _capture_layout(rendered))
+
+    output = tmp_path / "out" / "intro.pdf"
+    cli._render_file(str(guide / "intro.md"), str(output), {})  # pylint: disable=protected-access
+    assert output.read_bytes() == b"%PDF-fake"
+    html, base_url = rendered[0]
+    assert base_url == str(guide.resolve())
+    src = re.search(r'<img[^>]* src="([^"]+)"', html).group(1)
+    assert src.startswith("file://") and "diagram" not in src  # processed and cached
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    import pytest
+
+    with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+        test_unchanged_files_are_skipped(Path(tmp), mp)
+    with tempfile.TemporaryDirectory() as tmp:
+        test_files_removed_before_scanning_are_skipped(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+        test_images_resolve_next_to_their_source(Path(tmp), mp)
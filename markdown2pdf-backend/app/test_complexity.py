@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""
+Test script to verify the Markdown post-processing stages scale linearly.
+"""
+from app.benchmarks.complexity import CASES, KB, fit_exponent, geometric_sizes, measure_growth
+from app.services.markdown_service import ensure_nested_lists
+
+
+def test_fit_exponent():
+    """The fitted exponent recovers the power of an exact growth curve."""
+    sizes = [1000, 2000, 4000, 8000]
+    assert abs(fit_exponent(sizes, [s * 1e-6 for s in sizes]) - 1.0) < 1e-9
+    assert abs(fit_exponent(sizes, [s * s * 1e-9 for s in sizes]) - 2.0) < 1e-9
+
+
+def test_stages_scale_linearly():
+    """Every stage, including the adversarial inputs, stays roughly linear up to 512 KB."""
+    sizes = geometric_sizes(4 * KB, 512 * KB, 4)
+    flagged = [str(result) for result in (measure_growth(case, sizes) for case in CASES)
+               if not result.linear]
+    assert not flagged, "\n".join(flagged)
+
+
+def test_unclosed_tags_are_left_alone():
+    """List items without nested lists pass through unchanged."""
+    html = "<h2>Open heading\n<ul>\n<li>item</li>\n</ul>\n"
+    assert ensure_nested_lists(html) == html
+
+
+if __name__ == "__main__":
+    test_fit_exponent()
+    test_stages_scale_linearly()
+    test_unclosed_tags_are_left_alone()
+    print("All complexity tests passed!")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Test script to verify render cost estimation, lane routing and cost logging.
+"""
+import asyncio
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+
+from app.services.cost_service import (
+    BULK_LANE, FAST_LANE, MERGE_LANE, CostEstimator, DocumentCost,
+)
+from app.services.render_executor import RenderExecutor
+
+# ``app.services`` re-exports the singleton under the module's name.
+render_executor_module = sys.modules["app.services.render_executor"]
+
+_SMALL = "# Title\n\nA short paragraph.\n"
+_LARGE = "\n".join(f"| a{i} | b{i} | c{i} |\n|---|---|---|\n| 1 | 2 | 3 |\n" for i in range(800))
+
+
+def _thread_name():
+    return threading.current_thread().name
+
+
+@contextmanager
+def _cost_log():
+    """Collect the messages the cost estimator logs."""
+    messages: list[str] = []
+    handler = logging.Handler()
+    handler.emit = lambda record: messages.append(record.getMessage())  # type: ignore[method-assign]
+    logger = logging.getLogger("app.services.cost_service")
+    level = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        yield messages
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+
+
+def test_lane_selection():
+    """Cheap documents take the fast lane, expensive ones the bulk lane; previews cost less."""
+    estimator = CostEstimator()
+    small = estimator.estimate(_SMALL)
+    assert (small.lane, small.blocks, small.headings) == (FAST_LANE, 2, 1)
+    large = estimator.estimate(_LARGE)
+    assert large.lane == BULK_LANE
+    assert large.table_cells == 800 * 6
+    preview = estimator.estimate(_LARGE, for_preview=True)
+    assert preview.predicted_ms < large.predicted_ms
+    assert preview.lane == FAST_LANE
+
+    combined = estimator.estimate_many([_SMALL, _SMALL], MERGE_LANE)
+    assert combined.lane == MERGE_LANE
+    assert combined.blocks == 2 * small.blocks
+    assert combined.predicted_ms == 2 * small.predicted_ms
+
+
+def test_record_logs_calibration_ratio():
+    """Predicted and actual times are logged with their ratio for recalibrating the weights."""
+    cost = DocumentCost(blocks=3, predicted_ms=200.0, lane=BULK_LANE)
+    with _cost_log() as messages:
+        CostEstimator().record(cost, 300.0, "pdf")
+        CostEstimator().record(DocumentCost(), 5.0, "preview")
+    assert len(messages) == 2
+    first, second = messages[0], messages[1]
+    assert "kind=pdf lane=bulk predicted_ms=200.0 actual_ms=300.0 ratio=1.50" in first
+    assert "blocks=3" in first
+    assert "ratio=0.00" in second
+
+
+def test_executor_runs_each_lane_in_its_own_pool(monkeypatch):
+    """Jobs run in the pool of their cost's lane and their runtime is recorded."""
+    monkeypatch.setattr(render_executor_module, "_POOL_KIND", "thread")
+    estimator = CostEstimator()
+    executor = RenderExecutor()
+    try:
+        with _cost_log() as messages:
+            fast = asyncio.run(executor.run(estimator.estimate(_SMALL), "pdf", _thread_name))
+            bulk = asyncio.run(executor.run(estimator.estimate(_LARGE), "pdf", _thread_name))
+    finally:
+        executor.shutdown()
+    assert fast.startswith("render-fast")
+    assert bulk.startswith("render-bulk")
+    assert [message.split()[3] for message in messages] == ["lane=fast", "lane=bulk"]
+
+
+if __name__ == "__main__":
+    import pytest
+
+    test_lane_selection()
+    test_record_logs_calibration_ratio()
+    with pytest.MonkeyPatch.context() as patch:
+        test_executor_runs_each_lane_in_its_own_pool(patch)
+    print("All cost estimator and lane tests passed!")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Test script to verify that PDFs load only the fallback fonts for the scripts their documents use.
+"""
+import sys
+
+import pytest
+
+from app.models import PDFGenerationRequest, PDFMergeRequest
+from app.services import pdf_service
+from app.services.fallback_fonts import FallbackFontRegistry, detect_scripts
+
+# ``app.services`` re-exports the singleton under the module's name.
+pdf_module = sys.modules["app.services.pdf_service"]
+
+
+def test_detect_scripts():
+    """Scripts are found per character; Latin, including accents, needs no fallback."""
+    assert detect_scripts("# Plain *ASCII*") == frozenset()
+    assert detect_scripts("Crème brûlée – naïve") == frozenset()
+    assert detect_scripts("Привет مرحبا") == {"cyrillic", "arabic"}
+    assert detect_scripts("日本語 ひらがな 한국어 \U0001F600") == {"cjk", "hangul", "emoji"}
+
+
+def test_registry_uses_fonts_on_disk(tmp_path):
+    """Only fonts whose files exist are used, one per script."""
+    registry = FallbackFontRegistry(tmp_path)
+    assert not registry.for_scripts({"arabic"})
+    (tmp_path / "NotoSansArabic-Regular.ttf").write_bytes(b"")
+    (tmp_path / "NotoSansCJKsc-Regular.otf").write_bytes(b"")
+    registry = FallbackFontRegistry(tmp_path)
+    fonts = registry.for_scripts({"arabic", "cjk", "hangul", "thai"})
+    assert [font.family for font in fonts] == ["Noto Sans Arabic", "Noto Sans CJK SC"]
+    assert registry.font_stack("Roboto, 'DejaVu Sans', sans-serif", fonts) == (
+        "Roboto, 'Noto Sans Arabic', 'Noto Sans CJK SC', 'DejaVu Sans', sans-serif")
+    css = registry.font_face_css(fonts[:1])
+    assert "unicode-range: U+0600-06FF, U+0750-077F" in css
+    assert (tmp_path / "NotoSansArabic-Regular.ttf").as_uri() in css
+
+
+def test_pdf_stylesheet_adds_needed_fallbacks(tmp_path, monkeypatch):
+    """A PDF's stylesheet names the fallbacks for its scripts; Latin and previews get none."""
+    (tmp_path / "NotoSansArabic-Regular.ttf").write_bytes(b"")
+    monkeypatch.setattr(pdf_module, "fallback_fonts", FallbackFontRegistry(tmp_path))
+    try:
+        html_class = pdf_module._weasyprint_html()  # pylint: disable=protected-access
+    except (ImportError, OSError) as e:  # OSError: WeasyPrint's native libraries are missing
+        pytest.skip(f"WeasyPrint is unavailable: {e}")
+    rendered = []
+
+    def capture(**kwargs):
+        rendered.append(kwargs["string"])
+        return html_class(**kwargs)
+
+    monkeypatch.setattr(pdf_module, "_weasyprint_html", lambda: capture)
+    arabic = "# مرحبا\n\nHello `code`."
+    for markdown in (arabic, "# Hello\n\nWorld."):
+        pdf_service.generate_pdf(PDFGenerationRequest(markdown=markdown, font_family="Roboto"))
+    pdf_service.generate_merged_pdf(PDFMergeRequest(sections=[{"markdown": "# One"},
+                                                              {"markdown": arabic}]))
+    assert "font-family: Roboto, 'Noto Sans Arabic', 'DejaVu Sans', sans-serif;" in rendered[0]
+    assert "'Noto Sans Arabic', 'DejaVu Sans Mono', monospace;" in rendered[0]
+    assert "Noto Sans" not in rendered[1]
+    assert all("@font-face { font-family: 'Noto Sans Arabic'" in html for html in rendered[2:])
+    preview = pdf_service.generate_pdf_preview(PDFGenerationRequest(markdown=arabic))
+    assert "Noto Sans" not in preview
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_detect_scripts()
+    with tempfile.TemporaryDirectory() as directory:
+        test_registry_uses_fonts_on_disk(Path(directory))
+    with pytest.MonkeyPatch.context() as patch, tempfile.TemporaryDirectory() as directory:
+        test_pdf_stylesheet_adds_needed_fallbacks(Path(directory), patch)
+    print("All fallback font tests passed!")
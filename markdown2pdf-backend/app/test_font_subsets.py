@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Test script to verify that previews load per-document WOFF2 font subsets.
+"""
+import io
+import re
+import sys
+
+from fastapi.testclient import TestClient
+from fontTools.ttLib import TTFont  # type: ignore[import-untyped]
+
+import app.api.fonts as fonts_api
+from app.main import app
+from app.models import PDFGenerationRequest
+from app.services import font_subsetter, pdf_service
+from app.services.font_subset_service import (
+    BASE_CODEPOINTS, decode_ranges, document_codepoints, encode_ranges,
+)
+
+# ``app.services`` re-exports the singleton under the module's name.
+font_subset_module = sys.modules["app.services.font_subset_service"]
+
+_BASE = "http://testserver/font-subsets"
+_URL_RE = re.compile(
+    r"url\('http://testserver(/font-subsets/Roboto-Regular\.ttf\?[^']+)'\) format\('woff2'\)")
+
+
+def _fake_schedule_render(jobs):
+    async def schedule_render(_client_id, _cost, kind, fn, *args):
+        jobs.append(kind)
+        return fn(*args)
+    return schedule_render
+
+
+def _subset_url(version, codepoints):
+    return f"/font-subsets/Roboto-Regular.ttf?v={version}&u={encode_ranges(codepoints)}"
+
+
+def test_codepoints_and_ranges():
+    """Documents add their characters and entities to the base set; ranges round-trip."""
+    codepoints = document_codepoints("Grüße &rarr; &#x3a9; 日")
+    assert codepoints - BASE_CODEPOINTS == {0x2192, 0x3A9, 0x65E5}
+    assert encode_ranges([0x61, 0x20, 0x62, 0x63, 0x2013]) == "20,61-63,2013"
+    assert decode_ranges(encode_ranges(codepoints)) == codepoints
+    for bad in ("", "zz", "7e-20", "0-10ffff"):
+        try:
+            decode_ranges(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"{bad!r} was accepted")
+
+
+def test_preview_links_cached_subsets(tmp_path, monkeypatch):
+    """The preview links one subset per face, served as immutable WOFF2 with its glyphs."""
+    jobs: list[str] = []
+    monkeypatch.setattr(font_subsetter, "cache_dir", tmp_path)
+    monkeypatch.setattr(fonts_api, "schedule_render", _fake_schedule_render(jobs))
+    request = PDFGenerationRequest(markdown="# Grüße\n\nΩ and →", font_family="Roboto")
+    html = pdf_service.generate_pdf_preview(request, _BASE)
+    assert html.count("/font-subsets/Roboto-") == 4
+    assert "/fonts/Roboto-" not in html
+    assert "/fonts/Roboto-" in pdf_service.generate_pdf_preview(request)
+
+    match = _URL_RE.search(html)
+    assert match is not None
+    assert "2192" not in match.group(1)  # Roboto has no arrow; the browser falls back
+    client = TestClient(app)
+    response = client.get(match.group(1))
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "font/woff2"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.content.startswith(b"wOF2")
+    cmap = TTFont(io.BytesIO(response.content)).getBestCmap()
+    assert {ord("ü"), 0x3A9} <= set(cmap)
+    assert 0x0416 not in cmap  # Cyrillic the document doesn't use
+    full_size = (font_subsetter.fonts_dir / "Roboto-Regular.ttf").stat().st_size
+    assert len(response.content) < full_size / 4
+
+    assert len(list(tmp_path.glob("*.woff2"))) == 1
+    assert client.get(match.group(1)).content == response.content
+    assert len(list(tmp_path.glob("*.woff2"))) == 1
+    assert jobs == ["font-subset"]  # built as a render job once; the hit is served directly
+
+
+def test_cache_evicts_least_recently_served_subsets(tmp_path, monkeypatch):
+    """Built subsets are kept within the byte budget, oldest first out."""
+    monkeypatch.setattr(font_subsetter, "cache_dir", tmp_path)
+    monkeypatch.setattr(fonts_api, "schedule_render", _fake_schedule_render([]))
+    client = TestClient(app)
+    face = font_subsetter.face("Roboto-Regular.ttf")
+    sets = [face.codepoints & BASE_CODEPOINTS | {codepoint} for codepoint in (0x3A9, 0x3B1)]
+    urls = [_subset_url(face.version, codepoints) for codepoints in sets]
+    first = client.get(urls[0])
+    assert first.status_code == 200
+    size = len(first.content)
+    monkeypatch.setattr(font_subsetter, "budget",
+                        font_subset_module.DiskBudget(int(size * 1.5), (".woff2",), min_idle=0))
+    for path in tmp_path.glob("*.woff2"):  # make the first subset stale
+        font_subset_module.os.utime(path, (0, 0))
+    assert client.get(urls[1]).status_code == 200
+    survivor = font_subsetter.cached_path("Roboto-Regular.ttf", face.version, sets[1])
+    assert list(tmp_path.glob("*.woff2")) == [survivor]
+
+
+def test_subset_errors():
+    """Unknown faces and stale versions are not found; malformed ranges are refused."""
+    client = TestClient(app)
+    version = font_subsetter.face("Roboto-Regular.ttf").version
+    assert client.get("/font-subsets/secret.ttf?v=x&u=20-7e").status_code == 404
+    assert client.get("/font-subsets/Roboto-Regular.ttf?v=old&u=20-7e").status_code == 404
+    assert client.get(f"/font-subsets/Roboto-Regular.ttf?v={version}&u=20-zz").status_code == 400
+    # Code points the face lacks are never linked; building them would only waste work.
+    assert client.get(_subset_url(version, {0x41, 0x2192})).status_code == 400
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    import pytest
+
+    test_codepoints_and_ranges()
+    with pytest.MonkeyPatch.context() as patch, tempfile.TemporaryDirectory() as directory:
+        test_preview_links_cached_subsets(Path(directory), patch)
+    with pytest.MonkeyPatch.context() as patch, tempfile.TemporaryDirectory() as directory:
+        test_cache_evicts_least_recently_served_subsets(Path(directory), patch)
+    test_subset_errors()
+    print("All font subset tests passed!")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Test script to verify heading IDs, the table of contents and the outline collected while parsing.
+"""
+import pytest
+from pydantic import ValidationError
+
+from app.models import PDFGenerationRequest
+from app.services.headings import Heading, HeadingCollector
+from app.services.markdown_service import markdown_service
+
+_DOCUMENT = """# Intro
+
+## Setup & *install*
+
+### Details `cfg`
+
+#### Deep
+
+# Intro
+
+## !!!
+
+## ???
+
+# Intro-1
+"""
+
+_ENGINES = ["python-markdown", "markdown-it"]
+
+
+@pytest.mark.parametrize("engine", _ENGINES)
+def test_ids_are_stable_and_unique(engine):
+    """Repeated headings get numbered suffixes; headings without words are called "heading"."""
+    converted = markdown_service.convert(_DOCUMENT, add_heading_ids=True, engine=engine)
+    assert [(h.level, h.id, h.text) for h in converted.headings] == [
+        (1, "intro", "Intro"),
+        (2, "setup-install", "Setup & install"),
+        (3, "details-cfg", "Details cfg"),
+        (1, "intro-1", "Intro"),
+        (2, "heading", "!!!"),
+        (2, "heading-1", "???"),
+        (1, "intro-1-1", "Intro-1"),
+    ]
+    assert '<h1 class="" id="intro-1">Intro</h1>' in converted.html
+    assert "<h4>Deep</h4>" in converted.html
+
+
+@pytest.mark.parametrize("engine", _ENGINES)
+def test_index_depth(engine):
+    """Headings down to ``index_depth`` get IDs and index entries."""
+    converted = markdown_service.convert(_DOCUMENT, add_heading_ids=True, engine=engine,
+                                         index_depth=4)
+    assert (4, "deep", "Deep") in [(h.level, h.id, h.text) for h in converted.headings]
+    assert '<h4 class="" id="deep">Deep</h4>' in converted.html
+
+    shallow = markdown_service.convert(_DOCUMENT, add_heading_ids=True, engine=engine,
+                                       index_depth=1)
+    assert {h.level for h in shallow.headings} == {1}
+    assert "<h2>!!!</h2>" in shallow.html
+
+
+def test_index_is_rendered_from_the_outline():
+    """The index lists the collected headings, escaped, before the body."""
+    body = markdown_service.render_document_body(_DOCUMENT, include_index=True,
+                                                 add_page_breaks=True)
+    assert body.index('href="#setup-install"') < body.index('<h1 class="page-break-heading"')
+    assert '<span class="index-text">Setup &amp; install</span>' in body
+    assert 'href="#deep"' not in body
+    assert markdown_service.render_index([]) == ""
+
+
+def test_prefix_and_explicit_ids():
+    """Merge sections prefix their IDs; IDs set in the document are kept."""
+    converted = markdown_service.convert("# Same\n\n# Same\n\n## Custom {#mine}\n",
+                                         add_heading_ids=True, id_prefix="s1-")
+    assert [h.id for h in converted.headings] == ["s1-same", "s1-same-1", "mine"]
+    assert converted.headings[2] == Heading(2, "mine", "Custom", None)
+
+
+def test_replay_matches_the_whole_document():
+    """Headings collected piece by piece renumber to the whole document's IDs."""
+    whole = markdown_service.convert(_DOCUMENT * 2, add_heading_ids=True).headings
+    ids = HeadingCollector()
+    for piece in (_DOCUMENT, _DOCUMENT):
+        ids.replay(markdown_service.convert(piece, add_heading_ids=True).headings)
+    assert ids.headings == whole
+    assert len({heading.id for heading in whole}) == len(whole)
+
+
+def test_index_depth_is_validated():
+    """The depth is a heading level."""
+    assert PDFGenerationRequest(markdown="# x").index_depth == 3
+    with pytest.raises(ValidationError):
+        PDFGenerationRequest(markdown="# x", index_depth=7)
+
+
+if __name__ == "__main__":
+    for name in _ENGINES:
+        test_ids_are_stable_and_unique(name)
+        test_index_depth(name)
+    test_index_is_rendered_from_the_outline()
+    test_prefix_and_explicit_ids()
+    test_replay_matches_the_whole_document()
+    test_index_depth_is_validated()
+    print("All heading tests passed!")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Test script to verify image downsampling, deduplication and limits.
+"""
+import io
+import os
+import shutil
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+from app.services.disk_cache import DiskBudget
+from app.services.image_service import ImageService
+
+
+def _write_image(path, size, fmt="PNG"):
+    Image.new("RGB", size, (200, 80, 40)).save(path, fmt)
+
+
+def _src(html):
+    return html.split('src="', 1)[1].split('"', 1)[0]
+
+
+def _cached(html):
+    return Path(_src(html)[len("file://"):])
+
+
+def test_large_images_are_downsampled_and_deduplicated(tmp_path):
+    """Identical images share one cached file, downsampled to the page width at the DPI."""
+    _write_image(tmp_path / "shot.jpg", (4000, 3000), "JPEG")
+    shutil.copy(tmp_path / "shot.jpg", tmp_path / "copy.jpg")
+    service = ImageService(cache_dir=tmp_path / "cache")
+
+    html = service.prepare('<p><img alt="a" src="shot.jpg" /><img alt="b" src="copy.jpg" /></p>',
+                           dpi=100, base_dir=tmp_path)
+    first, second = html.split("<img")[1:]
+    assert _src(first) == _src(second)
+    assert _src(first).startswith("file://")
+    with Image.open(io.BytesIO(Path(_src(first)[len("file://"):]).read_bytes())) as image:
+        assert image.format == "JPEG"
+        assert image.width == 728 and image.height == 546
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+def test_small_images_keep_their_bytes(tmp_path):
+    """Images narrower than the target are cached unchanged."""
+    _write_image(tmp_path / "icon.png", (64, 64))
+    service = ImageService(cache_dir=tmp_path / "cache")
+    html = service.prepare('<img src="icon.png">', dpi=150, base_dir=tmp_path)
+    cached = _src(html)[len("file://"):]
+    assert Path(cached).read_bytes() == (tmp_path / "icon.png").read_bytes()
+
+
+def test_pixel_limit_replaces_image_with_alt_text(tmp_path, monkeypatch):
+    """Images over the pixel limit are omitted before their pixels are decoded."""
+    _write_image(tmp_path / "huge.png", (300, 300))
+    monkeypatch.setattr(sys.modules["app.services.image_service"], "_MAX_IMAGE_PIXELS", 10_000)
+    service = ImageService(cache_dir=tmp_path / "cache")
+    html = service.prepare('<img alt="diagram" src="huge.png">', base_dir=tmp_path)
+    assert html == '<span class="image-omitted">[image omitted: diagram]</span>'
+
+
+def test_unknown_sources_are_left_alone(tmp_path):
+    """Missing files and non-raster images stay for WeasyPrint to handle."""
+    (tmp_path / "logo.svg").write_text("<svg xmlns='http://www.w3.org/2000/svg'/>")
+    service = ImageService(cache_dir=tmp_path / "cache")
+    html = '<img src="missing.png"><img src="logo.svg">'
+    assert service.prepare(html, base_dir=tmp_path) == html
+
+
+def test_cache_evicts_least_recently_used_images(tmp_path):
+    """Past the byte budget the least recently used images are deleted first."""
+    for name, colour in (("a.png", (200, 0, 0)), ("b.png", (0, 200, 0)), ("c.png", (0, 0, 200))):
+        Image.new("RGB", (64, 64), colour).save(tmp_path / name, "PNG")
+    service = ImageService(cache_dir=tmp_path / "cache")
+    cached = {name: _cached(service.prepare(f'<img src="{name}">', base_dir=tmp_path))
+              for name in ("a.png", "b.png")}
+    used = sum(path.stat().st_size for path in cached.values())
+    service.budget = DiskBudget(used + used // 4, (".jpg", ".png"), min_idle=60)
+    hour_ago = os.path.getmtime(cached["a.png"]) - 3600
+    for path in cached.values():
+        os.utime(path, (hour_ago, hour_ago))
+
+    service.prepare('<img src="a.png">', base_dir=tmp_path)  # used again
+    cached["c.png"] = _cached(service.prepare('<img src="c.png">', base_dir=tmp_path))
+    assert [path.exists() for path in cached.values()] == [True, False, True]
+    assert _cached(service.prepare('<img src="b.png">', base_dir=tmp_path)).exists()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    import pytest
+
+    for test in (test_large_images_are_downsampled_and_deduplicated,
+                 test_small_images_keep_their_bytes,
+                 test_unknown_sources_are_left_alone,
+                 test_cache_evicts_least_recently_used_images):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+        test_pixel_limit_replaces_image_with_alt_text(Path(tmp), mp)
+    print("All image pipeline tests passed!")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Test script to guard the application's cold-start import time.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Cumulative import time allowed for ``app.main`` (generous to absorb CI noise).
+IMPORT_BUDGET_MS = float(os.getenv("M2P_IMPORT_BUDGET_MS", "1500"))
+
+HEAVY_MODULES = ("weasyprint", "reportlab")
+
+
+def _import_times(profile: str) -> dict:
+    """Import ``app.main`` in a fresh interpreter and return cumulative times in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=Path(__file__).resolve().parent.parent,
+        env={**os.environ, "M2P_PROFILE": profile},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def test_renderers_are_not_imported_at_startup():
+    """WeasyPrint and ReportLab are only imported when the first PDF is rendered."""
+    for profile in ("full", "preview"):
+        times = _import_times(profile)
+        loaded = [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+        assert not loaded, f"{profile} profile imports {loaded} at startup"
+
+
+def test_import_time_budget():
+    """Importing the app stays within the cold-start budget."""
+    times = _import_times("preview")
+    print(f"app.main cumulative import time: {times['app.main']:.0f} ms")
+    assert times["app.main"] < IMPORT_BUDGET_MS
+
+
+if __name__ == "__main__":
+    test_renderers_are_not_imported_at_startup()
+    test_import_time_budget()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Test script to verify the plain-text fast path for very large code blocks.
+"""
+from app.services.markdown_service import markdown_service
+
+
+def _fenced(lines, language="python"):
+    return f"```{language}\n" + "\n".join(lines) + "\n```\n"
+
+
+def test_large_block_is_plain():
+    """Blocks over the line limit get one escaped span per line and no zero-width spaces."""
+    lines = [f"call(a, b) <tag> & {i}" for i in range(600)]
+    html = markdown_service.convert_body("Intro\n\n" + _fenced(lines) + "\nOutro\n")
+    assert '<code class="code-plain">' in html
+    assert html.count('<span class="line">') == 600
+    assert '<span class="line">call(a, b) &lt;tag&gt; &amp; 0</span>' in html
+    assert "&#8203;" not in html and "<br>" not in html.split("<pre>")[1]
+    assert "<p>Outro</p>" in html
+
+
+def test_small_block_is_highlighted():
+    """Ordinary code blocks still go through Pygments and the wrapping pass."""
+    html = markdown_service.convert_body(_fenced(["call(a, b)"]))
+    assert "code-plain" not in html
+    assert '<span class="n">call</span>' in html and "&#8203;" in html
+
+
+def test_unclosed_fence_left_to_markdown():
+    """An unclosed fence is not swallowed by the fast path."""
+    html = markdown_service.convert_body(_fenced([f"line {i}" for i in range(600)])[:-4])
+    assert "code-plain" not in html
+
+
+def test_indented_fence_left_to_markdown():
+    """Only fences at column 0 take the fast path; Python-Markdown fences start nowhere else."""
+    lines = [f"    line {i}" for i in range(600)]
+    html = markdown_service.convert_body("- item\n\n" + "\n".join(["    ```", *lines, "    ```"]))
+    assert "code-plain" not in html
+
+
+if __name__ == "__main__":
+    test_large_block_is_plain()
+    test_small_block_is_highlighted()
+    test_unclosed_fence_left_to_markdown()
+    test_indented_fence_left_to_markdown()
+    print("All large code block tests passed!")
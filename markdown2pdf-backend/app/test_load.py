@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Test script to verify the load generator's workload plan and report statistics.
+"""
+import pytest
+
+from app.benchmarks.compare import compare_reports
+from app.benchmarks.load import Sample, WorkloadPlan, parse_mix, percentile, summarize
+
+
+def test_parse_mix():
+    """Weights are parsed per scenario; unknown names and empty mixes are rejected."""
+    assert parse_mix("preview=3, pdf=1") == {"preview": 3, "pdf": 1}
+    for text in ("render=1", "pdf=x", "pdf=0,fonts=0"):
+        with pytest.raises(ValueError):
+            parse_mix(text)
+
+
+def test_workload_plan_is_deterministic():
+    """The same seed replays the same requests, and zero-weight scenarios never run."""
+    first = WorkloadPlan({"preview": 1, "batch": 1}).next_request()
+    plan_a = WorkloadPlan({"preview": 1, "batch": 1, "fonts": 0})
+    plan_b = WorkloadPlan({"preview": 1, "batch": 1, "fonts": 0})
+    requests = [plan_a.next_request() for _ in range(50)]
+    assert requests == [plan_b.next_request() for _ in range(50)]
+    assert requests[0] == first
+    assert {request[0] for request in requests} == {"preview", "batch"}
+
+
+def test_summary_percentiles():
+    """Percentiles use the nearest rank; errors count towards the error rate."""
+    samples = [Sample("pdf", float(ms), ok=ms != 100) for ms in range(1, 101)]
+    summary = summarize(samples, elapsed_s=10.0)
+    assert (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert summary["error_rate"] == 0.01
+    assert summary["requests_per_s"] == 10.0
+    assert percentile([], 0.5) is None
+
+
+def test_compare_load_reports():
+    """Slower tail latency in a load report is flagged as a regression."""
+    baseline = {"scenarios": {"preview": summarize(
+        [Sample("preview", 10.0, True)] * 100, elapsed_s=10.0)}}
+    current = {"scenarios": {"preview": summarize(
+        [Sample("preview", 10.0, True)] * 90 + [Sample("preview", 40.0, True)] * 10,
+        elapsed_s=10.0)}}
+    assert [r.metric for r in compare_reports(baseline, current)] == ["load.preview.p95_ms",
+                                                                      "load.preview.p99_ms"]
+
+
+if __name__ == "__main__":
+    test_parse_mix()
+    test_workload_plan_is_deterministic()
+    test_summary_percentiles()
+    test_compare_load_reports()
+    print("All load generator tests passed!")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Test script to verify that the markdown engines produce equivalent HTML.
+"""
+import pytest
+from pydantic import ValidationError
+
+from app.benchmarks.corpus import build_corpus
+from app.benchmarks.parity import compare_engines, normalize_html
+from app.models import PDFGenerationRequest
+from app.services.markdown_service import markdown_service
+
+_FEATURES = {
+    "aligned_table": "| a | b | c |\n|:--|:-:|--:|\n| 1 | 2 | 3 |\n",
+    "fenced_code": "```python\ndef f(x, y):\n    return [x, y]\n```\n",
+    "plain_fence": "```\nno language here\n```\n",
+    "large_code": "```\n" + "".join(f"line {i}\n" for i in range(600)) + "```\n",
+    "indented_code": "Text\n\n    indented = True\n\nAfter\n",
+    "nested_lists": ("- one\n  - two\n    - three\n- four\n\n"
+                     "Then\n\n1. first\n2. second\n   1. inner\n"),
+    "headings": "# Title *em*\n\n## Sub `code`\n\n### Third\n",
+    "line_breaks": "first line\nsecond line\n\nnew paragraph\n",
+    "inline": "**bold** _it_ [link](https://example.com) ![img](a.png) `code`\n",
+    "definition_list": "Term\n: Definition\n",
+    "raw_html": "<div class=\"note\">raw</div>\n\ntext\n",
+}
+
+
+def test_corpus_parity():
+    """Every benchmark corpus document converts to the same HTML with both engines."""
+    differences = compare_engines(build_corpus(scale=1))
+    assert not any(differences.values()), differences
+
+
+def test_feature_parity():
+    """Tables, code, lists, heading IDs and line breaks match between engines."""
+    differences = compare_engines(_FEATURES)
+    assert not any(differences.values()), differences
+
+
+def test_normalize_html():
+    """Only markup that does not change the rendering is normalized away."""
+    assert (normalize_html('<p>a<br />\nb &quot;c&quot;</p>\n<td style="text-align: left;">')
+            == normalize_html('<p>a<br>b "c"</p><td style="text-align:left">'))
+    assert normalize_html("<p>a b</p>") != normalize_html("<p>ab</p>")
+
+
+def test_engine_per_request():
+    """A request picks its engine; bodies are cached per engine."""
+    text = "Text[^1]\n\n[^1]: Footnote markup differs between the engines.\n"
+    python_markdown = markdown_service.convert_body(text, engine="python-markdown")
+    markdown_it = markdown_service.convert_body(text, engine="markdown-it")
+    assert 'class="footnote"' in python_markdown
+    assert 'class="footnotes"' in markdown_it
+
+    request = PDFGenerationRequest(markdown=text, markdown_engine="markdown-it")
+    assert markdown_service.render_document_body(
+        request.markdown, engine=request.markdown_engine) == markdown_it
+
+
+def test_unknown_engine():
+    """Unknown engines are rejected by the service and by the request model."""
+    with pytest.raises(ValueError):
+        markdown_service.convert_body("text", engine="commonmark")
+    with pytest.raises(ValidationError):
+        PDFGenerationRequest(markdown="text", markdown_engine="commonmark")
+
+
+if __name__ == "__main__":
+    test_corpus_parity()
+    test_feature_parity()
+    test_normalize_html()
+    test_engine_per_request()
+    test_unknown_engine()
+    print("All markdown engine tests passed!")
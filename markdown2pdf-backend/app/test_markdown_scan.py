@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Test script to verify the single-pass Markdown preprocessing scanner and its statistics.
+"""
+import pytest
+from pydantic import ValidationError
+
+from app.models import PDFGenerationRequest
+from app.services.cost_service import cost_estimator
+from app.services.markdown_scan import closes_fence, fence_opening, scan_markdown
+from app.services.markdown_service import markdown_service, split_markdown
+
+_DOCUMENT = """# Title \u2013 \u201cquoted\u201d
+
+- parent
+
+  - nested
+    - deeper
+1. numbered \\& \\- escaped\u00a0text
+
+```python
+  - not a list
+print("\\&", \u2018x\u2019)
+```
+
+| a | b |
+|---|---|
+| 1 | 2 |
+"""
+
+
+def test_lists_and_glyphs_outside_code():
+    """Nested items are re-indented, the gap before them is dropped and glyphs are replaced."""
+    text = scan_markdown(_DOCUMENT).text
+    assert text.startswith('# Title - "quoted"\n\n- parent\n    - nested\n        - deeper\n')
+    assert "1. numbered &amp; - escaped text" in text
+
+
+def test_fenced_code_is_left_alone():
+    """Code keeps its indentation, backslashes and typographic characters."""
+    text = scan_markdown(_DOCUMENT).text
+    assert "```python\n  - not a list\nprint(\"\\&\", \u2018x\u2019)\n```" in text
+    code = "~~~\n\u201cquoted\u201d \u2013 a\u00a0b \u2014 \\- it\u2019s\n~~~"
+    assert scan_markdown(f"Before \u2013 after\n\n{code}\n").text == f"Before - after\n\n{code}\n"
+    html = markdown_service.convert_body(_DOCUMENT)
+    assert '<code>  <span class="o">-</span> <span class="ow">not</span>' in html
+    assert "\\&amp;" in html
+
+
+def test_statistics_feed_the_cost_estimate():
+    """One scan counts blocks, code lines, headings, table cells and list depth."""
+    stats = scan_markdown(_DOCUMENT, rewrite=False).stats
+    assert (stats.blocks, stats.code_lines, stats.headings, stats.table_cells,
+            stats.list_depth) == (5, 2, 1, 4, 3)
+    cost = cost_estimator.estimate(_DOCUMENT)
+    assert (cost.blocks, cost.code_lines, cost.table_cells) == (5, 2, 4)
+    assert scan_markdown(_DOCUMENT, rewrite=False).text is _DOCUMENT
+
+
+def test_scanner_and_preview_split_share_the_fence_rule():
+    """Indented fences open code for the scanner and the preview splitter alike."""
+    assert fence_opening("```python").group(2) == "```"
+    assert fence_opening("  ~~~ `info`").group(1) == "  "
+    assert fence_opening("```inline``` code") is None
+    assert closes_fence("  ````", "```") and not closes_fence("``` x", "```")
+
+    document = "Intro.\n\n- item\n\n  ```\n  first\n\n# not a heading\n  ```\n\nAfter.\n"
+    assert scan_markdown(document, rewrite=False).stats.headings == 0
+    assert list(split_markdown(document, 1, 1 << 20)) == [document[:-len("After.\n")], "After.\n"]
+
+
+def test_blank_markdown_is_rejected():
+    """Whitespace-only documents are still refused."""
+    with pytest.raises(ValidationError):
+        PDFGenerationRequest(markdown=" \n\t\u00a0")
+
+
+if __name__ == "__main__":
+    test_lists_and_glyphs_outside_code()
+    test_fenced_code_is_left_alone()
+    test_statistics_feed_the_cost_estimate()
+    test_scanner_and_preview_split_share_the_fence_rule()
+    test_blank_markdown_is_rejected()
+    print("All markdown scan tests passed!")
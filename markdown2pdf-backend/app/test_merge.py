@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Test script to verify that merged PDFs re-convert and re-lay-out only the sections that changed.
+"""
+import sys
+from types import SimpleNamespace
+
+from app.models import PDFMergeRequest
+from app.services import markdown_service, pdf_service
+
+# ``app.services`` re-exports the singletons under the modules' names.
+markdown_module = sys.modules["app.services.markdown_service"]
+pdf_module = sys.modules["app.services.pdf_service"]
+
+
+class _FakeDocument:
+    """Enough of a laid-out WeasyPrint document for merging: one page per section."""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def copy(self, pages):
+        """Return a document made of ``pages``."""
+        return _FakeDocument(list(pages))
+
+    def write_pdf(self, _target=None, **_options):
+        """Return a stand-in PDF naming its page count."""
+        return b"%PDF-fake pages=" + str(len(self.pages)).encode()
+
+
+def _counting_layout(layouts):
+    class _FakeHTML:  # pylint: disable=too-few-public-methods
+        def __init__(self, string, base_url):  # pylint: disable=unused-argument
+            layouts.append(string)
+
+        def render(self):
+            """Lay the section out on a single page without anchors."""
+            return _FakeDocument([SimpleNamespace(anchors={})])
+    return lambda: _FakeHTML
+
+
+def _counting_scan(conversions):
+    scan_markdown = markdown_module.scan_markdown
+
+    def scan(text):
+        conversions.append(text)
+        return scan_markdown(text)
+    return scan
+
+
+def _merge(*sections):
+    return PDFMergeRequest(sections=[{"markdown": text, "id": f"s{index}"}
+                                     for index, text in enumerate(sections)])
+
+
+def test_only_changed_section_is_rebuilt(monkeypatch):
+    """Re-exporting after a one-section edit converts and lays out just that section again."""
+    conversions: list[str] = []
+    layouts: list[str] = []
+    monkeypatch.setattr(markdown_module, "scan_markdown", _counting_scan(conversions))
+    monkeypatch.setattr(pdf_module, "_weasyprint_html", _counting_layout(layouts))
+    markdown_service.clear_cache()
+    pdf_service.clear_style_caches()
+
+    first = pdf_service.generate_merged_pdf(_merge("# One\n\nAlpha.", "# Two\n\nBeta.", "# Three"))
+    assert first == b"%PDF-fake pages=3"
+    assert (len(conversions), len(layouts)) == (3, 3)
+
+    pdf_service.generate_merged_pdf(_merge("# One\n\nAlpha.", "# Two\n\nEdited.", "# Three"))
+    assert conversions[3:] == ["# Two\n\nEdited."]
+    assert len(layouts) == 4 and "Edited." in layouts[3]
+
+    pdf_service.generate_merged_pdf(_merge("# One\n\nAlpha.", "# Two\n\nEdited.", "# Three"))
+    assert (len(conversions), len(layouts)) == (4, 4)
+
+
+def test_caches_are_bounded_by_size(monkeypatch):
+    """Least recently used entries are evicted once the byte budgets are spent."""
+    layouts: list[str] = []
+    monkeypatch.setattr(pdf_module, "_weasyprint_html", _counting_layout(layouts))
+    monkeypatch.setattr(markdown_module, "_BODY_CACHE_BYTES", 200)
+    markdown_service.clear_cache()
+    pdf_service.clear_style_caches()
+
+    for text in ("a" * 60, "b" * 60, "c" * 60, "d" * 600):
+        markdown_service.convert(text)
+    cached = [body.html for body in markdown_service._body_cache.values()]  # pylint: disable=protected-access
+    assert len(cached) == 2 and "b" * 60 in cached[0] and "c" * 60 in cached[1]
+    assert markdown_service._body_cache_bytes == sum(map(len, cached))  # pylint: disable=protected-access
+
+    request = _merge("# One", "# Two")
+    pdf_service.generate_merged_pdf(request)
+    budget = max(len(html) for html in layouts) * pdf_module._LAYOUT_BYTES_PER_CHAR  # pylint: disable=protected-access
+    monkeypatch.setattr(pdf_module, "_MERGE_LAYOUT_CACHE_BYTES", budget)
+    pdf_service.clear_style_caches()
+    pdf_service.generate_merged_pdf(request)
+    assert len(pdf_service._section_layouts) == 1  # pylint: disable=protected-access
+    pdf_service.generate_merged_pdf(request)
+    assert len(layouts) == 6  # each section evicted the other
+
+
+if __name__ == "__main__":
+    import pytest
+
+    with pytest.MonkeyPatch.context() as patch:
+        test_only_changed_section_is_rebuilt(patch)
+    with pytest.MonkeyPatch.context() as patch:
+        test_caches_are_bounded_by_size(patch)
+    print("All merge cache tests passed!")
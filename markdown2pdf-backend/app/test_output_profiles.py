@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Test script to verify that output profiles select the write_pdf options.
+"""
+import sys
+
+from app.models import OutputProfile, PDFGenerationRequest, PDFVariantsRequest
+
+# ``app.services`` re-exports the singleton under the module's name.
+pdf_service_module = sys.modules["app.services.pdf_service"]
+
+
+class _RecordingDocument:  # pylint: disable=too-few-public-methods
+    """Stands in for a laid-out WeasyPrint document."""
+
+    def __init__(self):
+        self.options = None
+
+    def write_pdf(self, target=None, **options):
+        """Record the options instead of writing a PDF."""
+        assert target is None
+        self.options = options
+        return b"%PDF-"
+
+
+def _options(**style):
+    document = _RecordingDocument()
+    request = PDFGenerationRequest(markdown="# Title", **style)
+    assert pdf_service_module._write_pdf(document, request) == b"%PDF-"  # pylint: disable=protected-access
+    return document.options
+
+
+def test_standard_keeps_weasyprint_defaults():
+    """The default profile passes no options, so output is unchanged."""
+    assert PDFGenerationRequest(markdown="x").output_profile is OutputProfile.STANDARD
+    assert not _options()
+
+
+def test_draft_skips_compression_and_subsetting():
+    """Draft writes uncompressed streams and whole fonts."""
+    assert _options(output_profile="draft") == {"uncompressed_pdf": True, "full_fonts": True}
+
+
+def test_compact_recompresses_images_at_requested_dpi():
+    """Compact re-encodes images, capped at the request's image DPI."""
+    options = _options(output_profile="compact", image_dpi=96)
+    assert options["optimize_images"] is True
+    assert options["jpeg_quality"] < 85
+    assert options["dpi"] == 96
+
+
+def test_variants_override_output_profile():
+    """Style variants can pick their own output profile."""
+    request = PDFVariantsRequest(markdown="# Title", variants=[
+        {"name": "print"}, {"name": "email", "output_profile": "compact"}])
+    print_style, email_style = request.variant_styles()
+    assert print_style.output_profile is OutputProfile.STANDARD
+    assert email_style.output_profile is OutputProfile.COMPACT
+
+
+if __name__ == "__main__":
+    test_standard_keeps_weasyprint_defaults()
+    test_draft_skips_compression_and_subsetting()
+    test_compact_recompresses_images_at_requested_dpi()
+    test_variants_override_output_profile()
+    print("All output profile tests passed!")
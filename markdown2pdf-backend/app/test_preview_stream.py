@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Test script to verify the streamed HTML preview and the markdown splitting behind it.
+"""
+import re
+
+from fastapi.testclient import TestClient
+
+import app.api.preview as preview_api
+from app.benchmarks.corpus import build_corpus
+from app.benchmarks.parity import normalize_html
+from app.main import app
+from app.services.headings import HeadingCollector
+from app.services.markdown_service import markdown_service, split_markdown
+
+_BLOCKS = """# Blocks
+
+Intro paragraph.
+
+```python
+def f():
+
+    return 1
+
+# not a heading
+```
+
+<div class="note">
+
+Raw HTML with a blank line.
+
+</div>
+
+- loose
+- list
+
+- continues here
+
+> quoted
+
+> still quoted
+
+See [the docs][docs] for more.
+
+[docs]: https://example.com/docs
+"""
+
+
+def _normalize(html):
+    # Converting at once labels a top-level list "nested" when any list
+    # precedes it in the document; pieces only see lists within themselves.
+    return re.sub(r'<([ou]l) class="nested-list">', r"<\1>", normalize_html(html))
+
+
+def _convert_in_pieces(markdown_text, first_bytes, max_bytes):
+    pieces = list(split_markdown(markdown_text, first_bytes, max_bytes))
+    ids = HeadingCollector()
+    html = []
+    for piece in pieces:
+        # Headings repeated across pieces get the IDs of the whole document.
+        reserved = ids.used_ids
+        ids.replay(markdown_service.convert(piece, add_heading_ids=True).headings)
+        html.append(markdown_service.convert(piece, add_heading_ids=True,
+                                             reserved_ids=reserved).html)
+    return pieces, "\n".join(html)
+
+
+def test_pieces_convert_like_the_whole_document():
+    """Converting piece by piece gives the same HTML as converting at once."""
+    for name, markdown_text in {**build_corpus(scale=2), "blocks": _BLOCKS * 20}.items():
+        pieces, html = _convert_in_pieces(markdown_text, 256, 1024)
+        expected = markdown_service.convert_body(markdown_text, add_heading_ids=True)
+        assert _normalize(html) == _normalize(expected), name
+        assert "".join(pieces).startswith(markdown_text[:100])
+    assert len(_convert_in_pieces(_BLOCKS * 20, 256, 1024)[0]) > 5
+
+
+def test_piece_sizes_grow():
+    """The first piece is small; later pieces double up to the maximum."""
+    markdown_text = "".join(f"Paragraph {i} " + "word " * 40 + "\n\n" for i in range(500))
+    sizes = [len(piece) for piece in split_markdown(markdown_text, 1024, 8192)]
+    assert sizes[0] < 1500
+    assert sizes[1] > sizes[0] and max(sizes) < 8192 + 300
+    assert "".join(split_markdown(markdown_text, 1024, 8192)) == markdown_text
+
+
+def test_link_definitions_and_footnotes():
+    """Reference definitions reach every piece; documents with footnotes stay whole."""
+    markdown_text = "[first][ref]\n\n" + "Filler paragraph.\n\n" * 50 + "[last][ref]\n\n[ref]: /x\n"
+    pieces = list(split_markdown(markdown_text, 64, 256))
+    assert len(pieces) > 1
+    assert all(piece.endswith("[ref]: /x\n") for piece in pieces)
+
+    footnotes = "Text[^1]\n\n" + "Filler paragraph.\n\n" * 50 + "[^1]: Note.\n"
+    assert list(split_markdown(footnotes, 64, 256)) == [footnotes]
+
+
+def test_streamed_preview(monkeypatch):
+    """The head comes first, the index before the body, and the document is complete."""
+    jobs = []
+
+    async def fake_schedule_render(_client_id, _cost, _kind, fn, *args, admit=True):
+        # The streamed request is admitted once, not once per piece.
+        jobs.append(fn.__name__ if not admit else "admitted")
+        return fn(*args)
+
+    monkeypatch.setattr(preview_api, "schedule_render", fake_schedule_render)
+    monkeypatch.setattr(preview_api, "_PREVIEW_FIRST_CHUNK_BYTES", 256)
+    monkeypatch.setattr(preview_api, "_PREVIEW_CHUNK_BYTES", 1024)
+    client = TestClient(app)
+    payload = {"markdown": _BLOCKS * 10, "include_index": True}
+
+    with client.stream("POST", "/generate-pdf-preview?stream=true", json=payload) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "text/html; charset=utf-8"
+        parts = list(response.iter_text())
+    streamed = "".join(parts)
+    assert jobs[0] == "generate_preview_head"
+    assert jobs.count("generate_preview_piece") == jobs.count("preview_piece_headings") > 2
+    assert streamed.lstrip().startswith("<!DOCTYPE html>")
+    assert streamed.index('class="index-page"') < streamed.index("Intro paragraph.")
+    assert streamed.rstrip().endswith("</html>")
+
+    whole = client.post("/generate-pdf-preview", json=payload).text
+    assert _normalize(streamed) == _normalize(whole)
+
+
+if __name__ == "__main__":
+    import pytest
+
+    test_pieces_convert_like_the_whole_document()
+    test_piece_sizes_grow()
+    test_link_definitions_and_footnotes()
+    with pytest.MonkeyPatch.context() as patch:
+        test_streamed_preview(patch)
+    print("All streamed preview tests passed!")
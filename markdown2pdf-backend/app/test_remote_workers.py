@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+"""
+Test script to verify dispatching render jobs to several local render worker processes.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+from app.models import PDFGenerationRequest
+from app.services import pdf_service
+from app.services.cost_service import FAST_LANE, DocumentCost, cost_estimator
+from app.services.remote_render import (
+    NoRenderWorker, ProtocolError, RemoteWorkerPool, ReplayGuard, read_message, write_message,
+)
+from app.services.render_executor import RenderExecutor
+from app.services.scheduler import FairScheduler
+
+# ``app.services`` re-exports the singletons under the modules' names.
+pdf_module = sys.modules["app.services.pdf_service"]
+remote_module = sys.modules["app.services.remote_render"]
+render_executor_module = sys.modules["app.services.render_executor"]
+
+_SECRET = "test-secret"
+
+
+def _pid_after(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def _fail():
+    raise ValueError("bad markdown")
+
+
+class _Sink:
+    """Collects what ``write_message`` sends."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        """Append ``data`` to the collected frame bytes."""
+        self.data += data
+
+    async def drain(self):
+        """Nothing to flush."""
+
+
+async def _read(data, secret):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    return await asyncio.wait_for(read_message(reader, secret), 1)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def _workers(count):
+    """Start ``count`` render workers with one slot each; yield {address: process}.
+
+    Skips the test where WeasyPrint cannot load, as the workers preload it.
+    """
+    try:
+        pdf_module._weasyprint_html()  # pylint: disable=protected-access
+    except (ImportError, OSError) as e:  # OSError: WeasyPrint's native libraries are missing
+        pytest.skip(f"WeasyPrint is unavailable: {e}")
+    processes = {}
+    for _ in range(count):
+        address = f"127.0.0.1:{_free_port()}"
+        processes[address] = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "-m", "app.render_worker", "--host", "127.0.0.1",
+             "--port", address.rpartition(":")[2], "--workers", "1"],
+            cwd=Path(__file__).resolve().parent.parent,
+            env={**os.environ, "M2P_RENDER_WORKER_SECRET": _SECRET, "M2P_RENDER_POOL": "thread"},
+        )
+    try:
+        pool = RemoteWorkerPool(processes, secret=_SECRET)
+        deadline = time.monotonic() + 30
+        while asyncio.run(pool.check()) < count:
+            assert time.monotonic() < deadline, "render workers did not start"
+            time.sleep(0.2)
+        yield processes
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait(timeout=10)
+
+
+def test_least_loaded_dispatch_and_errors():
+    """Concurrent jobs spread over idle workers; job errors come back unchanged."""
+    with _workers(3) as processes:
+        pool = RemoteWorkerPool(processes, secret=_SECRET)
+
+        async def scenario():
+            jobs = [pool.run(_pid_after, (0.5,)) for _ in range(3)]
+            return [pid for pid, _ in await asyncio.gather(*jobs)]
+
+        pids = asyncio.run(scenario())
+        assert sorted(pids) == sorted(process.pid for process in processes.values())
+        with pytest.raises(ValueError, match="bad markdown"):
+            asyncio.run(pool.run(_fail, ()))
+        assert all(worker.healthy for worker in pool.workers())
+
+        request = PDFGenerationRequest(markdown="# Remote\n\nSome `code`.")
+        html, _ = asyncio.run(pool.run(pdf_service.generate_pdf_preview, (request,)))
+        assert html == pdf_service.generate_pdf_preview(request)
+
+
+def test_retry_on_worker_loss():
+    """A job whose worker dies is rendered by another one."""
+    with _workers(2) as processes:
+        pool = RemoteWorkerPool(processes, secret=_SECRET)
+
+        async def scenario():
+            await pool.check()
+            job = asyncio.ensure_future(pool.run(_pid_after, (1.0,)))
+            while not any(worker.pending for worker in pool.workers()):
+                await asyncio.sleep(0.01)
+            busy = next(worker for worker in pool.workers() if worker.pending)
+            await asyncio.sleep(0.2)
+            processes[busy.address].kill()
+            pid, _ = await job
+            return busy, pid
+
+        busy, pid = asyncio.run(scenario())
+        survivor = next(p for address, p in processes.items() if address != busy.address)
+        assert pid == survivor.pid
+        assert not busy.healthy
+
+
+def test_wrong_secret_and_local_fallback(monkeypatch):
+    """Without a usable worker the executor renders in its own pools."""
+    with _workers(1) as processes:
+        intruder = RemoteWorkerPool(processes, secret="guess")
+        assert asyncio.run(intruder.check()) == 0
+        with pytest.raises(NoRenderWorker):
+            asyncio.run(intruder.run(_pid_after, (0,)))
+
+    gone = RemoteWorkerPool([f"127.0.0.1:{_free_port()}"], secret=_SECRET, timeout=0.5)
+    monkeypatch.setattr(render_executor_module, "remote_workers", gone)
+    monkeypatch.setattr(render_executor_module, "_POOL_KIND", "thread")
+    executor = RenderExecutor()
+    try:
+        result = asyncio.run(executor.run(cost_estimator.estimate("x"), "pdf", _pid_after, 0))
+    finally:
+        executor.shutdown()
+    assert result == os.getpid()
+
+
+def test_frame_header_is_checked_before_the_payload_is_read(monkeypatch):
+    """Forged or oversized lengths are refused without waiting for (or buffering) a payload."""
+    async def scenario():
+        sink = _Sink()
+        await write_message(sink, ("health",), b"key")
+        assert await _read(bytes(sink.data), b"key") == ("health",)
+        with pytest.raises(ProtocolError, match="header signature"):
+            await _read(bytes(sink.data), b"guess")
+        forged = remote_module._HEADER.pack(1 << 30, bytes(32), bytes(32))  # pylint: disable=protected-access
+        with pytest.raises(ProtocolError, match="header signature"):
+            await _read(forged, b"key")
+
+        monkeypatch.setattr(remote_module, "_MAX_FRAME_BYTES", 16)
+        with pytest.raises(ProtocolError, match="too large"):
+            await _read(bytes(sink.data)[:remote_module._HEADER.size], b"key")  # pylint: disable=protected-access
+        with pytest.raises(ProtocolError, match="too large"):
+            await write_message(_Sink(), b"x" * 64, b"key")
+
+    asyncio.run(scenario())
+
+
+def test_unanswered_job_is_retried_elsewhere():
+    """A worker that takes a job but never answers is given up on after the job timeout."""
+    async def serve(reader, writer, stuck):
+        request_id, _, message = await read_message(reader, _SECRET.encode())
+        if message[0] == "render" and stuck:
+            await asyncio.sleep(30)
+        reply = ("health", 1, 0) if message[0] == "health" else ("done", "rendered", 1.0, 0)
+        await write_message(writer, (request_id, reply), _SECRET.encode())
+        writer.close()
+
+    async def scenario():
+        servers = [await asyncio.start_server(lambda r, w, stuck=stuck: serve(r, w, stuck),
+                                              "127.0.0.1", 0)
+                   for stuck in (True, False)]
+        addresses = [f"127.0.0.1:{server.sockets[0].getsockname()[1]}" for server in servers]
+        pool = RemoteWorkerPool(addresses, secret=_SECRET, job_timeout=0.3)
+        assert await pool.check() == 2
+        started = time.monotonic()
+        result, _ = await pool.run(_pid_after, (0,))
+        elapsed = time.monotonic() - started
+        for server in servers:
+            server.close()
+        return result, elapsed, [worker.healthy for worker in pool.workers()]
+
+    result, elapsed, healthy = asyncio.run(scenario())
+    assert result == "rendered"
+    assert 0.3 <= elapsed < 5
+    assert healthy == [False, True]
+
+
+def test_replayed_requests_and_mismatched_replies_are_refused():
+    """A captured request can't be run twice, and a reply must answer the request sent."""
+    guard = ReplayGuard(window=60)
+    request = (os.urandom(16), time.time(), ("health",))
+    assert guard.accept(request) == (request[0], ("health",))
+    for bad, reason in ((request, "replayed"), ((os.urandom(16), time.time() - 61, ("health",)),
+                                                "replay window"),
+                        (("health",), "Malformed"), (([], time.time(), ("health",)), "Malformed")):
+        with pytest.raises(ProtocolError, match=reason):
+            guard.accept(bad)
+
+    async def answer_with_old_reply(reader, writer):
+        await read_message(reader, _SECRET.encode())
+        await write_message(writer, (os.urandom(16), ("health", 1, 0)), _SECRET.encode())
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(answer_with_old_reply, "127.0.0.1", 0)
+        pool = RemoteWorkerPool([f"127.0.0.1:{server.sockets[0].getsockname()[1]}"],
+                                secret=_SECRET)
+        with pytest.raises(ProtocolError, match="another request"):
+            await pool._request(pool.workers()[0].address, ("health",))  # pylint: disable=protected-access
+        server.close()
+        return await pool.check()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_lanes_are_sized_by_remote_capacity(monkeypatch):
+    """With remote workers up, a lane runs as many jobs as they have slots, not its local size."""
+    running = []
+    peak = 0
+
+    async def serve(reader, writer):
+        nonlocal peak
+        request_id, _, message = await read_message(reader, _SECRET.encode())
+        if message[0] == "health":
+            reply = ("health", 2, len(running))
+        else:
+            running.append(request_id)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.2)
+            running.remove(request_id)
+            reply = ("done", "rendered", 200.0, len(running))
+        await write_message(writer, (request_id, reply), _SECRET.encode())
+        writer.close()
+
+    async def scenario():
+        servers = [await asyncio.start_server(serve, "127.0.0.1", 0) for _ in range(3)]
+        pool = RemoteWorkerPool([f"127.0.0.1:{server.sockets[0].getsockname()[1]}"
+                                 for server in servers], secret=_SECRET)
+        monkeypatch.setattr(render_executor_module, "remote_workers", pool)
+        assert await pool.check() == 3
+        scheduler = FairScheduler({}, {})
+        executor = RenderExecutor()
+        cost = DocumentCost(lane=FAST_LANE)
+
+        async def job(client_id):
+            async with scheduler.slot(client_id, cost):
+                return await executor.run(cost, "pdf", _pid_after, 0)
+
+        try:
+            return await asyncio.gather(*(job(f"client-{i}") for i in range(6)))
+        finally:
+            executor.shutdown()
+            for server in servers:
+                server.close()
+
+    assert asyncio.run(scenario()) == ["rendered"] * 6
+    assert render_executor_module.render_executor.lane_workers(FAST_LANE) == 2
+    assert peak == 6
+
+
+if __name__ == "__main__":
+    # The workers import the jobs by module name, which ``__main__`` is not.
+    from app import test_remote_workers as tests  # pylint: disable=import-self
+
+    tests.test_least_loaded_dispatch_and_errors()
+    tests.test_retry_on_worker_loss()
+    with pytest.MonkeyPatch.context() as patch:
+        tests.test_wrong_secret_and_local_fallback(patch)
+    with pytest.MonkeyPatch.context() as patch:
+        tests.test_frame_header_is_checked_before_the_payload_is_read(patch)
+    tests.test_unanswered_job_is_retried_elsewhere()
+    tests.test_replayed_requests_and_mismatched_replies_are_refused()
+    with pytest.MonkeyPatch.context() as patch:
+        tests.test_lanes_are_sized_by_remote_capacity(patch)
+    print("All remote render worker tests passed!")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Test script to verify the shared memory handoff of large render results.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+
+from app.services.render_executor import _timed_call  # pylint: disable=protected-access
+from app.services.result_transport import (
+    ResultBuffer,
+    SharedSegment,
+    discard_result,
+    sweep_orphans,
+)
+
+_LARGE = 4 * 1024 * 1024
+
+
+def _segment_exists(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def test_large_results_travel_through_shared_memory():
+    """A large worker result arrives as a segment name and is freed on release."""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        result, _ = pool.submit(_timed_call, bytes, (_LARGE,), True).result()
+        small, _ = pool.submit(_timed_call, bytes, (10,), True).result()
+    assert isinstance(result, SharedSegment) and result.size == _LARGE
+    assert small == bytes(10)
+
+    with ResultBuffer(result) as buffer, buffer.view() as view:
+        assert buffer.shared and len(view) == _LARGE
+        assert view[:4] == b"\0\0\0\0" and view.readonly
+    assert buffer.released
+    assert not _segment_exists(result.name)
+
+
+def test_unclaimed_results_are_released():
+    """Results nobody reads (cancelled requests, dropped buffers) free their segment."""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        first, _ = pool.submit(_timed_call, bytes, (_LARGE,), True).result()
+        second, _ = pool.submit(_timed_call, bytes, (_LARGE,), True).result()
+    discard_result(first)
+    assert not _segment_exists(first.name)
+
+    buffer = ResultBuffer(second)
+    del buffer
+    assert not _segment_exists(second.name)
+
+
+def test_sweep_removes_segments_of_dead_servers():
+    """Segments named after a process that no longer exists are swept at start-up."""
+    dead_pid = 2 ** 22 + 1
+    while True:
+        try:
+            os.kill(dead_pid, 0)
+        except ProcessLookupError:
+            break
+        except PermissionError:
+            pass
+        dead_pid += 1
+    orphan = shared_memory.SharedMemory(name=f"m2p-{dead_pid}-0a1b", create=True, size=16)
+    live = shared_memory.SharedMemory(name=f"m2p-{os.getpid()}-0a1b", create=True, size=16)
+    try:
+        if Path("/dev/shm").is_dir():
+            assert sweep_orphans() >= 1
+            assert not _segment_exists(orphan.name)
+            assert _segment_exists(live.name)
+    finally:
+        for segment in (orphan, live):
+            segment.close()
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                # Swept behind the tracker's back: stop it from unlinking it again.
+                resource_tracker.unregister(getattr(segment, "_name"), "shared_memory")
+
+
+if __name__ == "__main__":
+    test_large_results_travel_through_shared_memory()
+    test_unclaimed_results_are_released()
+    test_sweep_removes_segments_of_dead_servers()
+    print("All result transport tests passed!")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Test script to verify weighted fair scheduling across API clients.
+"""
+import asyncio
+import sys
+
+import pytest
+
+from app.services.cost_service import DocumentCost
+from app.services.scheduler import ClientPolicy, FairScheduler, RateLimitExceeded
+
+# ``app.services`` re-exports the singleton under the module's name.
+scheduler_module = sys.modules["app.services.scheduler"]
+
+
+async def _run_jobs(scheduler, jobs):
+    order = []
+
+    async def job(client_id):
+        async with scheduler.slot(client_id, DocumentCost(predicted_ms=100, lane="fast")):
+            order.append(client_id)
+            await asyncio.sleep(0.005)
+
+    tasks = [asyncio.create_task(job(client_id)) for client_id in jobs[0]]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(job(client_id)) for client_id in jobs[1]]
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_interactive_client_not_starved_by_bulk_client():
+    """Jobs from a light client overtake a deep backlog from a bulk client."""
+    scheduler = FairScheduler({"bulk": ClientPolicy(weight=1), "ui": ClientPolicy(weight=4)}, {})
+    order = asyncio.run(_run_jobs(scheduler, (["bulk"] * 20, ["ui"] * 3)))
+
+    # All interactive jobs finish well before the bulk backlog drains
+    last_ui = max(i for i, client_id in enumerate(order) if client_id == "ui")
+    assert last_ui < 10
+    assert scheduler.stats()["ui"]["completed"] == 3
+
+
+def test_concurrency_cap_and_rate_limit():
+    """Per-client caps and token buckets are enforced."""
+    scheduler = FairScheduler({"capped": ClientPolicy(max_concurrency=1),
+                               "limited": ClientPolicy(rate=0.5, burst=1)}, {})
+    peak = 0
+
+    async def capped_job():
+        nonlocal peak
+        async with scheduler.slot("capped", DocumentCost(lane="fast")):
+            peak = max(peak, scheduler.stats()["capped"]["in_flight"])
+            await asyncio.sleep(0.005)
+
+    async def scenario():
+        await asyncio.gather(*(capped_job() for _ in range(4)))
+        async with scheduler.slot("limited", DocumentCost(lane="fast")):
+            pass
+        with pytest.raises(RateLimitExceeded):
+            async with scheduler.slot("limited", DocumentCost(lane="fast")):
+                pass
+
+    asyncio.run(scenario())
+    assert peak == 1
+    assert scheduler.stats()["limited"]["rate_limited"] == 1
+
+
+def test_resolve_client_hides_unknown_api_keys():
+    """Known keys map to names; everyone else is keyed by a hash of their address."""
+    scheduler = FairScheduler({}, {"secret-key": "nightly-export"})
+    assert scheduler.resolve_client("secret-key", None) == "nightly-export"
+    assert scheduler.resolve_client("secret-key", None, "10.0.0.1") == "nightly-export"
+    anonymous = scheduler.resolve_client(None, None, "10.0.0.1")
+    assert anonymous.startswith("anonymous-")
+    assert "10.0.0.1" not in anonymous
+    assert scheduler.resolve_client(None, None) == "anonymous"
+    # Unknown keys and client-chosen IDs can't be rotated into fresh buckets.
+    assert scheduler.resolve_client("other-key", "editor", "10.0.0.1") == anonymous
+    assert scheduler.resolve_client("another-key", "editor-2", "10.0.0.1") == anonymous
+    trusting = FairScheduler({}, {}, trust_client_id=True)
+    assert trusting.resolve_client(None, "editor", "10.0.0.1") == "editor"
+
+
+def test_rotating_client_ids_share_one_bucket():
+    """A caller can't escape its rate limit by changing X-Client-ID."""
+    scheduler = FairScheduler({"default": ClientPolicy(rate=0.5, burst=2)}, {})
+    client_ids = [scheduler.resolve_client(None, f"bulk-{i}", "10.0.0.9") for i in range(3)]
+    scheduler.admit(client_ids[0])
+    scheduler.admit(client_ids[1])
+    with pytest.raises(RateLimitExceeded):
+        scheduler.admit(client_ids[2])
+    assert len(scheduler.stats()) == 1
+
+
+def test_idle_clients_are_forgotten(monkeypatch):
+    """Client states expire once idle, but not while work or a drained bucket remains."""
+    clock = [1000.0]
+    monkeypatch.setattr(scheduler_module.time, "monotonic", lambda: clock[0])
+    scheduler = FairScheduler({"limited": ClientPolicy(rate=0.01, burst=1)}, {}, idle_ttl=60)
+    for client_id in ("a", "b", "limited"):
+        scheduler.admit(client_id)
+    clock[0] += 61
+    scheduler.admit("c")
+    assert sorted(scheduler.stats()) == ["c", "limited"]
+    clock[0] += 100
+    scheduler.admit("d")
+    assert sorted(scheduler.stats()) == ["d"]
+
+
+def test_invalid_policies_are_rejected_at_load(monkeypatch):
+    """Weights, caps and rates that would break the queue fail when the policies are loaded."""
+    monkeypatch.setenv("M2P_CLIENT_POLICIES", '{"ui": {"weight": 4, "rate": 2}}')
+    assert FairScheduler(api_keys={}).stats() == {}
+    for bad in ('{"bulk": {"weight": 0}}', '{"bulk": {"weight": -1}}',
+                '{"bulk": {"max_concurrency": 0}}', '{"bulk": {"rate": -0.5}}',
+                '{"bulk": {"wieght": 2}}'):
+        monkeypatch.setenv("M2P_CLIENT_POLICIES", bad)
+        with pytest.raises(ValueError, match="M2P_CLIENT_POLICIES entry for 'bulk'"):
+            FairScheduler(api_keys={})
+
+
+if __name__ == "__main__":
+    test_interactive_client_not_starved_by_bulk_client()
+    test_concurrency_cap_and_rate_limit()
+    test_resolve_client_hides_unknown_api_keys()
+    test_rotating_client_ids_share_one_bucket()
+    with pytest.MonkeyPatch.context() as patch:
+        test_idle_clients_are_forgotten(patch)
+    with pytest.MonkeyPatch.context() as patch:
+        test_invalid_policies_are_rejected_at_load(patch)
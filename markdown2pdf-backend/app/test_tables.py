@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Test script to verify fixed table layouts driven by auto_width_tables.
+"""
+import re
+
+from app.services.markdown_service import fix_table_layouts, markdown_service
+
+
+def _table_markdown(rows):
+    body = "".join(f"| item {i} | a much longer description of row {i} | {i} |\n"
+                   for i in range(rows))
+    return "| Name | Description | N |\n| --- | --- | --- |\n" + body
+
+
+def test_fixed_layout_widths():
+    """auto_width_tables=False emits a fixed layout with one width per column."""
+    html = markdown_service.convert_body(_table_markdown(20), auto_width_tables=False)
+    assert '<table class="table-fixed">' in html
+    widths = [float(w) for w in re.findall(r'<col style="width: ([\d.]+)%">', html)]
+    assert len(widths) == 3
+    assert abs(sum(widths) - 100) < 0.1
+    # The description column is the widest, the number column the narrowest.
+    assert widths[1] > widths[0] > widths[2]
+
+
+def test_auto_layout_for_short_tables():
+    """Short tables keep WeasyPrint's auto layout when auto_width_tables is set."""
+    html = markdown_service.convert_body(_table_markdown(20))
+    assert "<table>" in html and "<colgroup>" not in html
+
+
+def test_long_tables_always_fixed():
+    """Tables beyond the row limit get the fixed layout even in auto mode."""
+    html = markdown_service.convert_body(_table_markdown(1500))
+    assert '<table class="table-fixed">' in html
+
+
+def test_non_table_html_unchanged():
+    """Documents without tables pass through untouched."""
+    html = "<p>No tables here</p>\n<table>unclosed"
+    assert fix_table_layouts(html, auto_width_tables=False) == html
+
+
+if __name__ == "__main__":
+    test_fixed_layout_widths()
+    test_auto_layout_for_short_tables()
+    test_long_tables_always_fixed()
+    test_non_table_html_unchanged()
+    print("All table layout tests passed!")
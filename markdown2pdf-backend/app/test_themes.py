@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Test script to verify the stylesheet registry, code themes and their hot reload.
+"""
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app.main import app
+from app.models import PDFGenerationRequest, PDFVariantsRequest
+from app.services import pdf_service
+from app.services.theme_service import ThemeRegistry, theme_registry
+
+# ``app.services`` re-exports the singleton under the module's name.
+pdf_service_module = sys.modules["app.services.pdf_service"]
+
+
+def _write(path, css, mtime):
+    path.write_text(css, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_shipped_themes():
+    """Every code-highlight-*.css is a theme; code-highlight.css is the default."""
+    themes = theme_registry.code_themes()
+    shipped = {"default", "github-dark", "lightbulb", "monokai", "native", "nord", "rrt"}
+    assert shipped <= set(themes)
+    assert "styles" not in themes
+    assert theme_registry.code_theme().digest == theme_registry.code_theme("default").digest
+    assert theme_registry.code_theme("monokai").digest != theme_registry.code_theme("nord").digest
+    assert TestClient(app).get("/code-themes").json() == themes
+
+
+def test_code_theme_is_validated():
+    """Requests and style variants only accept loaded themes."""
+    assert PDFGenerationRequest(markdown="x", code_theme="nord").code_theme == "nord"
+    with pytest.raises(ValidationError):
+        PDFGenerationRequest(markdown="x", code_theme="solarized")
+    with pytest.raises(ValidationError):
+        PDFVariantsRequest(markdown="x", variants=[{"code_theme": "solarized"}])
+
+
+def test_code_theme_selects_the_css():
+    """The chosen theme replaces the default one in the assembled CSS."""
+    nord = pdf_service._build_css(PDFGenerationRequest(markdown="x", code_theme="nord"))  # pylint: disable=protected-access
+    default = pdf_service._build_css(PDFGenerationRequest(markdown="x"))  # pylint: disable=protected-access
+    assert theme_registry.code_theme("nord").css in nord
+    assert theme_registry.code_theme("nord").css not in default
+    assert theme_registry.get("styles").css in nord and theme_registry.get("styles").css in default
+
+
+def test_reload(tmp_path):
+    """Changed, added and removed files are picked up and listeners are told."""
+    _write(tmp_path / "styles.css", "body { color: black; }", 1_000_000)
+    _write(tmp_path / "code-highlight.css", ".a { color: red; }", 1_000_000)
+    registry = ThemeRegistry(tmp_path, check_interval=0)
+    reloads = []
+    registry.on_reload(lambda: reloads.append(True))
+    fingerprint = registry.fingerprint()
+    assert registry.code_themes() == ["default"]
+    assert not registry.reload() and not reloads
+
+    _write(tmp_path / "code-highlight.css", ".a { color: blue; }", 1_000_001)
+    _write(tmp_path / "code-highlight-dusk.css", ".a { color: navy; }", 1_000_001)
+    assert registry.reload() and reloads
+    assert registry.code_theme().css == ".a { color: blue; }"
+    assert registry.code_themes() == ["default", "dusk"]
+    assert registry.fingerprint() != fingerprint
+
+    (tmp_path / "code-highlight-dusk.css").unlink()
+    assert registry.reload()
+    assert registry.code_themes() == ["default"]
+    assert registry.code_theme("dusk").css == ""
+
+
+def test_unreadable_file_is_retried(tmp_path, monkeypatch):
+    """A stylesheet that fails to read is read again on the next check, unchanged or not."""
+    _write(tmp_path / "code-highlight.css", ".a { color: red; }", 1_000_000)
+    read_text = type(tmp_path).read_text
+    failures = [OSError("busy")]
+
+    def flaky_read_text(path, *args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return read_text(path, *args, **kwargs)
+
+    monkeypatch.setattr(type(tmp_path), "read_text", flaky_read_text)
+    registry = ThemeRegistry(tmp_path, check_interval=0)
+    assert registry.code_themes() == []
+    assert registry.reload()
+    assert registry.code_theme().css == ".a { color: red; }"
+
+
+def test_reload_invalidates_assembled_css(tmp_path, monkeypatch):
+    """CSS assembled before a stylesheet changed is not reused afterwards."""
+    _write(tmp_path / "styles.css", "p { margin: 0; }", 1_000_000)
+    _write(tmp_path / "code-highlight.css", ".a { color: red; }", 1_000_000)
+    registry = ThemeRegistry(tmp_path, check_interval=0)
+    registry.on_reload(pdf_service.clear_style_caches)
+    monkeypatch.setattr(pdf_service_module, "theme_registry", registry)
+    request = PDFGenerationRequest(markdown="x")
+
+    assert ".a { color: red; }" in pdf_service._build_css(request)  # pylint: disable=protected-access
+    _write(tmp_path / "code-highlight.css", ".a { color: green; }", 1_000_001)
+    registry.reload()
+    css = pdf_service._build_css(request)  # pylint: disable=protected-access
+    assert ".a { color: green; }" in css and ".a { color: red; }" not in css
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_shipped_themes()
+    test_code_theme_is_validated()
+    test_code_theme_selects_the_css()
+    with tempfile.TemporaryDirectory() as directory:
+        test_reload(Path(directory))
+    with tempfile.TemporaryDirectory() as directory, pytest.MonkeyPatch.context() as patch:
+        test_unreadable_file_is_retried(Path(directory), patch)
+    with tempfile.TemporaryDirectory() as directory, pytest.MonkeyPatch.context() as patch:
+        test_reload_invalidates_assembled_css(Path(directory), patch)
+    print("All theme tests passed!")
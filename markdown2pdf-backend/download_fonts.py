@@ -111,12 +111,26 @@ FONTS = {
     },
 }
 
+# Fallback fonts for non-Latin scripts (see app/services/fallback_fonts.py)
+NOTO_URL = "https://github.com/notofonts/notofonts.github.io/raw/main/fonts"
+FALLBACK_FONTS = {
+    "NotoSans-Regular.ttf": f"{NOTO_URL}/NotoSans/hinted/ttf/NotoSans-Regular.ttf",
+    "NotoSansHebrew-Regular.ttf": f"{NOTO_URL}/NotoSansHebrew/hinted/ttf/NotoSansHebrew-Regular.ttf",
+    "NotoSansArabic-Regular.ttf": f"{NOTO_URL}/NotoSansArabic/hinted/ttf/NotoSansArabic-Regular.ttf",
+    "NotoSansDevanagari-Regular.ttf": f"{NOTO_URL}/NotoSansDevanagari/hinted/ttf/NotoSansDevanagari-Regular.ttf",
+    "NotoSansThai-Regular.ttf": f"{NOTO_URL}/NotoSansThai/hinted/ttf/NotoSansThai-Regular.ttf",
+    "NotoSansCJKsc-Regular.otf": "https://github.com/notofonts/noto-cjk/raw/main/Sans/OTF/SimplifiedChinese/NotoSansCJKsc-Regular.otf",
+    "NotoColorEmoji.ttf": "https://github.com/googlefonts/noto-emoji/raw/main/fonts/NotoColorEmoji.ttf",
+}
+
 # Font directory
 FONT_DIR = Path(__file__).parent / "app" / "static" / "fonts"
+FALLBACK_FONT_DIR = FONT_DIR / "fallback"
 os.makedirs(FONT_DIR, exist_ok=True)
+os.makedirs(FALLBACK_FONT_DIR, exist_ok=True)
 
-def download_font(url, filename):
-    output_path = FONT_DIR / filename
+def download_font(url, filename, font_dir=FONT_DIR):
+    output_path = font_dir / filename
     print(f"Downloading {filename}...")
     
     try:
@@ -157,5 +171,9 @@ def main():
             
             download_font(url, filename)
 
+    print(f"Downloading fallback fonts to: {FALLBACK_FONT_DIR}")
+    for filename, url in FALLBACK_FONTS.items():
+        download_font(url, filename, FALLBACK_FONT_DIR)
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
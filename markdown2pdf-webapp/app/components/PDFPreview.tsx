@@ -1,4 +1,4 @@
-import React, { memo, useState, useEffect, useRef, useCallback } from "react";
+import React, { memo, useState, useEffect, useRef, useMemo } from "react";
 import { PDFGenerationRequest } from "../lib/api";
 import { useThrottledPreview } from "../hooks/useThrottledPreview";
 
@@ -8,20 +8,40 @@ interface PDFPreviewProps {
 
 // Extract only the content needed for preview from the full request
 function PDFPreviewComponent({ request }: PDFPreviewProps) {
-  const [htmlContent, setHtmlContent] = useState<string>("");
   const [isLoading, setIsLoading] = useState<boolean>(false);
   const iframeRef = useRef<HTMLIFrameElement>(null);
+  // Document of the iframe while a preview is being streamed into it
+  const streamingDocRef = useRef<Document | null>(null);
   const isMarkdownEmpty = !request.markdown.trim();
 
-  // Handle preview updates with useCallback to prevent unnecessary re-renders
-  const handlePreviewUpdate = useCallback((html: string) => {
-    setHtmlContent(html);
-    setIsLoading(false);
-  }, []);
+  // Write the preview into the iframe as it streams in, so the top of a
+  // large document shows before the rest has been converted
+  const previewHandlers = useMemo(
+    () => ({
+      onStart: () => {
+        const iframe = iframeRef.current;
+        const doc = iframe?.contentDocument || iframe?.contentWindow?.document;
+        if (doc) {
+          // The HTML content from the backend already includes the correct font CSS
+          doc.open();
+          streamingDocRef.current = doc;
+        }
+        setIsLoading(false);
+      },
+      onChunk: (html: string) => {
+        streamingDocRef.current?.write(html);
+      },
+      onDone: () => {
+        streamingDocRef.current?.close();
+        streamingDocRef.current = null;
+      },
+    }),
+    []
+  );
 
   // Use throttled preview hook
   const { throttledGeneratePreview, cleanup } = useThrottledPreview(
-    handlePreviewUpdate,
+    previewHandlers,
     2000 // 2 second delay
   );
 
@@ -31,7 +51,6 @@ function PDFPreviewComponent({ request }: PDFPreviewProps) {
       setIsLoading(true);
       throttledGeneratePreview(request);
     } else {
-      setHtmlContent("");
       setIsLoading(false);
     }
   }, [
@@ -52,21 +71,6 @@ function PDFPreviewComponent({ request }: PDFPreviewProps) {
     return cleanup;
   }, [cleanup]);
 
-  // Update iframe content when HTML changes
-  useEffect(() => {
-    if (iframeRef.current && htmlContent) {
-      const iframe = iframeRef.current;
-      const doc = iframe.contentDocument || iframe.contentWindow?.document;
-      if (doc) {
-        doc.open();
-
-        // The HTML content from the backend already includes the correct font CSS
-        doc.write(htmlContent);
-        doc.close();
-      }
-    }
-  }, [htmlContent]);
-
   return (
     <div className="bg-white dark:bg-neutral-900 shadow rounded-md p-4 border dark:border-neutral-800 ">
       <div className="flex items-baseline mb-4">
@@ -1,15 +1,23 @@
 import { useCallback, useRef } from "react";
 import { PDFGenerationRequest, api } from "../lib/api";
 
+export interface PreviewStreamHandlers {
+  // Called with the first piece of a new preview, before onChunk
+  onStart: () => void;
+  onChunk: (html: string) => void;
+  onDone: () => void;
+}
+
 export const useThrottledPreview = (
-  onPreviewUpdate: (html: string) => void,
+  handlers: PreviewStreamHandlers,
   delay: number = 1000
 ) => {
   const timeoutRef = useRef<NodeJS.Timeout | null>(null);
-  const onPreviewUpdateRef = useRef(onPreviewUpdate);
+  const abortRef = useRef<AbortController | null>(null);
+  const handlersRef = useRef(handlers);
 
-  // Keep the callback ref up to date
-  onPreviewUpdateRef.current = onPreviewUpdate;
+  // Keep the handlers ref up to date
+  handlersRef.current = handlers;
 
   const throttledGeneratePreview = useCallback(
     (request: PDFGenerationRequest) => {
@@ -20,16 +28,35 @@ export const useThrottledPreview = (
 
       // Set new timeout
       timeoutRef.current = setTimeout(async () => {
+        // A newer preview replaces one that is still streaming
+        abortRef.current?.abort();
+        const controller = new AbortController();
+        abortRef.current = controller;
+
+        let started = false;
         try {
-          const htmlContent = await api.generatePDFPreview(request);
-          onPreviewUpdateRef.current(htmlContent);
+          await api.streamPDFPreview(
+            request,
+            (html) => {
+              if (!started) {
+                started = true;
+                handlersRef.current.onStart();
+              }
+              handlersRef.current.onChunk(html);
+            },
+            controller.signal
+          );
+          if (started) {
+            handlersRef.current.onDone();
+          }
         } catch (error) {
-          console.error("Failed to generate preview:", error);
-          // You could call onPreviewUpdate with an error message here
+          if (!controller.signal.aborted) {
+            console.error("Failed to generate preview:", error);
+          }
         }
       }, delay);
     },
-    [delay] // Only depend on delay, not on onPreviewUpdate
+    [delay] // Only depend on delay, not on the handlers
   );
 
   // Cleanup function
@@ -37,6 +64,7 @@ export const useThrottledPreview = (
     if (timeoutRef.current) {
       clearTimeout(timeoutRef.current);
     }
+    abortRef.current?.abort();
   }, []);
 
   return { throttledGeneratePreview, cleanup };
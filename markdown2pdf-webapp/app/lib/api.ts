@@ -15,7 +15,9 @@ export interface PDFGenerationRequest {
   spacing?: SpacingOption;
   auto_width_tables?: boolean;
   filename?: string;
+  code_theme?: string;
   include_index?: boolean;
+  index_depth?: number;
   add_page_breaks?: boolean;
 }
 
@@ -66,6 +68,51 @@ export const api = {
     return await response.text();
   },
 
+  /**
+   * Stream the HTML preview, passing each piece to onChunk as soon as it arrives
+   */
+  streamPDFPreview: async (
+    data: PDFGenerationRequest,
+    onChunk: (html: string) => void,
+    signal?: AbortSignal
+  ): Promise<void> => {
+    const response = await fetch(`${API_URL}/generate-pdf-preview?stream=true`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify(data),
+      signal,
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => null);
+      throw new Error(
+        errorData?.detail ||
+          `Failed to generate PDF preview: ${response.status}`
+      );
+    }
+
+    if (!response.body) {
+      onChunk(await response.text());
+      return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) {
+        break;
+      }
+      onChunk(decoder.decode(value, { stream: true }));
+    }
+    const rest = decoder.decode();
+    if (rest) {
+      onChunk(rest);
+    }
+  },
+
   /**
    * Get available font families
    */